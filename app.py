@@ -1,24 +1,30 @@
 
+import argparse
 import asyncio
 import json
+import signal
+from datetime import datetime
 
 from websockets.asyncio.server import serve
 
 from server import (
     Functions, Query, Websocket,
     Player, Gamer,
-    PLAYER, GAMER, 
+    PLAYER, GAMER, MATCHER, REAPER, CHECKPOINT, WHEEL, CLOCK, OPLOG, STANDBY, STORE, EXPORTER, LEADERBOARD, C2S, S2C,
     green, yellow, red, 
-    find_player, find_player_ws,
-    send, recv
+    find_player, find_player_ws, touch_game,
+    send, recv, error, format
 )
+from server.limiter import RateLimiter
+from server.profiler import PROFILER, ADMINS, ADMIN_KEY
 
 DEBUG = True
 
-async def handler(websocket: Websocket):
-    '''Server Thread'''
+async def handler(websocket: Websocket, player: Player):
+    '''Server Thread. Requests act as `player`, who logged in on `websocket`'''
     global PLAYER
     global GAMER
+    limiter = RateLimiter()
     async for msg in websocket:
         event = json.loads(msg)
         if isinstance(event, str):
@@ -33,22 +39,36 @@ async def handler(websocket: Websocket):
             continue
         
         # Request Event
+        if not limiter.allow(str(event.get('func'))):
+            await error(event.get('seq', -1), websocket, 'Too many requests', 429)
+            if DEBUG:
+                print(red(f"Rate limited: {event.get('func')}."), f" Websocket: {id(websocket)}")
+            continue
+        if 'gid' in event:
+            if event.get('func') in C2S['main'] and CHECKPOINT.is_waiting(str(event['gid'])):
+                await error(event.get('seq', -1), websocket, 'Waiting for players to resume', 409)
+                continue
         try:
             assert 'func' in event.keys(), 'Request error: `func` required'
             f = getattr(Functions, event['func'])
-            await f(Query(event, websocket))
+            await PROFILER.request(event, f(Query(event, websocket, player)))
+            if 'gid' in event and player.gamer is not None and str(player.gamer.gid) == str(event['gid']):
+                # Only a member's successful request keeps the game alive
+                touch_game(str(event['gid']), event['func'] in C2S['main'])
         except AssertionError as e:
-            await Query(event, websocket).error(message=str(e), code=400)
+            await Query(event, websocket, player).error(message=str(e), code=400)
             if DEBUG:
                 print(red(f"Error: {e}."), f" Websocket: {id(websocket)}")
         except Exception as e:
             import traceback
             traceback.print_exc()
-            await Query(event, websocket).error(message=str(e))
+            await Query(event, websocket, player).error(message=str(e))
             if DEBUG:
                 print(red(f"Error: {e}."), f" Websocket: {id(websocket)}")
         finally:
-            pass
+            if 'gid' in event and event.get('func') in C2S['main']:
+                # Restart the phase clock if the request moved the game on
+                CLOCK.arm(str(event['gid']))
 
 async def conn(websocket: Websocket):
     '''
@@ -60,30 +80,85 @@ async def conn(websocket: Websocket):
     assert event['func'] == 'login', 'Connection error: Please login first.'
     if DEBUG:
         print(green(f"Websocket {websocket} connected."))
-    name = event['name']
+    name = str(event['name'])
     if find_player(name) is not None:
         await Query(event, websocket).error(message='Player already exists', code=403)
         if DEBUG:
             print(red(f"Player {event['name']} already exists."), f" Websocket: {id(websocket)}")
-    else:
-        player = Player(name)
-        player.login(websocket)
-        PLAYER[name] = player
+        return
+    # Players of restored games pick up where they left
+    player = CHECKPOINT.resume(name) or Player(name)
+    # Reserve the name before the first await
+    PLAYER[name] = player
+    try:
+        database = await asyncio.to_thread(STORE.load, name)
+        player.login(websocket, database)
+        player.sync_database(last_login=datetime.now().isoformat(timespec='seconds'), ip=player.get_ip())
+        LEADERBOARD.update(name, int(database['points']))
+        if ADMIN_KEY and event.get('key') == ADMIN_KEY:
+            ADMINS.add(name)
         if DEBUG:
             print(green(f"Player {name} created."), f" Websocket: {id(websocket)}")
-        await Query(event, websocket).ok()
-    try:
-        await handler(websocket)
+        await Query(event, websocket, player).ok()
+        if player.gamer:
+            await send(websocket, format(S2C['resumeGame'], gid=player.gamer.gid, name=name, seq=-1))
+            CLOCK.arm(str(player.gamer.gid))
+        await handler(websocket, player)
     except Exception as e:
-        del PLAYER[name]
         if DEBUG:
             print(red(f"Connection closed to websocket: {id(websocket)}. \n\tError: {e}."))
+    finally:
+        ADMINS.discard(name)
+        player.unspectate()
+        del PLAYER[name]
+        STORE.release(name)
 
-async def main():
-    async with serve(conn, "localhost", 8001):
-        await asyncio.get_running_loop().create_future()  # run forever
+async def main(args: argparse.Namespace):
+    # Before any game is created or restored
+    Gamer.spectate_delay = args.spectate_delay
+    Gamer.spectate_interval = args.spectate_interval
+    if args.standby:
+        # Replicate until the primary goes away, then take over
+        await STANDBY.follow(args.standby)
+        STANDBY.promote()
+    else:
+        CHECKPOINT.restore()
+    matcher = asyncio.create_task(MATCHER.run())
+    reaper = asyncio.create_task(REAPER.run())
+    checkpoint = asyncio.create_task(CHECKPOINT.run())
+    if args.timeouts:
+        CLOCK.timeouts = dict(zip(('INIT', 'TURN', 'END'), args.timeouts))
+    wheel = asyncio.create_task(WHEEL.run())
+    STORE.open()
+    if args.export:
+        EXPORTER.open(args.export)
+    LEADERBOARD.load(await asyncio.to_thread(STORE.records))
+    if args.oplog:
+        OPLOG.start()
+        oplog = await asyncio.start_server(OPLOG.serve, "localhost", args.oplog)
+    try:
+        loop = asyncio.get_running_loop()
+        stop = loop.create_future()
+        try:
+            # Stop cleanly on SIGTERM, so the final checkpoint is written
+            loop.add_signal_handler(signal.SIGTERM, lambda: stop.done() or stop.set_result(None))
+        except NotImplementedError:
+            pass
+        async with serve(conn, "localhost", args.port):
+            await stop  # run forever
+    finally:
+        CHECKPOINT.save()
+        STORE.close()
+        EXPORTER.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
-
+    parser = argparse.ArgumentParser(description='Scout! game server')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--oplog', type=int, default=0, help='stream the operation log to a standby on this local port')
+    parser.add_argument('--standby', type=int, default=0, help='replicate the primary serving its oplog on this local port, take over when it stops')
+    parser.add_argument('--timeouts', type=float, nargs=3, metavar=('INIT', 'TURN', 'END'), help='seconds to choose the poke order, play a turn and confirm the result before the server moves for the player, 0 disables one')
+    parser.add_argument('--export', default='', help='append finished rounds to columnar files in this directory')
+    parser.add_argument('--spectate-delay', type=float, metavar='SECONDS', default=Gamer.spectate_delay, help='seconds spectators lag behind the game')
+    parser.add_argument('--spectate-interval', type=float, metavar='SECONDS', default=Gamer.spectate_interval, help='minimum seconds between frames pushed to spectators, frames in between are batched')
+    asyncio.run(main(parser.parse_args()))
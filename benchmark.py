@@ -0,0 +1,437 @@
+'''Micro-benchmarks for the rules engine in `server/core`
+
+Every benchmark reports per-call timings in microseconds as JSON, so two runs
+can be diffed or one run checked against a stored baseline:
+
+    python benchmark.py --out baseline.json
+    python benchmark.py --baseline baseline.json --tolerance 0.25
+
+The exit code is 1 when any benchmark's median is slower than the baseline
+median by more than the tolerance.
+'''
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import server.core.gamer
+from server import (
+    Gamer, Player, Poke, PokeCombine,
+    GameState, PlayerState, PokeState,
+    rules,
+)
+
+server.core.gamer.DEBUG = False
+
+BENCHMARKS = {}
+'''$name: (function, kwargs)'''
+
+def benchmark(**kwargs):
+    '''Register a benchmark. The function returns a list of per-call timings in ns'''
+    def wrapper(fn):
+        BENCHMARKS[fn.__name__] = (fn, kwargs)
+        return fn
+    return wrapper
+
+def timed(fn, *args) -> int:
+    t0 = time.perf_counter_ns()
+    fn(*args)
+    return time.perf_counter_ns() - t0
+
+def loop(fn, samples: int, number: int) -> list[float]:
+    '''Time `number` back-to-back calls per sample'''
+    out = []
+    for _ in range(samples):
+        t0 = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        out.append((time.perf_counter_ns() - t0) / number)
+    return out
+
+##############
+#   Script   #
+##############
+
+def new_game(num: int, seed: int) -> Gamer:
+    '''Offline game with `num` players, dealt and waiting for the first move'''
+    random.seed(seed)
+    gamer = Gamer(seed, False)
+    for i in range(num):
+        player = Player(f'p{i}')
+        player.offline()
+        player.set_gamer(gamer)
+    for player in gamer.players:
+        player.ready_for_game()
+    for player in gamer.players:
+        player.choose_pokes_side(False)
+    return gamer
+
+def turn_player(gamer: Gamer) -> Player:
+    for player in gamer.players:
+        if player.state == PlayerState.TURN:
+            return player
+
+def best_show(player: Player) -> tuple[int, int]|None:
+    '''Longest combine that beats the table, None if there is none'''
+    table = player.gamer.displayed_pokes
+    hand = player.pokes
+    for length in range(len(hand), 0, -1):
+        for begin in range(len(hand) - length + 1):
+            combine = PokeCombine(hand[begin:begin + length])
+            if combine.type_ != 0 and combine > table:
+                return begin, begin + length
+    return None
+
+def play_turn(gamer: Gamer, rng: random.Random) -> None:
+    '''Scripted move: show the longest beating combine, otherwise scout at random'''
+    player = turn_player(gamer)
+    move = best_show(player)
+    if move is not None:
+        player.show(player.choose_pokes_index(*move))
+    else:
+        player.scout(rng.random() < 0.5, rng.random() < 0.5, rng.randint(0, len(player.pokes)))
+
+def play_game(num: int, seed: int, max_turns: int = 1000) -> int:
+    '''Play one scripted game to the end, return the number of turns'''
+    gamer = new_game(num, seed)
+    rng = random.Random(seed)
+    for turn in range(max_turns):
+        if gamer.state == GameState.END:
+            return turn
+        play_turn(gamer, rng)
+    raise RuntimeError(f'Game {seed} did not finish in {max_turns} turns')
+
+def mid_game(num: int, seed: int, turns: int) -> Gamer|None:
+    '''Game advanced by `turns` scripted moves, None if it ended earlier'''
+    gamer = new_game(num, seed)
+    rng = random.Random(seed)
+    for _ in range(turns):
+        play_turn(gamer, rng)
+        if gamer.state == GameState.END:
+            return None
+    return gamer
+
+def positions(num: int, samples: int, accept) -> list[tuple]:
+    '''Mid-game positions where `accept(gamer)` returns a non-None payload'''
+    out = []
+    seed = 0
+    while len(out) < samples:
+        gamer = mid_game(num, seed, seed % 12 + 1)
+        seed += 1
+        if gamer is None:
+            continue
+        payload = accept(gamer)
+        if payload is not None:
+            out.append((gamer, payload))
+    return out
+
+##############
+# Benchmarks #
+##############
+
+def combines(count: int) -> list[PokeCombine]:
+    rng = random.Random(0)
+    out = []
+    for _ in range(count):
+        length = rng.randint(1, 5)
+        kind = rng.random()
+        start = rng.randint(1, 10 - length + 1)
+        if kind < 0.4:
+            values = list(range(start, start + length))
+        elif kind < 0.7:
+            values = [start] * length
+        else:
+            values = [rng.randint(1, 10) for _ in range(length)]
+        out.append(PokeCombine([Poke(v, 1) for v in values]))
+    return out
+
+@benchmark(samples=50, number=2000)
+def poke_combine_calculate(samples: int, number: int) -> list[float]:
+    pool = combines(number)
+    def run():
+        for combine in pool:
+            combine.calculate()
+    return [t / number for t in loop(run, samples, 1)]
+
+@benchmark(samples=50, number=2000)
+def poke_combine_compare(samples: int, number: int) -> list[float]:
+    pool = combines(number + 1)
+    pairs = list(zip(pool, pool[1:]))
+    def run():
+        for a, b in pairs:
+            a > b
+            a >= b
+            a == b
+    return [t / number for t in loop(run, samples, 1)]
+
+@benchmark(samples=200, players=4)
+def gamer_init_game(samples: int, players: int) -> list[float]:
+    out = []
+    for seed in range(samples):
+        random.seed(seed)
+        gamer = Gamer(seed, False)
+        for i in range(players):
+            player = Player(f'p{i}')
+            player.offline()
+            player.set_gamer(gamer)
+            player.set_state(PlayerState.READY)
+        gamer.set_state(GameState.INIT)
+        out.append(timed(gamer.init_game))
+    return out
+
+def turn_end(gamer: Gamer, op: tuple) -> None:
+    op[0].set_state(PlayerState.WAIT)
+    success, info = gamer.player_turn_end(op)
+    assert success, info
+
+@benchmark(samples=200, players=4)
+def player_turn_end_show(samples: int, players: int) -> list[float]:
+    def accept(gamer):
+        player = turn_player(gamer)
+        move = best_show(player)
+        return (player, 0, player.choose_pokes_index(*move)) if move else None
+    return [timed(turn_end, gamer, op) for gamer, op in positions(players, samples, accept)]
+
+@benchmark(samples=200, players=4)
+def player_turn_end_scout(samples: int, players: int) -> list[float]:
+    def accept(gamer):
+        player = turn_player(gamer)
+        if len(gamer.displayed_pokes) == 0 or gamer.displayed_pokes.pokes[0].owner == player:
+            return None
+        target = gamer.displayed_pokes.pokes[0]
+        poke = Poke(target.up, target.down, target.side)
+        poke.set_state(PokeState.HIDE)
+        poke.set_owner(player)
+        return (player, 1, poke, 0)
+    return [timed(turn_end, gamer, op) for gamer, op in positions(players, samples, accept)]
+
+@benchmark(samples=200, players=4)
+def player_turn_end_scout_and_show(samples: int, players: int) -> list[float]:
+    def accept(gamer):
+        player = turn_player(gamer)
+        if len(gamer.displayed_pokes) == 0 or player in gamer.scout_and_show or \
+            gamer.displayed_pokes.pokes[-1].owner == player:
+            return None
+        target = gamer.displayed_pokes.pokes[-1]
+        poke = Poke(target.up, target.down, target.side)
+        poke.set_state(PokeState.HIDE)
+        poke.set_owner(player)
+        return (player, 2, poke, 0)
+    return [timed(turn_end, gamer, op) for gamer, op in positions(players, samples, accept)]
+
+@benchmark(samples=50, number=200, players=4)
+def gamer_get_player_score(samples: int, number: int, players: int) -> list[float]:
+    gamer = positions(players, 1, lambda g: True)[0][0]
+    def run():
+        for player in gamer.players:
+            gamer.get_player_score(player)
+    return [t / players for t in loop(run, samples, number)]
+
+@benchmark(samples=50, number=200, players=4)
+def gamer_get_game_info(samples: int, number: int, players: int) -> list[float]:
+    gamer = positions(players, 1, lambda g: True)[0][0]
+    return loop(gamer.get_game_info, samples, number)
+
+@benchmark(samples=50, number=200, players=4)
+def gamer_get_game_info_cold(samples: int, number: int, players: int) -> list[float]:
+    '''Views rebuilt on every call, as after each move'''
+    gamer = positions(players, 1, lambda g: True)[0][0]
+    def run():
+        gamer.touch()
+        gamer.get_game_info()
+    return loop(run, samples, number)
+
+@benchmark(samples=30, players=3)
+def offline_game_3p(samples: int, players: int) -> list[float]:
+    return [timed(play_game, players, seed) for seed in range(samples)]
+
+@benchmark(samples=30, players=5)
+def offline_game_5p(samples: int, players: int) -> list[float]:
+    return [timed(play_game, players, seed) for seed in range(samples)]
+
+##############
+# Rules core #
+##############
+
+def play_move(player: Player, move: tuple) -> None:
+    if move[0] == 'show':
+        player.show(player.choose_pokes_index(move[1], move[2]))
+    elif move[0] == 'scout':
+        player.scout(*move[1:])
+    else:
+        player.scout_and_show(*move[1:])
+
+def object_shows(player: Player) -> list[tuple[int, int]]:
+    '''Beating combines found with `PokeCombine`, the reference for `rules.shows`'''
+    hand, table = player.pokes, player.gamer.displayed_pokes
+    return [
+        (begin, end)
+        for begin in range(len(hand)) for end in range(begin + 1, len(hand) + 1)
+        if PokeCombine(hand[begin:end]).type_ != 0 and PokeCombine(hand[begin:end]) > table
+    ]
+
+def pick(moves: list[tuple], rng: random.Random) -> tuple:
+    '''Random legal move, a show half of the time when there is one, so rounds end'''
+    shows = [move for move in moves if move[0] == 'show']
+    if shows and rng.random() < 0.5:
+        return rng.choice(shows)
+    return rng.choice(moves)
+
+def lockstep_game(num: int, seed: int, max_turns: int = 1000) -> int:
+    '''Play one game with random legal moves on `Gamer` and on `rules.apply` side by side.
+    Raise AssertionError as soon as the two disagree, return the number of turns (until it ended or stalled)'''
+    gamer = new_game(num, seed)
+    rng = random.Random(seed)
+    state = gamer.round_state()
+    first = turn_player(gamer)
+    hands = [[(poke.value, poke.value_disable) for poke in player.pokes] for player in gamer.players]
+    assert state == rules.initial(hands, gamer.players.index(first)), f'Game {seed}: initial state differs'
+    for turn in range(max_turns):
+        if gamer.state == GameState.END:
+            assert state.winner >= 0, f'Game {seed}: only Gamer ended the round'
+            expected = tuple(gamer.get_player_score(player) for player in gamer.players)
+            assert rules.scores(state) == expected, f'Game {seed}: scores {rules.scores(state)} != {expected}'
+            return turn
+        assert state.winner < 0, f'Game {seed}: only rules ended the round'
+        moves = rules.legal_moves(state)
+        player = turn_player(gamer)
+        assert [move[1:] for move in moves if move[0] == 'show'] == object_shows(player), \
+            f'Game {seed} turn {turn}: legal shows differ'
+        if not moves:
+            # Stalled: nothing beats the table and scouting is not allowed
+            return turn
+        move = pick(moves, rng)
+        play_move(player, move)
+        state = rules.apply(state, move)
+        assert gamer.round_state() == state, f'Game {seed} turn {turn}: {move} gives\n{gamer.round_state()}\n{state}'
+    raise RuntimeError(f'Game {seed} did not finish in {max_turns} turns')
+
+def rules_game(num: int, seed: int, max_turns: int = 1000) -> int:
+    '''`play_game` on the rules core: longest beating combine, otherwise a random scout'''
+    gamer = new_game(num, seed)
+    state = gamer.round_state()
+    rng = random.Random(seed)
+    for turn in range(max_turns):
+        if state.winner >= 0:
+            return turn
+        hand = state.hands[state.turn]
+        shows = rules.shows(hand, state.table)
+        if shows:
+            move = ('show', *max(shows, key=lambda show: (show[1] - show[0], -show[0])))
+        else:
+            move = ('scout', rng.random() < 0.5, rng.random() < 0.5, rng.randint(0, len(hand)))
+        state = rules.apply(state, move)
+    raise RuntimeError(f'Game {seed} did not finish in {max_turns} turns')
+
+def rules_positions(num: int, samples: int) -> list:
+    '''Mid-game round states with their legal moves'''
+    out = []
+    seed = 0
+    while len(out) < samples:
+        gamer = mid_game(num, seed, seed % 12 + 1)
+        seed += 1
+        if gamer is not None:
+            state = gamer.round_state()
+            out.append((state, rules.legal_moves(state)))
+    return out
+
+@benchmark(samples=40)
+def rules_equivalence(samples: int) -> list[float]:
+    '''Whole games checked move by move against `Gamer`, 2 to 5 players. Fails on any difference'''
+    return [timed(lockstep_game, 2 + seed % 4, seed) for seed in range(samples)]
+
+@benchmark(samples=50, number=200, players=4)
+def rules_apply(samples: int, number: int, players: int) -> list[float]:
+    rng = random.Random(0)
+    pairs = [(state, rng.choice(moves)) for state, moves in rules_positions(players, number)]
+    def run():
+        for state, move in pairs:
+            rules.apply(state, move)
+    return [t / number for t in loop(run, samples, 1)]
+
+@benchmark(samples=50, number=200, players=4)
+def rules_legal_moves(samples: int, number: int, players: int) -> list[float]:
+    states = [state for state, _ in rules_positions(players, number)]
+    def run():
+        for state in states:
+            rules.legal_moves(state)
+    return [t / number for t in loop(run, samples, 1)]
+
+@benchmark(samples=30, players=5)
+def rules_game_5p(samples: int, players: int) -> list[float]:
+    '''Same script as `offline_game_5p`, deal included'''
+    return [timed(rules_game, players, seed) for seed in range(samples)]
+
+##############
+#   Report   #
+##############
+
+def summarize(samples: list[float]) -> dict:
+    us = sorted(t / 1000 for t in samples)
+    return {
+        'samples': len(us),
+        'median_us': statistics.median(us),
+        'mean_us': statistics.fmean(us),
+        'min_us': us[0],
+        'stdev_us': statistics.stdev(us) if len(us) > 1 else 0.0,
+    }
+
+def run(pattern: str = '', scale: float = 1.0) -> dict:
+    results = {}
+    for name, (fn, kwargs) in BENCHMARKS.items():
+        if pattern not in name:
+            continue
+        kwargs = dict(kwargs)
+        kwargs['samples'] = max(1, int(kwargs['samples'] * scale))
+        results[name] = summarize(fn(**kwargs))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    '''Names of benchmarks whose median regressed beyond tolerance'''
+    slower = []
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['median_us'] / base['median_us']
+        result['baseline_ratio'] = ratio
+        if ratio > 1 + tolerance:
+            slower.append(name)
+    return slower
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', '--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the sample counts')
+    parser.add_argument('--out', default='', help='write the JSON report to this file')
+    parser.add_argument('--baseline', default='', help='JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown ratio over baseline')
+    parser.add_argument('--list', action='store_true', help='list benchmarks and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        sys.exit(0)
+    report = run(args.filter, args.scale)
+    slower = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = compare(report, json.load(f), args.tolerance)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    if slower:
+        print(f"Slower than baseline by more than {args.tolerance:.0%}: {', '.join(slower)}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,271 @@
+'''Bot runner: thousands of bot players in one process
+
+Every bot owns a `client.Connection` and a `client.GameMirror` on one shared
+event loop, queues with `quickMatch` and plays complete rounds. Move decisions
+come from a `strategy.py` strategy and run on a shared thread or process pool
+behind a FIFO gate, so a slow decision never blocks the loop and every bot is
+served in the order it asked. A decision that misses `--budget` falls back to
+`strategy.fallback`.
+
+Two-player tables can stall like in `tournament.py`. The stall is counted and
+the bots at the table queue again on a new connection, since nobody may leave
+a started game. The server's reaper evicts the stuck game.
+
+    python app.py &
+    python bots.py --bots 2000 --size 4 --rounds 3
+    python bots.py --bots 200 --soak 600 --workers 4 --processes --strategy lookahead
+'''
+import argparse
+import asyncio
+import contextlib
+import random
+import secrets
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from client import (
+    Connection, GameMirror, parse_pokes,
+    QUERY, SYS,
+    yellow, red
+)
+from loadtest import Stats, print_report
+from strategy import STRATEGIES, BUDGET, Move, Strategy, View, adecide
+
+class FairGate:
+    '''Concurrency limit that admits waiters strictly first come, first served'''
+    limit: int
+    '''Holders at once'''
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.holders = 0
+        self.waiters = deque()
+
+    async def acquire(self) -> None:
+        if self.holders < self.limit and not self.waiters:
+            self.holders += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just before cancellation, hand the slot on
+                self.release()
+            else:
+                self.waiters.remove(future)
+            raise
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+    def release(self) -> None:
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                # Slot passes directly to the next waiter
+                future.set_result(None)
+                return
+        self.holders -= 1
+
+class BotPool:
+    '''Decision pool shared by all bots of a runner'''
+    executor: Executor
+    '''Thread or process pool'''
+    gate: FairGate
+    '''At most one queued decision per worker'''
+
+    def __init__(self, workers: int, processes: bool = False) -> None:
+        self.executor = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(workers)
+        self.gate = FairGate(workers)
+
+    async def decide(self, strategy: Strategy, view: View, rng: random.Random, budget: float) -> tuple[Move|None, bool]:
+        '''Move and whether it fell back. The budget starts once a worker is free. The slot is held until
+        the worker has finished, also when the decision missed its budget and fell back'''
+        await self.gate.acquire()
+        return await adecide(strategy, view, rng, budget, self.executor, done=self.gate.release)
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+class RunnerBot:
+    '''One logical player of the runner'''
+    name: str
+    '''Player name'''
+    mirror: GameMirror
+    '''Local game state'''
+
+    def __init__(self, name: str, pool: BotPool, stats: Stats, url: str, size: int,
+                 strategy: Strategy = STRATEGIES['greedy'], budget: float = BUDGET,
+                 ramp: asyncio.Semaphore|None = None, roster: dict[str, 'RunnerBot']|None = None) -> None:
+        self.name = name
+        self.pool = pool
+        self.strategy = strategy
+        self.budget = budget
+        self.rng = random.Random(name)
+        self.stats = stats
+        self.url = url
+        self.size = size
+        self.mirror = GameMirror(name)
+        self.events = asyncio.Queue()
+        '''Broadcasts and server active messages'''
+        self.ramp = ramp or contextlib.nullcontext()
+        '''Held while connecting and logging in, bounds concurrent handshakes'''
+        self.roster = {} if roster is None else roster
+        '''$name: every bot of the runner, told when their table stalls'''
+
+    async def on_event(self, event: dict) -> None:
+        self.events.put_nowait(event)
+
+    async def request(self, api: dict, **kwargs) -> dict:
+        start = time.perf_counter()
+        resp = await self.conn.query(api, name=self.name, **kwargs)
+        self.stats.record(api['func'], time.perf_counter() - start)
+        if resp['code'] != 0:
+            self.stats.error(api['func'])
+        return resp
+
+    async def wait(self, func: str) -> dict:
+        '''Wait for a broadcast or server message, dropping everything before it'''
+        while 1:
+            event = await self.events.get()
+            if event['func'] == func:
+                return event
+
+    async def connect(self) -> None:
+        '''Open a connection with a fresh mirror and log in'''
+        async with self.ramp:
+            while 1:
+                self.conn = await Connection.connect(self.url)
+                self.mirror = GameMirror(self.name).attach(self.conn)
+                self.events = asyncio.Queue()
+                self.conn.subscribe(self.on_event)
+                try:
+                    resp = await self.request(SYS['login'], key='')
+                except BaseException:
+                    await self.conn.close()
+                    raise
+                if resp['code'] != 403:
+                    return
+                # The server has not dropped our previous connection yet
+                await self.conn.close()
+                await asyncio.sleep(0.1)
+
+    async def run(self, rounds: int, deadline: float) -> None:
+        '''Play `rounds` rounds per table, at new tables until `deadline` (only one table if 0)'''
+        await self.connect()
+        try:
+            while 1:
+                await self.request(QUERY['quickMatch'], size=self.size)
+                await self.wait('matchFound')
+                for _ in range(rounds):
+                    if not await self.play_round():
+                        break
+                if self.mirror.state == 'playing':
+                    # Stalled: nobody may leave a started game, so drop the seat with the connection
+                    await self.conn.close()
+                    await self.connect()
+                elif self.mirror.gid:
+                    await self.request(QUERY['playerLeave'], gid=self.mirror.gid)
+                if time.monotonic() >= deadline:
+                    break
+        finally:
+            await self.conn.close()
+
+    async def play_round(self) -> bool:
+        '''Play one round, False if the table broke up or stalled'''
+        gid = self.mirror.gid
+        begin = time.perf_counter()
+        await self.request(QUERY['playerReady'], gid=gid)
+        while 1:
+            event = await self.events.get()
+            if event['func'] == 'receivePokes':
+                break
+            if event['func'] in ('playerLeave', 'gameEnd'):
+                return False
+        await self.request(QUERY['choosePokeOrder'], gid=gid, reverse=random.random() < 0.5)
+        while 1:
+            event = await self.events.get()
+            if event['func'] == 'gameEnd':
+                if 'scores' not in event:
+                    return False
+                break
+            if event['func'] in ('playerLeave', 'stalled'):
+                return False
+            if event['func'] != 'gameAction' or event['target_name'] != self.name:
+                continue
+            start = time.perf_counter()
+            move, fell_back = await self.pool.decide(self.strategy, View.of_mirror(self.mirror), self.rng, self.budget)
+            self.stats.record('decide', time.perf_counter() - start)
+            if fell_back:
+                self.stats.error('decide')
+            if move is None:
+                # Stuck two-player table: nothing is legal, the round can never end
+                self.stats.stalled += 1
+                for name in self.mirror.players:
+                    if name != self.name and name in self.roster:
+                        self.roster[name].events.put_nowait({'func': 'stalled', 'gid': gid})
+                return False
+            if move[0] == 'show':
+                await self.request(QUERY['show'], gid=gid, b_index=move[1], e_index=move[2])
+            else:
+                await self.request(
+                    QUERY[move[0] if move[0] == 'scout' else 'scoutAndShow'], gid=gid,
+                    index=-1 if move[1] else 0, reverse=int(move[2]), insert_to=move[3]
+                )
+        self.stats.record('round', time.perf_counter() - begin)
+        await self.request(QUERY['confirmResult'], gid=gid)
+        while self.mirror.state == 'end':
+            event = await self.events.get()
+            if event['func'] == 'playerLeave':
+                return False
+        return True
+
+async def main(args: argparse.Namespace) -> dict:
+    stats = Stats()
+    pool = BotPool(args.workers, args.processes)
+    ramp = asyncio.Semaphore(args.ramp)
+    prefix = secrets.token_hex(3)
+    deadline = time.monotonic() + args.soak
+
+    async def launch(bot: RunnerBot) -> None:
+        try:
+            await asyncio.wait_for(bot.run(args.rounds, deadline), args.soak + args.timeout)
+        except Exception as e:
+            stats.error('bot')
+            print(red(f"Bot {bot.name} failed: {e!r}"))
+
+    strategy = STRATEGIES[args.strategy]
+    roster = {}
+    bots = [
+        RunnerBot(f'{prefix}-{i}', pool, stats, args.url, args.size, strategy, args.budget, ramp, roster)
+        for i in range(args.bots)
+    ]
+    roster.update((bot.name, bot) for bot in bots)
+    print(yellow(f"Running {len(bots)} bots on {args.workers} {'process' if args.processes else 'thread'} workers"))
+    try:
+        await asyncio.gather(*(launch(bot) for bot in bots))
+    finally:
+        pool.close()
+    return stats.report()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='ws://localhost:8001')
+    parser.add_argument('--bots', type=int, default=100, help='logical players')
+    parser.add_argument('--size', type=int, default=4, choices=[2, 3, 4, 5], help='players per table')
+    parser.add_argument('--rounds', type=int, default=1, help='rounds per table')
+    parser.add_argument('--soak', type=float, default=0, help='keep re-matching for this many seconds')
+    parser.add_argument('--strategy', default='greedy', choices=list(STRATEGIES))
+    parser.add_argument('--budget', type=float, default=BUDGET, help='seconds per decision')
+    parser.add_argument('--workers', type=int, default=4, help='decision pool size')
+    parser.add_argument('--processes', action='store_true', help='decide in a process pool instead of threads')
+    parser.add_argument('--ramp', type=int, default=200, help='concurrent connection attempts')
+    parser.add_argument('--timeout', type=float, default=300, help='seconds per bot on top of --soak')
+    args = parser.parse_args()
+    print_report(asyncio.run(main(args)))
@@ -1,3 +1,4 @@
+import asyncio
 import websockets
 import json
 from server import (
@@ -9,40 +10,305 @@ from server import (
 QUERY = C2S['main']
 GET = C2S['subjective']
 SYS = C2S['system']
-
-seq_num = 0
+ADMIN = C2S['admin']
 
 async def connect(url: str) -> Websocket:
     '''Connect to server'''
     return await websockets.connect(url)
 
-async def process_bd_event(event: dict) -> None:
-    '''Process broadcast event'''
-    assert 'func' in event.keys(), 'Broadcast error: `func` required'
-    assert 'info' in event.keys(), 'Broadcast error: `info` required'
-    assert 'gid'  in event.keys(), 'Broadcast error: `gid`  required'
-    # TODO
-    print(yellow('Recieve broadcast event:\n'), event, '')
-    
-async def query(websocket: Websocket, data: dict, **kwargs) -> dict:
-    '''Query'''
-    global seq_num
-    await websocket.send(format(data, seq=seq_num, **kwargs))
-    seq_num += 1
-    while 1:
-        response = json.loads(await websocket.recv())
-        if not isinstance(response, dict):
-            rescue = eval(response)
-            if not isinstance(rescue, dict):
-                print(red('Rescue failed: invalid response:'), rescue)
-                continue
-            response = rescue
-        if 'seq' in response.keys():
-            if int(response['seq']) < 0:
-                print(yellow('Recieve server active message:'), response)
-                continue
-            else:
-                if 'code' in response.keys() and 'message' in response.keys():
-                    return response
-        else:
-            await process_bd_event(response)
+def decode(msg: str|bytes) -> dict:
+    '''Decode a server message. Server active messages are JSON-encoded twice'''
+    event = json.loads(msg)
+    if isinstance(event, str):
+        event = json.loads(event)
+    return event
+
+class Connection:
+    '''Websocket with a single background reader.
+
+    Responses resolve the future of their `seq`, so many requests can be in flight at once.
+    Broadcasts and server active messages (`seq < 0`) go to subscribers, in arrival order.'''
+    websocket: Websocket
+    '''Websocket'''
+    pending: dict[int, asyncio.Future]
+    '''$seq: future of the response'''
+    subscribers: list
+    '''async callbacks receiving every broadcast/server message'''
+    handlers: dict[str, list]
+    '''$func: async callbacks receiving broadcasts/server messages of that `func`'''
+    response_hooks: list
+    '''sync callbacks `hook(func, kwargs, response)` run after every successful request'''
+
+    def __init__(self, websocket: Websocket) -> None:
+        self.websocket = websocket
+        self.pending = {}
+        self.subscribers = []
+        self.handlers = {}
+        self.response_hooks = []
+        self.seq = 0
+        self.events = asyncio.Queue()
+        self.reader = asyncio.create_task(self._read())
+        self.dispatcher = asyncio.create_task(self._dispatch())
+
+    @classmethod
+    async def connect(cls, url: str) -> 'Connection':
+        '''Connect to server'''
+        return cls(await connect(url))
+
+    def subscribe(self, callback) -> None:
+        '''Register `async callback(event)` for broadcasts and server active messages'''
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        self.subscribers.remove(callback)
+
+    def on(self, func: str, callback=None):
+        '''Register `async callback(event)` for one event type, e.g. `gameAction`. Usable as a decorator'''
+        if callback is None:
+            def wrapper(callback):
+                self.on(func, callback)
+                return callback
+            return wrapper
+        self.handlers.setdefault(func, []).append(callback)
+        return callback
+
+    async def query(self, data: dict, **kwargs) -> dict:
+        '''Send a request and wait for its response. Safe to call concurrently'''
+        seq = self.seq
+        self.seq += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[seq] = future
+        try:
+            await self.websocket.send(format(data, seq=seq, **kwargs))
+            response = await future
+        finally:
+            self.pending.pop(seq, None)
+        if response.get('code') == 0:
+            for hook in self.response_hooks:
+                hook(data['func'], kwargs, response)
+        return response
+
+    async def close(self) -> None:
+        await self.websocket.close()
+        await asyncio.gather(self.reader, return_exceptions=True)
+        self.dispatcher.cancel()
+
+    async def _read(self) -> None:
+        try:
+            async for msg in self.websocket:
+                event = decode(msg)
+                if 'seq' in event and int(event['seq']) >= 0:
+                    future = self.pending.get(int(event['seq']))
+                    if future is not None and not future.done():
+                        future.set_result(event)
+                    else:
+                        print(red('Unexpected response:'), event)
+                    continue
+                if event.get('func') == 'spectatorFrames':
+                    for frame in event['frames']:
+                        self.events.put_nowait(frame)
+                    continue
+                self.events.put_nowait(event)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('Connection closed'))
+
+    async def _dispatch(self) -> None:
+        while 1:
+            event = await self.events.get()
+            for callback in self.subscribers + self.handlers.get(event.get('func'), []):
+                try:
+                    await callback(event)
+                except Exception as e:
+                    print(red(f'Subscriber error: {e!r}'), event)
+
+def parse_pokes(pokes: str) -> list[tuple[int, int]]:
+    '''Parse "1 2 T,3 4 5" into [(value, disabled value), ...]'''
+    if not pokes or pokes == ',':
+        return []
+    value, disable = pokes.split(',')
+    value = [10 if v == 'T' else int(v) for v in value.split()]
+    disable = [10 if v == 'T' else int(v) for v in disable.split()]
+    return list(zip(value, disable))
+
+class GameMirror:
+    '''Local copy of one player's game, kept up to date from broadcasts and own responses.
+
+    Attach it to a `Connection` before registering other callbacks, so that they see the updated
+    mirror. It answers most of what `getGameInfo`/`getPokes`/`getTotalScore` would.'''
+    name: str
+    '''Own player name'''
+    gid: str
+    '''Game id, empty when not in a game'''
+    players: list[str]
+    '''Seated players in order'''
+    state: str
+    '''recruit, init, playing or end'''
+    info: str
+    '''Latest broadcast info'''
+    hand: list[tuple[int, int]]
+    '''Own pokes as (value, disabled value)'''
+    table: list[tuple[int, int]]
+    '''Displayed pokes'''
+    turn: str
+    '''Player to act'''
+    version: int
+    '''State version of the game from the latest broadcast, for `if_version`'''
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.gid = ''
+        self.players = []
+        self.ready = set()
+        self.confirmed = set()
+        self.total_score = {}
+        self.scores = {}
+        self.info = ''
+        self.version = -1
+        self._reset_round()
+
+    def _reset_round(self) -> None:
+        self.state = 'recruit'
+        self.hand = []
+        self.table = []
+        self.table_owner = ''
+        self.turn = ''
+        self.last_op = None
+        self.history = []
+        self.hand_sizes = {}
+        self.goal_pokes = {}
+        self.extra_points = {}
+        self.scout_and_show = set()
+
+    def attach(self, conn: Connection) -> 'GameMirror':
+        conn.subscribe(self.update)
+        conn.response_hooks.append(self.on_response)
+        return self
+
+    @property
+    def my_turn(self) -> bool:
+        return self.state == 'playing' and self.turn == self.name
+
+    def game_info(self) -> dict:
+        '''Same shape as the `getGameInfo` response'''
+        return {
+            'turn': len(self.history),
+            'players': list(self.players),
+            'goal_pokes': [self.goal_pokes.get(p, 0) for p in self.players],
+            'remain_pokes': [self.hand_sizes.get(p, 0) for p in self.players],
+            'extra_points': dict(self.extra_points),
+            'table': self.table_json(),
+            'last_op': self.last_op,
+        }
+
+    def score(self, name: str|None = None) -> int:
+        '''Current round score, like `getScore`'''
+        name = name or self.name
+        return self.extra_points.get(name, 0) + self.goal_pokes.get(name, 0) - self.hand_sizes.get(name, 0)
+
+    def table_json(self) -> str:
+        return ' '.join(_str(v) for v, _ in self.table) + ',' + ' '.join(_str(d) for _, d in self.table)
+
+    def on_response(self, func: str, kwargs: dict, response: dict) -> None:
+        '''Apply own requests that no broadcast reports'''
+        if func == 'playerJoin':
+            self.gid = str(response['message'])
+        elif func == 'choosePokeOrder' and int(kwargs.get('reverse', 0)):
+            self.hand = [(d, v) for v, d in self.hand]
+        elif func == 'playerLeave':
+            self.gid = ''
+            self.players = []
+            self.total_score = {}
+            self._reset_round()
+
+    async def update(self, event: dict) -> None:
+        func = event.get('func')
+        if 'gid' in event and self.gid and str(event['gid']) != self.gid:
+            return
+        if 'info' in event:
+            self.info = event['info']
+        if 'version' in event:
+            self.version = event['version']
+        if func == 'matchFound':
+            self.gid = str(event['gid'])
+            self.players = list(event['players'])
+            self.total_score = {p: 0 for p in self.players}
+        elif func == 'playerJoin':
+            if event['target_name'] == self.name:
+                self.gid = str(event['gid'])
+            if event['target_name'] not in self.players:
+                self.players.append(event['target_name'])
+            self.total_score.setdefault(event['target_name'], 0)
+        elif func == 'playerLeave':
+            if event['target_name'] in self.players:
+                self.players.remove(event['target_name'])
+            self.total_score.pop(event['target_name'], None)
+        elif func == 'playerReady':
+            self.ready.add(event['target_name'])
+        elif func == 'playerUnready':
+            self.ready.discard(event['target_name'])
+        elif func == 'gameInit':
+            self._reset_round()
+            self.state = 'init'
+            self.confirmed = set()
+        elif func == 'receivePokes':
+            self.hand = parse_pokes(event['pokes'])
+            self.hand_sizes = {p: len(self.hand) for p in self.players}
+            self.goal_pokes = {p: 0 for p in self.players}
+            self.extra_points = {p: 0 for p in self.players}
+        elif func == 'gameStart':
+            self.state = 'playing'
+            self.table = parse_pokes(event['table'])
+        elif func == 'turnToPlay':
+            self.turn = event['name']
+        elif func == 'gameAction':
+            self.turn = event['target_name']
+            self._apply(event['op'])
+            self.table = parse_pokes(event['table'])
+        elif func == 'gameEnd':
+            if 'scores' not in event:
+                # Terminated by the server
+                self.gid = ''
+                self.players = []
+                self._reset_round()
+                return
+            # The operation that ended the round has no `gameAction` of its own
+            self._apply(event['op'])
+            self.table = parse_pokes(event['table'])
+            self.state = 'end'
+            self.turn = ''
+            self.ready = set()
+            self.scores = dict(event['scores'])
+            for name, score in self.scores.items():
+                self.total_score[name] = self.total_score.get(name, 0) + score
+            self.history.append(f"游戏结束")
+        elif func == 'playerConfirm':
+            self.confirmed.add(event['target_name'])
+            if self.confirmed >= set(self.players):
+                self._reset_round()
+
+    def _apply(self, op: dict) -> None:
+        self.last_op = op
+        self.history.append(op['game_operation'])
+        actor = op['target_name']
+        if op['type_'] == 0:
+            shown = parse_pokes(op['detail'])
+            self.goal_pokes[actor] = self.goal_pokes.get(actor, 0) + len(self.table)
+            self.hand_sizes[actor] = self.hand_sizes.get(actor, 0) - len(shown)
+            self.table_owner = actor
+            if actor == self.name:
+                self.hand = [poke for poke in self.hand if poke not in shown]
+        elif op['type_'] in (1, 2):
+            poke = parse_pokes(op['detail'])[0]
+            if self.table_owner:
+                self.extra_points[self.table_owner] = self.extra_points.get(self.table_owner, 0) + 1
+            self.hand_sizes[actor] = self.hand_sizes.get(actor, 0) + 1
+            if op['type_'] == 2:
+                self.scout_and_show.add(actor)
+            if actor == self.name:
+                self.hand.insert(op['pos'], poke)
+
+def _str(value: int) -> str:
+    return 'T' if value == 10 else str(value)
+
@@ -0,0 +1,194 @@
+'''Position evaluation cache for bot searches
+
+Results are keyed by a canonical encoding of the position: every poke of the
+hand in order as (active, disabled) values, so orientation is part of the key,
+then the displayed pokes. A bounded LRU serves each process. Optionally a
+direct-mapped table in shared memory is consulted on a local miss, so worker
+processes of one run share what any of them computed.
+
+    cache = EvalCache(evaluate, maxsize=1 << 16)
+    cache(hand, table)
+    cache.stats()  # {'hits': ..., 'misses': ..., 'hit_rate': ...}
+'''
+import hashlib
+import struct
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+MISSING = object()
+
+def encode(hand, table) -> bytes:
+    '''Canonical position key. Pokes are (value, disabled value) with values 1~10'''
+    return bytes([len(hand), *(x for poke in hand for x in poke), *(x for poke in table for x in poke)])
+
+def pack_pairs(pairs) -> bytes:
+    '''Encode [(b, e), ...] with indexes below 256'''
+    return bytes(x for pair in pairs for x in pair)
+
+def unpack_pairs(data: bytes) -> tuple[tuple[int, int], ...]:
+    return tuple(zip(data[::2], data[1::2]))
+
+class LRUCache:
+    '''Bounded mapping that evicts the least recently used entry'''
+    maxsize: int
+    '''Entries kept'''
+
+    def __init__(self, maxsize: int = 1 << 16) -> None:
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def get(self, key):
+        '''Cached value or `MISSING`, counting the hit or miss'''
+        value = self.data.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.data.move_to_end(key)
+        return value
+
+    def put(self, key, value) -> None:
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+class SharedTable:
+    '''Direct-mapped table in shared memory: one slot per key hash, newer entries overwrite.
+
+    A slot is [8-byte key hash][1-byte length][value][8-byte checksum], the checksum covering the
+    hash, length and value. Writers are not locked, so concurrent writes of one slot can interleave;
+    a reader only trusts a slot whose checksum matches what it read, and treats a torn one as a miss.'''
+    VALUE = 126
+    '''Max value bytes per slot'''
+    SLOT = 8 + 1 + VALUE + 8
+    slots: int
+    '''Slot count'''
+
+    def __init__(self, slots: int, name: str|None = None) -> None:
+        self.slots = slots
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=slots * self.SLOT)
+            self.memory.buf[:] = bytes(slots * self.SLOT)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.memory.name
+
+    @staticmethod
+    def digest(key: bytes) -> int:
+        # Must not depend on PYTHONHASHSEED, which differs between processes
+        return struct.unpack('<Q', hashlib.blake2b(key, digest_size=8).digest())[0] or 1
+
+    @staticmethod
+    def checksum(head: bytes, value: bytes) -> bytes:
+        '''Checksum of a slot's hash and length bytes and its value'''
+        return hashlib.blake2b(value, digest_size=8, key=head).digest()
+
+    def get(self, key: bytes) -> bytes|None:
+        h = self.digest(key)
+        base = (h % self.slots) * self.SLOT
+        buf = self.memory.buf
+        if struct.unpack_from('<Q', buf, base)[0] != h:
+            return None
+        # Copy the slot once, then check the copy: a writer may be changing the slot meanwhile
+        slot = bytes(buf[base:base + self.SLOT])
+        head, length = slot[:9], slot[8]
+        if length > self.VALUE or struct.unpack_from('<Q', slot)[0] != h:
+            return None
+        value = slot[9:9 + length]
+        if slot[9 + self.VALUE:] != self.checksum(head, value):
+            return None
+        return value
+
+    def put(self, key: bytes, value: bytes) -> bool:
+        '''Store `value`, False if it does not fit a slot'''
+        if len(value) > self.VALUE:
+            return False
+        h = self.digest(key)
+        base = (h % self.slots) * self.SLOT
+        head = struct.pack('<QB', h, len(value))
+        buf = self.memory.buf
+        buf[base:base + 9] = head
+        buf[base + 9:base + 9 + len(value)] = value
+        buf[base + 9 + self.VALUE:base + self.SLOT] = self.checksum(head, value)
+        return True
+
+    def close(self) -> None:
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+class EvalCache:
+    '''Memoized `evaluate(hand, table)` with LRU eviction and an optional shared table.
+
+    Values go through `pack`/`unpack` to live in shared memory, by default for lists of index pairs.
+    A disabled cache calls `evaluate` directly and counts nothing.'''
+    enabled: bool
+    '''Whether results are cached'''
+    local: LRUCache
+    '''Per-process cache'''
+    shared: SharedTable|None
+    '''Cross-process table, None if not attached'''
+
+    def __init__(self, evaluate, maxsize: int = 1 << 16, pack=pack_pairs, unpack=unpack_pairs,
+                 enabled: bool = True) -> None:
+        self.evaluate = evaluate
+        self.enabled = enabled
+        self.local = LRUCache(maxsize)
+        self.shared = None
+        self.pack = pack
+        self.unpack = unpack
+        self.shared_hits = 0
+
+    def __call__(self, hand, table):
+        if not self.enabled:
+            return self.evaluate(hand, table)
+        key = encode(hand, table)
+        value = self.local.get(key)
+        if value is not MISSING:
+            return value
+        if self.shared is not None:
+            data = self.shared.get(key)
+            if data is not None:
+                self.shared_hits += 1
+                value = self.unpack(data)
+                self.local.put(key, value)
+                return value
+        value = self.evaluate(hand, table)
+        self.local.put(key, value)
+        if self.shared is not None:
+            self.shared.put(key, self.pack(value))
+        return value
+
+    def attach(self, table: SharedTable) -> None:
+        '''Also look up and publish results in `table`'''
+        self.shared = table
+
+    def stats(self) -> dict:
+        '''Counters since the last `clear`. Shared hits are local misses served from shared memory'''
+        lookups = self.local.hits + self.local.misses
+        return {
+            'hits': self.local.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.local.misses - self.shared_hits,
+            'evictions': self.local.evictions,
+            'size': len(self.local),
+            'hit_rate': (self.local.hits + self.shared_hits) / lookups if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        self.local.clear()
+        self.shared_hits = 0
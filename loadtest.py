@@ -0,0 +1,313 @@
+'''Load generator: simulated players against a running `app.py`
+
+Every bot owns a `client.Connection`, logs in, joins a table
+through `playerJoin`, readies up, chooses its poke order and plays complete
+rounds with a simple legal-move policy. Latency is recorded for every `func`
+(request -> response) and for every broadcast (triggering request -> delivery).
+
+    python app.py &
+    python loadtest.py --players 1000 --table-size 4 --rounds 2
+
+Set `DEBUG=False` in `app.py` and `server/core/states.py` before measuring,
+otherwise the server spends most of its time printing.
+'''
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import secrets
+import subprocess
+import sys
+import time
+
+from client import (
+    Connection, GameMirror, parse_pokes,
+    QUERY, GET, SYS,
+    green, yellow, red
+)
+from server import Poke, PokeCombine
+from strategy import View, fallback
+
+
+def percentile(samples: list[float], q: float) -> float:
+    '''Nearest-rank percentile of sorted samples'''
+    if not samples:
+        return 0.0
+    idx = min(len(samples) - 1, max(0, int(round(q / 100 * len(samples) + 0.5)) - 1))
+    return samples[idx]
+
+class Stats:
+    '''Latency samples keyed by `func` (requests) or `bd:func` (broadcasts)'''
+    latency: dict[str, list[float]]
+    '''Samples in seconds'''
+    errors: dict[str, int]
+    '''Non-zero response codes'''
+    stalled: int
+    '''Rounds that stalled: nothing beat the table and scouting was not allowed'''
+
+    def __init__(self) -> None:
+        self.latency = {}
+        self.errors = {}
+        self.stalled = 0
+        self.begin = time.perf_counter()
+
+    def record(self, key: str, seconds: float) -> None:
+        self.latency.setdefault(key, []).append(seconds)
+
+    def error(self, key: str) -> None:
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def report(self) -> dict:
+        '''Aggregate samples into throughput and p50/p95/p99 (milliseconds)'''
+        wall = time.perf_counter() - self.begin
+        rows = {}
+        for key, samples in sorted(self.latency.items()):
+            samples = sorted(samples)
+            rows[key] = {
+                'count': len(samples),
+                'errors': self.errors.get(key, 0),
+                'rate': len(samples) / wall if wall else 0.0,
+                'p50': percentile(samples, 50) * 1000,
+                'p95': percentile(samples, 95) * 1000,
+                'p99': percentile(samples, 99) * 1000,
+            }
+        requests = sum(r['count'] for k, r in rows.items() if not k.startswith('bd:'))
+        return {
+            'wall': wall,
+            'requests': requests,
+            'throughput': requests / wall if wall else 0.0,
+            'stalled': self.stalled,
+            'funcs': rows,
+        }
+
+class Table:
+    '''State shared by the bots seated at one table'''
+    size: int
+    '''Number of seats'''
+    gid: str
+    '''Game id, set by the creator'''
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.gid = ''
+        self.created = asyncio.Event()
+        self.seated = asyncio.Event()
+        self.joined = 0
+        self.queues = []
+        '''Event queues of the seated bots'''
+        self.sent = {}
+        '''$name: time of the last state-changing request'''
+        self.last_sent = time.perf_counter()
+
+    def mark(self, name: str) -> None:
+        self.last_sent = self.sent[name] = time.perf_counter()
+
+    def since(self, name: str|None) -> float:
+        return time.perf_counter() - self.sent.get(name, self.last_sent)
+
+    def stall(self) -> None:
+        '''Tell every seated bot that the round can not go on'''
+        for queue in self.queues:
+            queue.put_nowait({'func': 'stalled'})
+
+def choose_move(hand: list[Poke], table: list[Poke]) -> tuple[int, int]|None:
+    '''Longest combine that beats the table as (b_index, e_index), None to scout'''
+    displayed = PokeCombine(table)
+    for length in range(len(hand), 0, -1):
+        for begin in range(len(hand) - length + 1):
+            combine = PokeCombine(hand[begin:begin + length])
+            if combine.type_ != 0 and combine > displayed:
+                return begin, begin + length
+    return None
+
+class Bot:
+    '''Simulated player on its own websocket'''
+    name: str
+    '''Player name'''
+    table: Table
+    '''Seat'''
+
+    def __init__(self, name: str, table: Table, stats: Stats, url: str, poll: bool = False,
+                 ramp: asyncio.Semaphore|None = None) -> None:
+        self.name = name
+        self.table = table
+        self.stats = stats
+        self.url = url
+        self.poll = poll
+        '''Fetch the hand with `getPokes` each turn instead of reading the mirror'''
+        self.ramp = ramp or contextlib.nullcontext()
+        '''Held while connecting and logging in, bounds concurrent handshakes'''
+        self.mirror = GameMirror(name)
+        self.events = asyncio.Queue()
+        '''Broadcasts and server active messages'''
+
+    async def on_event(self, event: dict) -> None:
+        if 'seq' not in event:
+            actor = event['op']['target_name'] if 'op' in event else event.get('target_name')
+            self.stats.record('bd:' + event['func'], self.table.since(actor))
+        self.events.put_nowait(event)
+
+    async def request(self, api: dict, **kwargs) -> dict:
+        '''Send a request and wait for its response'''
+        if api['func'] in QUERY:
+            self.table.mark(self.name)
+        while 1:
+            start = time.perf_counter()
+            resp = await self.conn.query(api, name=self.name, **kwargs)
+            self.stats.record(api['func'], time.perf_counter() - start)
+            if resp['code'] != 0:
+                self.stats.error(api['func'])
+            if resp['code'] != 429:
+                return resp
+            # Rate limited: the move is still ours to make, send it again once tokens refill
+            await asyncio.sleep(0.1)
+
+    async def wait(self, func: str) -> dict:
+        '''Wait for a broadcast or server message, dropping everything before it'''
+        while 1:
+            event = await self.events.get()
+            if event['func'] == func:
+                return event
+
+    async def run(self, rounds: int, creator: bool) -> None:
+        async with self.ramp:
+            self.conn = await Connection.connect(self.url)
+            self.mirror.attach(self.conn)
+            self.conn.subscribe(self.on_event)
+            try:
+                await self.request(SYS['login'], key='')
+            except BaseException:
+                await self.conn.close()
+                raise
+        try:
+            if creator:
+                resp = await self.request(QUERY['playerJoin'], gid='')
+                self.table.gid = resp['message']
+                self.table.created.set()
+            else:
+                await self.table.created.wait()
+                await self.request(QUERY['playerJoin'], gid=self.table.gid)
+            self.table.joined += 1
+            self.table.queues.append(self.events)
+            if self.table.joined == self.table.size:
+                self.table.seated.set()
+            await self.table.seated.wait()
+            for _ in range(rounds):
+                if not await self.play_round():
+                    # Nobody may leave a started game, the reaper evicts it
+                    return
+            await self.request(QUERY['playerLeave'], gid=self.table.gid)
+        finally:
+            await self.conn.close()
+
+    async def play_round(self) -> bool:
+        '''Play one round, False if it stalled'''
+        gid = self.table.gid
+        await self.request(QUERY['playerReady'], gid=gid)
+        await self.wait('receivePokes')
+        await self.request(QUERY['choosePokeOrder'], gid=gid, reverse=random.random() < 0.5)
+        while 1:
+            event = await self.events.get()
+            if event['func'] == 'gameEnd':
+                break
+            if event['func'] == 'stalled':
+                return False
+            if event['func'] != 'gameAction' or event['target_name'] != self.name:
+                continue
+            if self.poll:
+                resp = await self.request(GET['getPokes'], gid=gid)
+                hand = [Poke(*poke) for poke in parse_pokes(resp['message'])]
+                if parse_pokes(resp['message']) != self.mirror.hand:
+                    self.stats.error('mirror')
+            else:
+                hand = [Poke(*poke) for poke in self.mirror.hand]
+            table = [Poke(*poke) for poke in parse_pokes(event['table'])]
+            move = choose_move(hand, table)
+            if move is not None:
+                resp = await self.request(QUERY['show'], gid=gid, b_index=move[0], e_index=move[1])
+            else:
+                # Random scouts keep deterministic bots from cycling forever
+                resp = await self.request(
+                    QUERY['scout'], gid=gid,
+                    index=random.choice([0, -1]), reverse=random.random() < 0.5,
+                    insert_to=random.randint(0, len(hand))
+                )
+            if resp['code'] == 0:
+                continue
+            # Refused, e.g. a scout of the bot's own pokes: play a legal move instead
+            move = fallback(View.of_mirror(self.mirror), random)
+            if move is None:
+                # Nothing beats the table and scouting is not allowed, as on most two-player tables
+                self.stats.stalled += 1
+                self.table.stall()
+                return False
+            if move[0] == 'show':
+                await self.request(QUERY['show'], gid=gid, b_index=move[1], e_index=move[2])
+            else:
+                await self.request(
+                    QUERY['scout'], gid=gid,
+                    index=-1 if move[1] else 0, reverse=int(move[2]), insert_to=move[3]
+                )
+        await self.request(QUERY['confirmResult'], gid=gid)
+        confirmed = 0
+        while confirmed < self.table.size:
+            await self.wait('playerConfirm')
+            confirmed += 1
+        return True
+
+def print_report(report: dict) -> None:
+    print(green(f"{report['requests']} requests in {report['wall']:.2f}s, {report['throughput']:.1f} req/s"))
+    if report['stalled']:
+        print(yellow(f"{report['stalled']} rounds stalled: nothing beat the table and scouting was not allowed"))
+    print(f"{'func':<22}{'count':>9}{'errors':>8}{'rate/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for key, row in report['funcs'].items():
+        print(f"{key:<22}{row['count']:>9}{row['errors']:>8}{row['rate']:>10.1f}{row['p50']:>10.2f}{row['p95']:>10.2f}{row['p99']:>10.2f}")
+
+async def main(args: argparse.Namespace) -> dict:
+    stats = Stats()
+    prefix = secrets.token_hex(3)
+    ramp = asyncio.Semaphore(args.ramp)
+    bots = []
+    for t in range(args.players // args.table_size):
+        table = Table(args.table_size)
+        for s in range(args.table_size):
+            bots.append((Bot(f'{prefix}-{t}-{s}', table, stats, args.url, args.poll, ramp), s == 0))
+
+    async def launch(bot: Bot, creator: bool) -> None:
+        try:
+            await asyncio.wait_for(bot.run(args.rounds, creator), args.timeout)
+        except Exception as e:
+            stats.error('bot')
+            print(red(f"Bot {bot.name} failed: {e!r}"))
+
+    await asyncio.gather(*(launch(bot, creator) for bot, creator in bots))
+    return stats.report()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='ws://localhost:8001')
+    parser.add_argument('--players', type=int, default=100, help='simulated players')
+    parser.add_argument('--table-size', type=int, default=4, choices=[2, 3, 4, 5])
+    parser.add_argument('--rounds', type=int, default=1, help='rounds played per table')
+    parser.add_argument('--ramp', type=int, default=200, help='concurrent connection attempts')
+    parser.add_argument('--timeout', type=float, default=300, help='seconds per bot')
+    parser.add_argument('--serve', action='store_true', help='start `app.py` in a subprocess first')
+    parser.add_argument('--poll', action='store_true', help='poll `getPokes` each turn instead of mirroring broadcasts')
+    parser.add_argument('--json', default='', help='write the report to this file')
+    args = parser.parse_args()
+
+    server = None
+    if args.serve:
+        server = subprocess.Popen([sys.executable, 'app.py'], stdout=subprocess.DEVNULL)
+        time.sleep(1)
+    try:
+        report = asyncio.run(main(args))
+    finally:
+        if server:
+            server.terminate()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(yellow(f"Report written to {args.json}"))
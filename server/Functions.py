@@ -1,4 +1,5 @@
 # Load Functions
 from .lobby import *
 from .game import *
-from .room import *
\ No newline at end of file
+from .room import *
+from .admin import *
@@ -4,12 +4,22 @@ from .static import (
     Query,
     PLAYER, GAMER,
     find_player, find_player_ws, find_game, find_game_ws,
+    create_game, touch_game,
 )
 from .core import (
     Websocket,
     Gamer, Player, Poke, PokeCombine,
+    LobbyIndex, LOBBY, PlayerStore, STORE, Leaderboard, LEADERBOARD,
+    RoundExporter, EXPORTER, read_rounds,
     GameState, PlayerState, PokeState, GameOperation,
+    segments, scout_advice, player_scout_advice,
+    rules, RoundState,
     BD, S2C, C2S, format, yellow, red, green,
     send, recv, bd, error, ok,
     DEBUG
-)
\ No newline at end of file
+)
+from .match import Matchmaker, MATCHER
+from .reaper import Reaper, REAPER
+from .checkpoint import Checkpointer, CHECKPOINT
+from .oplog import OpLog, Standby, OPLOG, STANDBY
+from .clock import Timer, TimerWheel, TurnClock, WHEEL, CLOCK
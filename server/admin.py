@@ -0,0 +1,74 @@
+from .static import *
+from .profiler import PROFILER, ADMINS
+
+def _check_admin(query: Query) -> None:
+    assert query.name in ADMINS, 'Admin only. Log in with the admin key'
+
+async def profileStart(query: Query):
+    '''Start profiling the requests of one func or one game. Require admin
+
+    mode: `cprofile` (every call) or `sample` (stack samples, low overhead), default sample
+
+    target_func / target_gid: the func or the gid to profile, exactly one of them
+
+    interval: float, seconds between samples, default 0.001
+    '''
+    _check_admin(query)
+    mode = str(query.get('mode', 'sample'))
+    func = str(query.get('target_func', ''))
+    gid = str(query.get('target_gid', ''))
+    assert bool(func) != bool(gid), 'Profile either one `target_func` or one `target_gid`'
+    interval = float(query.get('interval', 0.001))
+    assert 0 < interval <= 1, 'Invalid interval'
+    PROFILER.start(mode, 'func' if func else 'gid', func or gid, interval)
+    await query.ok()
+    if DEBUG:
+        print(yellow(f"Admin {query.name} profiles {func or gid} with {mode}."), f" Websocket: {id(query.ws)}")
+
+async def profileReport(query: Query):
+    '''Hot spots of the profiled requests so far. Require admin
+
+    top: int, functions per list, default 20
+
+    sort: `cumulative`, `tottime` or `calls`, for cprofile only
+    '''
+    _check_admin(query)
+    top = int(query.get('top', 20))
+    assert 0 < top <= 200, 'Invalid top. 1 ~ 200 functions.'
+    await query.ok(PROFILER.report(top, str(query.get('sort', 'cumulative'))))
+
+async def profileStop(query: Query):
+    '''Stop profiling and respond the final report. Require admin'''
+    _check_admin(query)
+    top = int(query.get('top', 20))
+    assert 0 < top <= 200, 'Invalid top. 1 ~ 200 functions.'
+    PROFILER.stop()
+    await query.ok(PROFILER.report(top, str(query.get('sort', 'cumulative'))))
+    if DEBUG:
+        print(yellow(f"Admin {query.name} stops profiling."), f" Websocket: {id(query.ws)}")
+
+async def memorySnapshot(query: Query):
+    '''Memory of games, players, pokes and histories, and the top allocation sites. Require admin
+
+    The first call starts tracemalloc, later calls report growth since the previous snapshot.
+
+    Costly on a busy server: the census runs a full garbage collection and walks every live object
+    on the event loop, which stalls all games for about 0.1 s per 100,000 objects. Tracing also slows
+    every allocation until `memoryStop`.
+
+    top: int, allocation sites, default 10
+
+    frames: int, traceback depth when tracing starts, default 1
+    '''
+    _check_admin(query)
+    top = int(query.get('top', 10))
+    frames = int(query.get('frames', 1))
+    assert 0 < top <= 100, 'Invalid top. 1 ~ 100 sites.'
+    assert 0 < frames <= 50, 'Invalid frames. 1 ~ 50.'
+    await query.ok(await PROFILER.memory(top, frames))
+
+async def memoryStop(query: Query):
+    '''Stop tracemalloc. Require admin'''
+    _check_admin(query)
+    PROFILER.memory_stop()
+    await query.ok()
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import time
+import zlib
+from datetime import datetime
+
+from .static import (
+    Gamer, Player,
+    GAMER,
+    yellow, DEBUG
+)
+
+CHECKPOINT_DIR = 'checkpoints'
+'''One file per game, `$gid.ckpt`'''
+INTERVAL = 5
+'''Seconds between checkpoints'''
+
+class Checkpointer:
+    '''Writes the games of `GAMER` that changed since the last checkpoint to disk, and restores them on startup.
+
+    A file is the zlib-compressed compact JSON of `Gamer.snapshot`. Files are replaced atomically,
+    so a crash mid-write leaves the previous checkpoint of that game'''
+    path: str
+    '''Checkpoint directory'''
+    interval: float
+    '''Seconds between checkpoints'''
+    saved: dict[str, int]
+    '''$gid: version of the game on disk'''
+    resuming: dict[str, Player]
+    '''$name: restored player who has not logged in again yet'''
+    waiting: set[str]
+    '''Restored games whose players have not all logged in again'''
+
+    def __init__(self, path: str = CHECKPOINT_DIR, interval: float = INTERVAL) -> None:
+        self.path = path
+        self.interval = interval
+        self.saved = {}
+        self.resuming = {}
+        self.waiting = set()
+
+    def file(self, gid: str) -> str:
+        return os.path.join(self.path, f'{gid}.ckpt')
+
+    def collect(self) -> tuple[list[dict], list[str]]:
+        '''Snapshots of the games changed since the last checkpoint and gids of removed games.
+        Runs on the event loop, so every snapshot is consistent'''
+        changed = []
+        for gid, entry in GAMER.items():
+            gamer: Gamer = entry['gamer']
+            if self.saved.get(gid) != gamer.version:
+                snapshot = gamer.snapshot()
+                snapshot['start_time'] = entry['startTime'].isoformat(timespec='seconds')
+                changed.append(snapshot)
+        removed = [gid for gid in self.saved if gid not in GAMER]
+        return changed, removed
+
+    def write(self, changed: list[dict], removed: list[str]) -> None:
+        '''Encode and write snapshots, delete the files of removed games. Blocking, run it in a thread'''
+        os.makedirs(self.path, exist_ok=True)
+        for snapshot in changed:
+            data = zlib.compress(json.dumps(snapshot, separators=(',', ':'), ensure_ascii=False).encode())
+            target = self.file(snapshot['gid'])
+            with open(target + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(target + '.tmp', target)
+        for gid in removed:
+            try:
+                os.remove(self.file(gid))
+            except FileNotFoundError:
+                pass
+
+    def commit(self, changed: list[dict], removed: list[str]) -> None:
+        for snapshot in changed:
+            self.saved[snapshot['gid']] = snapshot['version']
+        for gid in removed:
+            self.saved.pop(gid, None)
+
+    async def checkpoint(self) -> int:
+        '''Write changed games off the event loop, return how many were written'''
+        changed, removed = self.collect()
+        if changed or removed:
+            await asyncio.to_thread(self.write, changed, removed)
+            self.commit(changed, removed)
+        return len(changed)
+
+    def save(self) -> int:
+        '''Blocking checkpoint, for shutdown'''
+        changed, removed = self.collect()
+        self.write(changed, removed)
+        self.commit(changed, removed)
+        return len(changed)
+
+    async def run(self) -> None:
+        '''Checkpoint periodically, forever'''
+        while 1:
+            await asyncio.sleep(self.interval)
+            try:
+                written = await self.checkpoint()
+                if DEBUG and written:
+                    print(yellow(f"Checkpoint: {written} games written"))
+            except Exception:
+                import traceback
+                traceback.print_exc()
+
+    def restore(self) -> list[str]:
+        '''Load every checkpoint into `GAMER` and return the gids. Restored games wait for their players to log in again'''
+        if not os.path.isdir(self.path):
+            return []
+        restored = []
+        now = time.monotonic()
+        for file in sorted(os.listdir(self.path)):
+            if not file.endswith('.ckpt'):
+                continue
+            try:
+                with open(os.path.join(self.path, file), 'rb') as f:
+                    snapshot = json.loads(zlib.decompress(f.read()))
+                gamer = Gamer.restore(snapshot)
+            except Exception:
+                import traceback
+                traceback.print_exc()
+                continue
+            gid = gamer.gid
+            GAMER[gid] = {
+                'gamer': gamer,
+                'startTime': datetime.fromisoformat(snapshot['start_time']),
+                'lastActive': now,
+                'lastChange': now,
+            }
+            self.saved[gid] = gamer.version
+            self.adopt(gamer)
+            restored.append(gid)
+        if DEBUG and restored:
+            print(yellow(f"Checkpoint: {len(restored)} games restored, {len(self.resuming)} players to resume"))
+        return restored
+
+    def claim(self) -> None:
+        '''Take over the files of another server, e.g. the primary of a standby: the next checkpoint
+        overwrites those of live games and deletes the rest'''
+        if not os.path.isdir(self.path):
+            return
+        for file in os.listdir(self.path):
+            if file.endswith('.ckpt'):
+                self.saved.setdefault(file[:-len('.ckpt')], -1)
+
+    def adopt(self, gamer: Gamer) -> None:
+        '''Hold `gamer` until its players, who are not logged in, log in again'''
+        for player in gamer.players:
+            self.resuming[player.name] = player
+        if gamer.players:
+            self.waiting.add(gamer.gid)
+
+    def resume(self, name: str) -> Player|None:
+        '''Restored player `name`, to log in in place of a new `Player`. None if there is none'''
+        return self.resuming.pop(name, None)
+
+    def is_waiting(self, gid: str) -> bool:
+        '''Whether restored game `gid` still waits for players to log in again. It accepts no state-changing requests until then'''
+        if gid not in self.waiting:
+            return False
+        entry = GAMER.get(gid)
+        if entry is None or all(player._is_logged for player in entry['gamer'].players):
+            self.waiting.discard(gid)
+            return False
+        return True
+
+CHECKPOINT = Checkpointer()
+'''Global checkpointer'''
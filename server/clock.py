@@ -0,0 +1,247 @@
+import asyncio
+import math
+import time
+
+from .static import (
+    Gamer, Player,
+    BD,
+    find_game,
+    yellow, DEBUG
+)
+from .core import GameState, PlayerState, PokeCombine
+from .checkpoint import CHECKPOINT
+from .oplog import OPLOG
+
+TICK = 0.1
+'''Seconds per tick of the innermost wheel'''
+SLOTS = 64
+'''Slots per wheel, a power of two'''
+LEVELS = 4
+'''Wheels. Each one spans `SLOTS` turns of the one inside it, 4 x 64 slots of 0.1 s reach 19 days'''
+TIMEOUTS = {'INIT': 30.0, 'TURN': 60.0, 'END': 60.0}
+'''Seconds a phase waits for its players: choosing the poke order, one turn, confirming the result'''
+
+class Timer:
+    '''A scheduled callback. `cancel` is O(1)'''
+    __slots__ = ('tick', 'callback', 'args', 'slot')
+
+    def __init__(self, tick: int, callback, args: tuple) -> None:
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.slot = None
+        '''Slot holding the timer, None once fired or cancelled'''
+
+    @property
+    def active(self) -> bool:
+        return self.slot is not None
+
+    def cancel(self) -> None:
+        if self.slot is not None:
+            self.slot.discard(self)
+            self.slot = None
+
+class TimerWheel:
+    '''Hierarchical timer wheel driven by one task for any number of timers.
+
+    A timer sits in the innermost wheel that spans its deadline. When a wheel completes a turn, the
+    next slot of the wheel outside it is redistributed inwards. Scheduling, cancelling and firing
+    are O(1), and a tick costs the same whether 10 or 100,000 timers are pending'''
+    tick: float
+    '''Seconds per tick'''
+    now: int
+    '''Ticks processed since start'''
+
+    def __init__(self, tick: float = TICK, slots: int = SLOTS, levels: int = LEVELS) -> None:
+        assert slots & (slots - 1) == 0, 'Slots must be a power of two'
+        self.tick = tick
+        self.bits = slots.bit_length() - 1
+        self.mask = slots - 1
+        self.wheels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self.horizon = slots ** levels - 1
+        '''Farthest deadline in ticks, later ones are clamped'''
+        self.now = 0
+        self.origin = time.monotonic()
+
+    def schedule(self, delay: float, callback, *args) -> Timer:
+        '''Call `callback(*args)` on the loop after `delay` seconds, rounded up to a tick'''
+        ticks = min(max(1, math.ceil(delay / self.tick)), self.horizon)
+        timer = Timer(self.now + ticks, callback, args)
+        self._place(timer)
+        return timer
+
+    def __len__(self) -> int:
+        '''Pending timers'''
+        return sum(len(slot) for wheel in self.wheels for slot in wheel)
+
+    def _place(self, timer: Timer) -> None:
+        ahead = max(0, timer.tick - self.now)
+        level = 0
+        while ahead >> (self.bits * (level + 1)) and level < len(self.wheels) - 1:
+            level += 1
+        slot = self.wheels[level][(timer.tick >> (self.bits * level)) & self.mask]
+        slot.add(timer)
+        timer.slot = slot
+
+    def _cascade(self, level: int) -> None:
+        slot = self.wheels[level][(self.now >> (self.bits * level)) & self.mask]
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            self._place(timer)
+
+    def advance(self, now: float|None = None) -> int:
+        '''Process every tick up to `now`, return how many timers fired'''
+        now = time.monotonic() if now is None else now
+        target = int((now - self.origin) / self.tick)
+        fired = 0
+        while self.now < target:
+            self.now += 1
+            # Outer wheels first: a cascaded timer may be due in this very tick
+            level = 1
+            while level < len(self.wheels) and not self.now & ((1 << (self.bits * level)) - 1):
+                level += 1
+            for outer in range(level - 1, 0, -1):
+                self._cascade(outer)
+            slot = self.wheels[0][self.now & self.mask]
+            if not slot:
+                continue
+            due = list(slot)
+            slot.clear()
+            for timer in due:
+                timer.slot = None
+            for timer in due:
+                fired += 1
+                try:
+                    timer.callback(*timer.args)
+                except Exception:
+                    import traceback
+                    traceback.print_exc()
+        return fired
+
+    async def run(self) -> None:
+        '''Advance every tick, forever'''
+        while 1:
+            await asyncio.sleep(self.tick)
+            self.advance()
+
+class TurnClock:
+    '''Per-phase clocks of all games on one `TimerWheel`.
+
+    A game has at most one clock: `INIT` for the players choosing their poke order, `TURN` for the
+    player in turn, `END` for confirming the result. `arm` runs after every state-changing request and
+    restarts the clock only when the phase moved on. On timeout the server plays for the late players:
+    the poke order is kept, a turn scouts the table's last poke to the end of the hand (or shows the
+    smallest legal combine when it cannot scout), and the result is confirmed'''
+    timeouts: dict[str, float]
+    '''$phase: seconds'''
+    clocks: dict[str, tuple[tuple, Timer]]
+    '''$gid: (phase key, timer)'''
+    timeouts_applied: int
+    '''Default moves played so far'''
+
+    def __init__(self, wheel: TimerWheel, timeouts: dict[str, float] = TIMEOUTS) -> None:
+        self.wheel = wheel
+        self.timeouts = dict(timeouts)
+        self.clocks = {}
+        self.timeouts_applied = 0
+
+    @staticmethod
+    def phase(gamer: Gamer) -> tuple|None:
+        '''Key of the phase `gamer` waits in, None if it waits for nobody'''
+        if gamer.state == GameState.INIT:
+            return ('INIT', gamer.rounds)
+        if gamer.state == GameState.END:
+            return ('END', gamer.rounds)
+        if gamer.state == GameState.PLAYING:
+            for player in gamer.players:
+                if player.state == PlayerState.TURN:
+                    return ('TURN', player.name, len(gamer.game_history))
+        return None
+
+    def arm(self, gid: str) -> None:
+        '''Start the clock of the phase game `gid` is in, unless it is already running'''
+        gamer = find_game(gid)
+        key = self.phase(gamer) if gamer is not None else None
+        current = self.clocks.get(gid)
+        if current is not None:
+            if current[0] == key and current[1].active:
+                return
+            current[1].cancel()
+        if key is None or not self.timeouts.get(key[0]):
+            self.clocks.pop(gid, None)
+            return
+        self.clocks[gid] = (key, self.wheel.schedule(self.timeouts[key[0]], self.expire, gid, key))
+
+    def remaining(self, gid: str) -> float|None:
+        '''Seconds left on the clock of `gid`, None if it has none'''
+        current = self.clocks.get(gid)
+        if current is None or not current[1].active:
+            return None
+        return max(0.0, (current[1].tick - self.wheel.now) * self.wheel.tick)
+
+    def expire(self, gid: str, key: tuple) -> None:
+        current = self.clocks.get(gid)
+        if current is None or current[0] != key:
+            return
+        del self.clocks[gid]
+        gamer = find_game(gid)
+        if gamer is None or self.phase(gamer) != key:
+            return
+        if CHECKPOINT.is_waiting(gid):
+            # Nobody can move before everyone is back, wait another period
+            self.arm(gid)
+            return
+        phase = key[0]
+        for player in [p for p in gamer.players if self._late(p, phase)]:
+            gamer.broadcast(BD['turnTimeout'], gid=gid, info=gamer.get_info(), target_name=player.name, phase=phase)
+            if not self.default_move(gamer, player, phase):
+                # No legal move, the reaper evicts the stuck game
+                return
+            self.timeouts_applied += 1
+            if DEBUG:
+                print(yellow(f"Player {player.name} timed out in {phase} of game {gid}."))
+        # Not a touch: a table where nobody acts any more is still evicted by the reaper
+        self.arm(gid)
+
+    @staticmethod
+    def _late(player: Player, phase: str) -> bool:
+        if phase == 'INIT':
+            return player.state == PlayerState.INIT
+        if phase == 'TURN':
+            return player.state == PlayerState.TURN
+        gamer = player.gamer
+        return not gamer.confirmed[gamer.players.index(player)]
+
+    def default_move(self, gamer: Gamer, player: Player, phase: str) -> bool:
+        '''Play for `player` the way its handler would, return False if there is no legal move'''
+        gid = str(gamer.gid)
+        if phase == 'INIT':
+            player.choose_pokes_side(False)
+            OPLOG.record('choosePokeOrder', gid, name=player.name, reverse=False)
+            return True
+        if phase == 'END':
+            player.confirm_result()
+            OPLOG.record('confirmResult', gid, name=player.name)
+            return True
+        table = gamer.displayed_pokes.pokes
+        must_show = gamer.game_history[-1].type_ == 2
+        if table and not must_show and table[-1].owner is not player:
+            insert_to = len(player.pokes)
+            player.scout(0, False, insert_to)
+            OPLOG.record('scout', gid, name=player.name, index=0, reverse=False, insert_to=insert_to)
+            return True
+        hand = player.pokes
+        for length in range(1, len(hand) + 1):
+            for begin in range(len(hand) - length + 1):
+                pokes = PokeCombine(hand[begin:begin + length])
+                if pokes.type_ and pokes > gamer.displayed_pokes:
+                    player.show(pokes)
+                    OPLOG.record('show', gid, name=player.name, b_index=begin, e_index=begin + length)
+                    return True
+        return False
+
+WHEEL = TimerWheel()
+'''Global timer wheel'''
+CLOCK = TurnClock(WHEEL)
+'''Global turn clocks'''
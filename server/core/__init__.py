@@ -1,8 +1,15 @@
 from .api import BROADCAST as BD, S2C, C2S, format, yellow, red, green
+from .advice import segments, scout_advice, player_scout_advice
 from .conn import send, recv, bd, error, ok
+from .export import RoundExporter, EXPORTER, read_rounds
 from .gamer import GameOperation, Gamer
+from .index import LobbyIndex, LOBBY
+from .leaderboard import Leaderboard, LEADERBOARD
 from .player import Player
 from .poke import Poke, PokeCombine
+from . import rules
+from .rules import RoundState
 from .states import GameState, PlayerState, PokeState, DEBUG
+from .store import PlayerStore, STORE
 
 from websockets import WebSocketClientProtocol as Websocket
\ No newline at end of file
@@ -0,0 +1,92 @@
+from .poke import Poke
+
+def segments(values: list[int]) -> tuple[list[int], ...]:
+    '''预计算手牌的刻子、升序顺子、降序顺子段：
+    以第i张结尾（L）/开头（R）的最长段长度，共六个列表'''
+    n = len(values)
+    set_l, asc_l, desc_l = [1] * n, [1] * n, [1] * n
+    set_r, asc_r, desc_r = [1] * n, [1] * n, [1] * n
+    for i in range(1, n):
+        step = values[i] - values[i - 1]
+        if step == 0:
+            set_l[i] = set_l[i - 1] + 1
+        elif step == 1:
+            asc_l[i] = asc_l[i - 1] + 1
+        elif step == -1:
+            desc_l[i] = desc_l[i - 1] + 1
+    for i in range(n - 2, -1, -1):
+        step = values[i + 1] - values[i]
+        if step == 0:
+            set_r[i] = set_r[i + 1] + 1
+        elif step == 1:
+            asc_r[i] = asc_r[i + 1] + 1
+        elif step == -1:
+            desc_r[i] = desc_r[i + 1] + 1
+    return set_l, set_r, asc_l, asc_r, desc_l, desc_r
+
+def best_insert_combine(values: list[int], segs: tuple[list[int], ...], value: int, pos: int) -> tuple[int, int, int]:
+    '''数值为value的牌插入pos后，包含它的最强组合 (张数, 类型, 最小值)，O(1)'''
+    set_l, set_r, asc_l, asc_r, desc_l, desc_r = segs
+    left = values[pos - 1] if pos > 0 else None
+    right = values[pos] if pos < len(values) else None
+    # 刻子
+    length = 1 + (set_l[pos - 1] if left == value else 0) + (set_r[pos] if right == value else 0)
+    best = (length, 3 if length > 1 else 1, value)
+    # 升序顺子：左侧以value-1结尾，右侧以value+1开头
+    below = asc_l[pos - 1] if left == value - 1 else 0
+    above = asc_r[pos] if right == value + 1 else 0
+    if below or above:
+        best = max(best, (1 + below + above, 2, value - below))
+    # 降序顺子：左侧以value+1结尾，右侧以value-1开头
+    above = desc_l[pos - 1] if left == value + 1 else 0
+    below = desc_r[pos] if right == value - 1 else 0
+    if below or above:
+        best = max(best, (1 + below + above, 2, value - below))
+    return best
+
+def splits(values: list[int], pos: int, value: int) -> bool:
+    '''插入pos是否拆开了原有的顺子或刻子，且新牌不能接上两侧'''
+    if pos == 0 or pos == len(values):
+        return False
+    step = values[pos] - values[pos - 1]
+    if abs(step) > 1:
+        return False
+    return value - values[pos - 1] != step or values[pos] - value != step
+
+def scout_advice(values: list[int], pokes: list[tuple[int, int, int]]) -> list[dict]:
+    '''摸牌建议：对每张可摸的牌、每个朝向、每个插入位置，计算新牌所在的最强组合，按强弱排序。
+    线性时间：手牌分段只预计算一次，每个选项O(1)
+
+    values: 手牌生效数字
+
+    pokes: 可摸的牌 [(index, 生效数字, 不生效数字)]，index为0（尾部）或-1（头部）'''
+    segs = segments(values)
+    advice = []
+    for index, value, disable in pokes:
+        for reverse, active in ((0, value), (1, disable)):
+            for pos in range(len(values) + 1):
+                length, type_, low = best_insert_combine(values, segs, active, pos)
+                advice.append({
+                    'index': index,
+                    'reverse': reverse,
+                    'insert_to': pos,
+                    'length': length,
+                    'type_': type_,
+                    'min': low,
+                    'splits': splits(values, pos, active),
+                })
+    advice.sort(key=lambda a: (-a['length'], -a['type_'], -a['min'], a['splits']))
+    return advice
+
+def player_scout_advice(hand: list[Poke], table: list[Poke], index: int|None = None) -> list[dict]:
+    '''由手牌和牌桌计算摸牌建议，index为None时考虑桌面两端'''
+    assert table, \
+        "Displayed pokes must exist"
+    ends = [-1, 0] if index is None else [index]
+    if len(table) == 1:
+        ends = ends[:1]
+    pokes = [
+        (end, table[-1 if end == 0 else 0].value, table[-1 if end == 0 else 0].value_disable)
+        for end in ends
+    ]
+    return scout_advice([poke.value for poke in hand], pokes)
@@ -13,6 +13,8 @@ C2S = json.load(
 
 def format(Api:dict, **kwargs) -> str:
     '''Format API'''
+    # Work on a copy so that the shared templates keep their placeholders and defaults
+    Api = dict(Api)
     # Remove tips and return_type
     Api.pop('tips', None)
     Api.pop('return_type', None)
@@ -0,0 +1,223 @@
+import csv
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from typing import Iterator
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+COLUMNS = ('gid', 'round', 'ended', 'seed', 'end', 'winner', 'players', 'scores', 'extra_points', 'deal', 'history')
+'''导出列。players/scores/extra_points 按座位排列，winner 为座位号
+
+deal: 每位玩家开局（选择正反序后）的手牌编码
+
+history: 每个操作为 [座位, 类型, 插入位置, *牌编码]，牌编码见 Poke.code'''
+LIST_COLUMNS = ('players', 'scores', 'extra_points', 'deal', 'history')
+'''CSV 中以紧凑 JSON 存储的列'''
+
+def _schema():
+    ints = pa.list_(pa.int16())
+    return pa.schema([
+        ('gid', pa.string()),
+        ('round', pa.int32()),
+        ('ended', pa.float64()),
+        ('seed', pa.uint64()),
+        ('end', pa.string()),
+        ('winner', pa.int8()),
+        ('players', pa.list_(pa.string())),
+        ('scores', pa.list_(pa.int32())),
+        ('extra_points', pa.list_(pa.int32())),
+        ('deal', pa.list_(ints)),
+        ('history', pa.list_(ints)),
+    ])
+
+class RoundExporter:
+    '''已结束单局的流式导出：游戏结束时只把记录放入队列，由后台线程攒批追加到本地列式文件
+
+    有 pyarrow 时写 Parquet（每批一个 row group，文件写满或关闭后由 .part 改名为 .parquet），
+    否则写 gzip 压缩的 CSV（每批追加一个 gzip 成员，随时可读）。未打开时 submit 直接忽略'''
+    path: str
+    '''导出目录'''
+    format: str
+    '''parquet 或 csv'''
+    chunk: int
+    '''每批写入的单局数'''
+    interval: float
+    '''未攒满一批时的最长等待（秒）'''
+    rows_per_file: int
+    '''单个文件的最多单局数，超过后换新文件'''
+    enabled: bool
+    '''是否已打开'''
+    exported: int
+    '''已写入的单局数'''
+    dropped: int
+    '''队列已满而丢弃的单局数'''
+
+    def __init__(self, path: str = 'exports', chunk: int = 4096, interval: float = 5.0,
+                 rows_per_file: int = 1 << 20, maxsize: int = 1 << 16) -> None:
+        self.path = path
+        self.format = 'parquet' if pq is not None else 'csv'
+        self.chunk = chunk
+        self.interval = interval
+        self.rows_per_file = rows_per_file
+        self.enabled = False
+        self.exported = 0
+        self.dropped = 0
+        self.queue = queue.Queue(maxsize)
+        self._thread = None
+        self._file = None
+        '''当前文件路径'''
+        self._file_rows = 0
+        self._files = 0
+        '''本进程已创建的文件数，用于文件名'''
+        self._writer = None
+        '''当前 Parquet 文件的 ParquetWriter'''
+
+    def open(self, path: str|None = None, format: str|None = None) -> None:
+        '''创建导出目录并启动写入线程'''
+        if path:
+            self.path = path
+        if format:
+            assert format in ('parquet', 'csv'), \
+                "Export format must be parquet or csv"
+            assert format == 'csv' or pq is not None, \
+                "Parquet export requires pyarrow"
+            self.format = format
+        os.makedirs(self.path, exist_ok=True)
+        self.enabled = True
+        self._thread = threading.Thread(target=self._run, name='RoundExporter', daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        '''写入队列中剩余的单局并关闭当前文件'''
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.queue.put(None)
+        self._thread.join()
+        self._rotate()
+
+    def submit(self, record: dict) -> None:
+        '''提交一局的记录（只含基本类型），不做任何IO，队列满时丢弃'''
+        if not self.enabled:
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'format': self.format,
+            'exported': self.exported,
+            'queued': self.queue.qsize(),
+            'dropped': self.dropped,
+        }
+
+    def _run(self) -> None:
+        rows = []
+        deadline = time.monotonic() + self.interval
+        while 1:
+            try:
+                record = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                record = 0
+            if record is None:
+                break
+            if record:
+                rows.append(record)
+            if len(rows) >= self.chunk or (rows and time.monotonic() >= deadline):
+                self._flush(rows)
+                rows = []
+            if not rows:
+                deadline = time.monotonic() + self.interval
+        self._flush(rows)
+
+    def _flush(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        try:
+            self._write(rows)
+            self.exported += len(rows)
+        except Exception:
+            import traceback
+            traceback.print_exc()
+
+    def _write(self, rows: list[dict]) -> None:
+        if self._file is None:
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            name = f'rounds-{stamp}-{os.getpid()}-{self._files:04d}'
+            self._files += 1
+            if self.format == 'parquet':
+                self._file = os.path.join(self.path, name + '.parquet.part')
+                self._writer = pq.ParquetWriter(self._file, _schema(), compression='zstd')
+            else:
+                self._file = os.path.join(self.path, name + '.csv.gz')
+            self._file_rows = 0
+        if self.format == 'parquet':
+            self._writer.write_table(pa.Table.from_pylist(rows, schema=self._writer.schema))
+        else:
+            with gzip.open(self._file, 'at', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if self._file_rows == 0:
+                    writer.writerow(COLUMNS)
+                writer.writerows(
+                    [
+                        json.dumps(row[column], separators=(',', ':'), ensure_ascii=False)
+                        if column in LIST_COLUMNS else row[column]
+                        for column in COLUMNS
+                    ]
+                    for row in rows
+                )
+        self._file_rows += len(rows)
+        if self._file_rows >= self.rows_per_file:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        '''结束当前文件，下一批写入新文件'''
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self._file, self._file[:-len('.part')])
+            self._writer = None
+        self._file = None
+
+def read_rounds(path: str, columns: tuple[str]|None = None, batch: int = 4096) -> Iterator[dict]:
+    '''流式读取导出的单局，path 为导出目录或单个文件。逐批读取，内存占用与文件大小无关
+
+    columns: 只读取这些列，默认全部'''
+    columns = tuple(columns or COLUMNS)
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    else:
+        files = [path]
+    for file in files:
+        if file.endswith('.parquet'):
+            assert pq is not None, \
+                "Reading Parquet exports requires pyarrow"
+            for record_batch in pq.ParquetFile(file).iter_batches(batch_size=batch, columns=list(columns)):
+                yield from record_batch.to_pylist()
+        elif file.endswith('.csv.gz'):
+            with gzip.open(file, 'rt', newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    record = {}
+                    for column in columns:
+                        value = row[column]
+                        if column in LIST_COLUMNS:
+                            value = json.loads(value)
+                        elif column in ('round', 'seed', 'winner'):
+                            value = int(value)
+                        elif column == 'ended':
+                            value = float(value)
+                        record[column] = value
+                    yield record
+
+EXPORTER = RoundExporter()
+'''全局单局导出器'''
@@ -1,9 +1,16 @@
+import json
 import random
+import time
 from .states import GameState, PlayerState, PokeState, DEBUG
 from .conn import bd
 from .api import BROADCAST as BD, format, yellow
 from .poke import Poke, PokeCombine
 from .player import Player
+from .index import LOBBY
+from .export import EXPORTER
+from . import rules
+from .rules import Move, RoundState
+from .spectate import SpectatorFeed, SPECTATE_DELAY, SPECTATE_INTERVAL
 
 from websockets import WebSocketClientProtocol as Websocket
 
@@ -70,6 +77,7 @@ class GameOperation:
             'target_name': self.player.name,
             'type_': self.type_,
             'detail': self.detail.json() if self.detail else None,
+            'pos': self.pos,
         }
 
 class Gamer:
@@ -98,6 +106,28 @@ class Gamer:
     '''牌桌上的牌'''
     scout_and_show: list[Player]
     '''本局使用过 摸牌并立刻出牌 的玩家'''
+    deal: list[list[int]]
+    '''本局开局（所有玩家选择正反序后）各玩家手牌的编码，供导出'''
+    rounds: int
+    '''已结束的单局数'''
+    round: RoundState|None
+    '''本局的规则状态，出牌与摸牌的合法性、下一位玩家与单局结束均由 rules.apply 推演得出，单局开始前为None'''
+    spectators: SpectatorFeed
+    '''观战者'''
+    spectate_delay: float = SPECTATE_DELAY
+    '''观战延迟（秒），所有游戏共用，由服务器启动参数设置'''
+    spectate_interval: float = SPECTATE_INTERVAL
+    '''观战推送最小间隔（秒），所有游戏共用，由服务器启动参数设置'''
+    seed: int
+    '''随机种子，发牌与先手只使用由它生成的 rng，相同种子与操作序列得到相同牌局'''
+    rng: random.Random
+    '''本局的随机数生成器'''
+    _views: dict[str, object]
+    '''视图缓存（部分名: 已构建的视图），由 touch 在状态变化时失效'''
+    version: int
+    '''状态版本号，每次 touch 递增，随每条广播下发'''
+    _responses: dict[tuple, str]
+    '''当前版本下已编码的查询结果'''
 
     # 游戏得分信息
     @property
@@ -113,9 +143,14 @@ class Gamer:
     total_score: dict[str: int]
     '''玩家总得分'''
 
-    def __init__(self, gid: int|str, online: bool = True) -> None:
+    def __init__(self, gid: int|str, online: bool = True, seed: int|None = None) -> None:
         self._is_online = online
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.rng = random.Random(self.seed)
         self._is_private = False
+        self._views = {}
+        self.version = 0
+        self._responses = {}
 
         self.gid = gid
         self.players = []
@@ -127,6 +162,10 @@ class Gamer:
         self.game_history = []
         self.displayed_pokes = PokeCombine([])
         self.scout_and_show = []
+        self.deal = []
+        self.rounds = 0
+        self.round = None
+        self.spectators = SpectatorFeed(gid, self.spectate_delay, self.spectate_interval)
 
         self.total_score = {}
         self.extra_points = {}
@@ -137,24 +176,68 @@ class Gamer:
         return player in self.players
     def _is_host(self, player: Player) -> bool:
         return self.players[self.host_idx] == player
+    def touch(self, *parts: str) -> None:
+        '''标记视图失效，不指定部分时全部失效。任何失效都使版本号递增'''
+        self.version += 1
+        self._responses.clear()
+        if parts:
+            for part in parts:
+                self._views.pop(part, None)
+        else:
+            self._views.clear()
+    def _view(self, part: str, build) -> object:
+        '''取缓存的视图，失效时重建。视图由所有调用者共享，不可修改'''
+        view = self._views.get(part)
+        if view is None:
+            view = self._views[part] = build()
+        return view
+    def encoded(self, key: tuple, build) -> str:
+        '''当前版本下已编码为JSON的查询结果，版本变化前重复查询不再编码'''
+        message = self._responses.get(key)
+        if message is None:
+            message = self._responses[key] = json.dumps(build())
+        return message
     def json(self) -> dict:
-        '''获取游戏信息'''
-        return {
+        '''获取游戏信息：共享的公开部分加上每个玩家的手牌'''
+        public = self._view('json', lambda: {
             'gid': self.gid,
-            'players': [player.json() for player in self.players],
             'playing_num': len(self.players),
             'state': self.state.value,
             'info': self.info,
             'total_score': self.total_score,
             'extra_points': self.extra_points,
             'displayed_pokes': self.displayed_pokes.json(),
-            'history': [str(op) for op in self.game_history]
-        }
+            'history': self.history_json(full=True),
+        })
+        return dict(public, players=[player.json() for player in self.players])
+    def public_json(self) -> dict:
+        '''获取公开信息（观战用，不含手牌）'''
+        def build() -> dict:
+            started = self.state in (GameState.PLAYING, GameState.END)
+            return {
+                'gid': self.gid,
+                'players': [player.name for player in self.players],
+                'host': self.get_host().name if self.players else None,
+                'state': self.state.value,
+                'info': self.info,
+                'total_score': self.total_score,
+                'table': self.displayed_pokes.json(),
+                'game_info': self.get_game_info() if started else None,
+                'history': self.history_json() if started else [],
+            }
+        return self._view('public', build)
     def get_websockets(self) -> list[Websocket]:
-        '''获取所有玩家的websocket'''
-        assert all(player._is_logged for player in self.players), \
-            "All players must be logged in"
-        return [player.ws for player in self.players]
+        '''获取所有已登录玩家的websocket。从检查点恢复、尚未重新登录的玩家跳过'''
+        return [player.ws for player in self.players if player._is_logged]
+    def broadcast(self, api: dict, **kwargs) -> None:
+        '''编码一次，广播给所有玩家和观战者（离线游戏不广播）'''
+        # 所有公开的状态变化都会广播，视图在此统一失效
+        self.touch()
+        if not self._is_online:
+            return
+        message = format(api, version=self.version, **kwargs)
+        bd(self.get_websockets(), message)
+        self.spectators.push(message)
 
     def clear(self) -> None:
         '''清空单局游戏信息'''
@@ -171,8 +254,11 @@ class Gamer:
         self.game_history = []
         self.displayed_pokes = PokeCombine([])
         self.scout_and_show = []
+        self.deal = []
+        self.round = None
 
         self.extra_points = {player.name: 0 for player in self.players}
+        self.touch()
     def get_player(self, name: str) -> Player|None:
         '''根据名字获取玩家'''
         for player in self.players:
@@ -197,6 +283,8 @@ class Gamer:
                 "State must be an instance of GameState or int"
             )
         self.state = state
+        self.touch()
+        LOBBY.update(self)
     def get_info(self) -> str:
         '''获取游戏信息'''
         return self.info
@@ -210,13 +298,18 @@ class Gamer:
             raise AssertionError(
                 "Only playing or end game can get history"
             )
+    def history_json(self, full: bool = False) -> list[str]:
+        '''历史记录的字符串列表（与get_history范围相同，full为True时为全部记录），已缓存'''
+        return self._view('history_full' if full else 'history', lambda: [
+            str(op) for op in (self.game_history if full else self.get_history())
+        ])
     def get_total_score(self) -> dict[tuple[str, int]]:
         '''获取玩家总分'''
         return self.total_score
    
     # 游戏招募阶段全体操作
 
-    def add_player(self, player: Player) -> None:
+    def add_player(self, player: Player, broadcast: bool = True) -> None:
         '''添加玩家，广播事件'''
         assert not self._is_private, \
             "Only public game can add player"
@@ -234,8 +327,14 @@ class Gamer:
         if len(self.players) == 5:
             self.set_state(GameState.FULL)
             self.info = "游戏人数已满，等待开始"   
-        if self._is_online:
-            bd(self.get_websockets(), format(BD['playerJoin'], gid=self.gid, info=self.get_info(), target_name=player.name))
+        LOBBY.update(self)
+        if broadcast:
+            self.broadcast(BD['playerJoin'], gid=self.gid, info=self.get_info(), target_name=player.name)
+    def add_players(self, players: list[Player]) -> None:
+        '''快速匹配批量添加玩家，整桌只广播一次'''
+        for player in players:
+            player.set_gamer(self, broadcast=False)
+        self.broadcast(BD['matchFound'], gid=self.gid, info=self.get_info(), players=[p.name for p in players])
     def remove_player(self, player: Player) -> None:
         '''移除玩家，广播事件'''
         if self.state == GameState.END:
@@ -255,16 +354,15 @@ class Gamer:
         if len(self.players) < 5:
             self.set_state(GameState.RECRUIT)
             self.info = f"游戏招募中，已准备 {sum(1 for p in self.players if p.state == PlayerState.READY)}/{len(self.players)}"
-        if self._is_online:
-            bd(self.get_websockets(), format(BD['playerLeave'], gid=self.gid, info=self.get_info(), target_name=player.name))
+        LOBBY.update(self)
+        self.broadcast(BD['playerLeave'], gid=self.gid, info=self.get_info(), target_name=player.name)
 
     def player_ready(self, player: Player) -> None|dict[str, str]:
         '''玩家准备，广播事件，当所有玩家准备完毕时返回初始化信息'''
         assert not self._is_started(), \
             "Game has already started"
         self.info = f"游戏招募中，已准备 {sum(1 for p in self.players if p.state == PlayerState.READY)}/{len(self.players)}"
-        if self._is_online:
-            bd(self.get_websockets(), format(BD['playerReady'], gid=self.gid, info=self.get_info(), target_name=player.name))
+        self.broadcast(BD['playerReady'], gid=self.gid, info=self.get_info(), target_name=player.name)
         if all(p.state == PlayerState.READY for p in self.players) and \
             2 <= len(self.players) <= 5:
             if DEBUG:
@@ -277,8 +375,7 @@ class Gamer:
         '''玩家取消准备，广播事件'''
         assert not self._is_started(), \
             "Game has already started"
-        if self._is_online:
-            bd(self.get_websockets(), format(BD['playerUnready'], gid=self.gid, info=self.get_info(), target_name=player.name))
+        self.broadcast(BD['playerUnready'], gid=self.gid, info=self.get_info(), target_name=player.name)
     
     # 游戏招募阶段房主操作
 
@@ -289,8 +386,8 @@ class Gamer:
         assert self._is_host(player), \
             "Only host can lock room"
         self._is_private = True
-        if self._is_online:
-            bd(self.get_websockets(), format(BD['lockRoom'], gid=self.gid, info=self.get_info()))
+        LOBBY.update(self)
+        self.broadcast(BD['lockRoom'], gid=self.gid, info=self.get_info())
     def unlock_room(self, player: Player) -> None:
         '''解锁房间，广播事件'''
         assert not self._is_started(), \
@@ -298,8 +395,8 @@ class Gamer:
         assert self._is_host(player), \
             "Only host can unlock room"
         self._is_private = False
-        if self._is_online:
-            bd(self.get_websockets(), format(BD['unlockRoom'], gid=self.gid, info=self.get_info()))
+        LOBBY.update(self)
+        self.broadcast(BD['unlockRoom'], gid=self.gid, info=self.get_info())
     def set_host(self, player: Player|str) -> None:
         '''设置房主，广播事件'''
         assert not self._is_started(), \
@@ -311,8 +408,7 @@ class Gamer:
         assert player in self.players, \
             "Player must be in the game"
         self.host_idx = self.players.index(player)
-        if self._is_online:
-            bd(self.get_websockets(), format(BD['setHost'], gid=self.gid, info=self.get_info(), target_name=player.name))
+        self.broadcast(BD['setHost'], gid=self.gid, info=self.get_info(), target_name=player.name)
     
     # 游戏主程序
 
@@ -323,10 +419,10 @@ class Gamer:
         # 生成扑克牌
         for i in range(1, 11):
             for j in range(1, i):
-                poke = Poke(j, i, random.choice([True, False]))
+                poke = Poke(j, i, self.rng.choice([True, False]))
                 self.all_pokes.append(poke)
         # 分发扑克牌
-        random.shuffle(self.all_pokes)
+        self.rng.shuffle(self.all_pokes)
         poke_nums = {
             2: 11,
             3: 12,
@@ -356,8 +452,7 @@ class Gamer:
         # 通知玩家游戏开始，选择牌序
         for player in self.players:
             player.game_start()
-        if self._is_online:
-            bd(self.get_websockets(), format(BD['gameInit'], gid=self.gid, info=self.get_info()))
+        self.broadcast(BD['gameInit'], gid=self.gid, info=self.get_info())
         return player_and_poke
     def player_init_finish(self, player: Player) -> None:
         '''玩家起始准备结束，广播事件'''
@@ -375,17 +470,21 @@ class Gamer:
                 print(yellow(f"Game {self.gid} starts!. Players: {[p.name for p in self.players]}"))
             self.set_state(GameState.PLAYING)
             self.info = "游戏开始"
-            if self._is_online:
-                bd(self.get_websockets(), format(BD['gameStart'], gid=self.gid, info=self.get_info(), table=self.displayed_pokes.json()))
+            if EXPORTER.enabled:
+                self.deal = [[poke.code() for poke in player.pokes] for player in self.players]
+            self.broadcast(BD['gameStart'], gid=self.gid, info=self.get_info(), table=self.displayed_pokes.json())
             # 第一个玩家开始
-            first_player = random.choice(self.players) # TODO
+            first_player = self.rng.choice(self.players) # TODO
+            self.round = rules.initial(
+                [[(poke.value, poke.value_disable) for poke in player.pokes] for player in self.players],
+                self.players.index(first_player),
+            )
             self.game_history.append(GameOperation(first_player, -1, None))
             self.player_turn_act(first_player)
 
     def player_turn_act(self, player: Player) -> None:
         '''通知玩家回合开始，广播事件'''
-        if self._is_online:
-            bd(self.get_websockets(), format(BD['gameAction'], gid=self.gid, info=self.get_info(), target_name=player.name, table=self.displayed_pokes.json(), op=self.game_history[-1].json()))
+        self.broadcast(BD['gameAction'], gid=self.gid, info=self.get_info(), target_name=player.name, table=self.displayed_pokes.json(), op=self.game_history[-1].json())
         assert self.state == GameState.PLAYING, \
             "Ingame Error: Only playing game can player turn act"
         assert player.state == PlayerState.WAIT, \
@@ -403,62 +502,53 @@ class Gamer:
         # 检查操作合法性
         assert op.type_ >= 0, \
             "Ingame Error: Game has already started"
-        last_op = self.game_history[-1]
-        if last_op.type_ == -1:
-            # 游戏开始
-            if last_op.player != op.player:
-                return False, "Only first player can play first"
-        elif last_op.type_ == 0:
-            # 上一家出牌
-            last_idx = self.players.index(last_op.player)
-            target_idx = self.players.index(op.player)
-            if (last_idx + 1 - target_idx) % len(self.players) != 0:
-                return False, "Only next player in turn can play"
-            if op.type_ == 0 and self.displayed_pokes >= op.detail:
-                return False, f"Pokes must be greater than table's (0)\n{self.displayed_pokes} >= {op.detail}"
-        elif last_op.type_ == 1:
-            # 上一家摸牌
-            last_idx = self.players.index(last_op.player)
-            target_idx = self.players.index(op.player)
-            if (last_idx + 1 - target_idx) % len(self.players) != 0:
-                return False, "Only next player in turn can draw"
-        elif last_op.type_ == 2:
-            # 自己摸牌并立刻出牌
-            last_idx = self.players.index(last_op.player)
-            target_idx = self.players.index(op.player)
-            if last_op.player != op.player:
-                return False, "Only player himself in turn can draw and play"
-            if op.type_ != 0:
-                return False, "Player must show pokes after scout and show"
-            if self.displayed_pokes >= op.detail:
-                return False, "Pokes must be greater than table's (2)"
+        if self.players.index(op.player) != self.round.turn:
+            return False, "Only player in turn can play"
+        try:
+            state = rules.apply(self.round, self.rules_move(op))
+        except AssertionError as e:
+            return False, str(e)
         self.game_history.append(op)
         # 处理操作
-        next_player = self.players[(self.players.index(op.player) + 1) % len(self.players)]
         if op.type_ == 0:
             self.player_show(op)
         elif op.type_ == 1:
             self.player_scout(op)
         elif op.type_ == 2:
-            if op.player in self.scout_and_show:
-                self.game_history.pop()
-                return False, "Player can only scout and show once in a game"
             self.scout_and_show.append(op.player)
-            next_player = op.player
             self.player_scout(op)
+        self.round = state
         # 有玩家胜利
-        if len(self.players) > 2 and \
-            all(op.type_ == 1 for op in self.game_history[-len(self.players) + 1:]):
-            assert self.beat_all(self.game_history[-len(self.players)].player), \
+        if state.end == 'beat_all':
+            assert self.beat_all(self.players[state.winner]), \
                 "Ingame Error: Player win: beat all is not successful"
             return True, None
-        if len(op.player.pokes) == 0:
+        if state.end == 'show_all':
             assert self.show_all(op.player), \
                 "Ingame Error: Player win: show all is not successful"
             return True, None
         # 游戏继续，通知下一位玩家
+        next_player = self.players[state.turn]
         self.player_turn_act(next_player)
         return True, next_player
+
+    def rules_move(self, op: GameOperation) -> Move:
+        '''操作对应的 rules.Move：出牌为手牌中的连续区间，摸牌由新牌与牌桌两端的牌比较得出位置与朝向'''
+        if op.type_ == 0:
+            hand = op.player.pokes
+            pokes = op.detail.pokes
+            begin = next((i for i, poke in enumerate(hand) if pokes and poke is pokes[0]), -1)
+            end = begin + len(pokes)
+            assert begin >= 0 and all(a is b for a, b in zip(hand[begin:end], pokes)) and end <= len(hand), \
+                "Pokes must be adjacent in player's hand"
+            return ('show', begin, end)
+        table = self.displayed_pokes.pokes
+        assert table, \
+            "Displayed pokes must exist"
+        poke = op.detail
+        head = (poke.up, poke.down) == (table[0].up, table[0].down)
+        target = table[0 if head else -1]
+        return ('scout' if op.type_ == 1 else 'scout_and_show', head, poke.value != target.value, op.pos)
     
     def player_show(self, op: GameOperation) -> None:
         '''玩家出牌逻辑处理'''
@@ -468,8 +558,7 @@ class Gamer:
             "Player must be a valid player"
         assert isinstance(pokes, PokeCombine), \
             "Pokes must be a valid combine"
-        assert pokes > self.displayed_pokes, \
-            "Pokes must be greater than table's"
+        # 大小已由 rules.apply 检查
         # 将牌桌上的牌放入自己的得分区
         for poke in self.displayed_pokes.pokes:
             poke.set_state(PokeState.GOAL)
@@ -486,12 +575,15 @@ class Gamer:
             player.pokes.remove(poke)
         # 更新牌桌上的牌
         self.displayed_pokes = pokes
+        self.touch()
+        player.touch()
     def player_scout(self, op: GameOperation) -> None:
         '''玩家摸牌逻辑处理'''
         new_poke = op.detail
         target_poke = self.get_poke([new_poke.value, new_poke.value_disable])
         player = op.player
-        pos = op.pos % len(player.pokes)
+        # 可插入末尾，共 len+1 个位置
+        pos = op.pos % (len(player.pokes) + 1)
         assert isinstance(new_poke, Poke), \
             "New poke must be a valid poke"
         assert new_poke.owner == player, \
@@ -508,6 +600,7 @@ class Gamer:
             "Target poke must be owned by original player"
         assert 0 <= pos <= len(player.pokes), \
             "Invalid insert position"
+        op.pos = pos
         # 目标牌的拥有者奖励得分
         self.reward_point(target_poke.owner)
         # 销毁目标牌并将新牌添加至牌库池和玩家手牌
@@ -518,12 +611,15 @@ class Gamer:
         remain_pokes = self.displayed_pokes.pokes
         remain_pokes.remove(target_poke)
         self.displayed_pokes = PokeCombine(remain_pokes)
+        self.touch()
+        player.touch()
 
     def reward_point(self, player: Player) -> None:
         '''奖励得分：自己的牌被别人摸走'''
         assert self.state == GameState.PLAYING, \
             "Only playing game can reward point"
         self.extra_points[player.name] += 1
+        self.touch()
     
     def show_all(self, player: Player) -> bool:
         '''游戏结束事件，玩家出完了所有手牌，广播事件'''
@@ -546,14 +642,17 @@ class Gamer:
                 print(yellow(f"Game {self.gid} ends! {player.name} shows all pokes."))
         # 记录分数
         scores = {player.name: self.get_player_score(player) for player in self.players}
-        for player in self.players:
-            if player.name not in self.total_score:
-                self.total_score[player.name] = 0
-            self.total_score[player.name] += scores[player.name]
+        self.rounds += 1
+        self.export_round(player, 'show_all', scores)
+        for p in self.players:
+            if p.name not in self.total_score:
+                self.total_score[p.name] = 0
+            self.total_score[p.name] += scores[p.name]
         # 通知玩家游戏结束
-            player.game_ended()
-        if self._is_online:
-            bd(self.get_websockets(), format(BD['gameEnd'], gid=self.gid, info=self.get_info(), target_name=player.name, scores=scores))
+            p.game_ended()
+        # 结束单局的操作不会再有 gameAction，随结束事件下发
+        self.broadcast(BD['gameEnd'], gid=self.gid, info=self.get_info(), target_name=player.name,
+                       table=self.displayed_pokes.json(), op=self.game_history[-2].json(), scores=scores)
         self.confirmed = [False for _ in self.players]
         return True
     def beat_all(self, player: Player) -> bool:
@@ -570,56 +669,257 @@ class Gamer:
                 print(yellow(f"Game {self.gid} ends! {player.name} beats all players."))
         # 记录分数
         scores = {player.name: self.get_player_score(player) for player in self.players}
-        for player in self.players:
-            if player.name not in self.total_score:
-                self.total_score[player.name] = 0
-            self.total_score[player.name] += scores[player.name]
+        self.rounds += 1
+        self.export_round(player, 'beat_all', scores)
+        for p in self.players:
+            if p.name not in self.total_score:
+                self.total_score[p.name] = 0
+            self.total_score[p.name] += scores[p.name]
         # 通知玩家游戏结束
-            player.game_ended()
-        if self._is_online:
-            bd(self.get_websockets(), format(BD['gameEnd'], gid=self.gid, info=self.get_info(), target_name=player.name, scores=scores))
+            p.game_ended()
+        # 结束单局的操作不会再有 gameAction，随结束事件下发
+        self.broadcast(BD['gameEnd'], gid=self.gid, info=self.get_info(), target_name=player.name,
+                       table=self.displayed_pokes.json(), op=self.game_history[-2].json(), scores=scores)
         self.confirmed = [False for _ in self.players]
         return True
+    def export_round(self, winner: Player, end: str, scores: dict[str, int]) -> None:
+        '''将刚结束的单局提交给 EXPORTER，只做编码不做IO。须在 clear 之前调用'''
+        if not EXPORTER.enabled:
+            return
+        seats = {player.name: i for i, player in enumerate(self.players)}
+        history = []
+        for op in self.game_history:
+            if isinstance(op.detail, PokeCombine):
+                codes = [poke.code() for poke in op.detail.pokes]
+            elif isinstance(op.detail, Poke):
+                codes = [op.detail.code()]
+            else:
+                codes = []
+            history.append([seats.get(op.player.name, -1), op.type_, op.pos, *codes])
+        EXPORTER.submit({
+            'gid': str(self.gid),
+            'round': self.rounds,
+            'ended': time.time(),
+            'seed': self.seed,
+            'end': end,
+            'winner': seats[winner.name],
+            'players': list(seats),
+            'scores': [scores[name] for name in seats],
+            'extra_points': [self.extra_points[name] for name in seats],
+            'deal': self.deal,
+            'history': history,
+        })
     def player_confirm_result(self, player: Player) -> None:
         '''玩家确认游戏结束，广播事件，仅允许END状态游戏中间态调用，否则无效'''
         if self.state == GameState.END:
             self.confirmed[self.players.index(player)] = True
-            if self._is_online:
-                bd(self.get_websockets(), format(BD['playerConfirm'], gid=self.gid, info=self.get_info(), target_name=player.name))
+            self.broadcast(BD['playerConfirm'], gid=self.gid, info=self.get_info(), target_name=player.name)
             # 清空单局游戏信息
             if all(self.confirmed):
-                self._clear_state()
+                self.clear()
                 self.state = GameState.RECRUIT
                 self.info = "游戏招募中"
                 if len(self.players) == 5:
                     self.state = GameState.FULL
                     self.info = "游戏人数已满，等待开始"
+                LOBBY.update(self)
+
+    def terminate(self) -> None:
+        '''终止游戏，广播事件，并释放所有玩家、扑克牌与历史记录的引用'''
+        self.info = "游戏终止"
+        self.broadcast(BD['terminate'], gid=self.gid, info=self.get_info())
+        for poke in self.all_pokes:
+            poke.clear()
+        for player in self.players:
+            player.gamer = None
+            player.clear()
+        LOBBY.discard(self)
+        self.spectators.close()
+        self.players = []
+        self.all_pokes = []
+        self.game_history = []
+        self.displayed_pokes = PokeCombine([])
+        self.scout_and_show = []
+        self.total_score = {}
+        self.extra_points = {}
+        self.touch()
+
+    # 规则核心
+
+    def round_state(self) -> RoundState:
+        '''当前单局的不可变快照（rules.RoundState），可交给其它线程或进程做搜索，之后用 rules.apply 推演'''
+        assert self.state == GameState.PLAYING or \
+                self.state == GameState.END, \
+            "Only playing or end game has a round state"
+        seats = {player.name: i for i, player in enumerate(self.players)}
+        counts = self._poke_counts()
+        table = self.displayed_pokes.pokes
+        owner = -1
+        for op in reversed(self.game_history):
+            if op.type_ == 0:
+                owner = seats[op.player.name]
+                break
+        scouts = 0
+        for op in reversed(self.game_history):
+            if op.type_ != 1:
+                break
+            scouts += 1
+        last = self.game_history[-1]
+        winner, end = -1, ''
+        if last.type_ == -2:
+            winner = seats[last.player.name]
+            end = 'show_all' if not last.player.pokes else 'beat_all'
+            scouts = 0
+            for op in reversed(self.game_history[:-1]):
+                if op.type_ != 1:
+                    break
+                scouts += 1
+            # 结束单局的操作之后轮到下一位
+            turn = (seats[self.game_history[-2].player.name] + 1) % len(self.players)
+        else:
+            turn = next(i for i, player in enumerate(self.players) if player.state == PlayerState.TURN)
+        return RoundState(
+            hands=tuple(tuple((poke.value, poke.value_disable) for poke in player.pokes) for player in self.players),
+            table=tuple((poke.value, poke.value_disable) for poke in table),
+            owner=owner,
+            goals=tuple(counts[player.name][0] for player in self.players),
+            extra=tuple(self.extra_points[player.name] for player in self.players),
+            turn=turn,
+            must_show=last.type_ == 2,
+            used=sum(1 << seats[player.name] for player in self.scout_and_show),
+            scouts=scouts,
+            winner=winner,
+            end=end,
+        )
+
+    # 检查点
+
+    def snapshot(self) -> dict:
+        '''完整牌局状态的紧凑快照，只含基本类型，可在其它线程序列化。不含连接与观战者
+
+        牌以 Poke.code 编码，手牌与牌桌为 all_pokes 中的下标，玩家以名字记录。
+        含种子与 rng 的内部状态，恢复后的下一局与不中断时发出相同的牌'''
+        index = {id(poke): i for i, poke in enumerate(self.all_pokes)}
+        def detail(op: GameOperation) -> None|int|list[int]:
+            if isinstance(op.detail, PokeCombine):
+                return [poke.code() for poke in op.detail.pokes]
+            if isinstance(op.detail, Poke):
+                return op.detail.code()
+            return None
+        version, state, gauss = self.rng.getstate()
+        return {
+            'gid': self.gid,
+            'seed': self.seed,
+            'rng': [version, list(state), gauss],
+            'version': self.version,
+            'private': self._is_private,
+            'host': self.host_idx,
+            'state': self.state.value,
+            'info': self.info,
+            'players': [
+                [player.name, player.state.value, [index[id(poke)] for poke in player.pokes]]
+                for player in self.players
+            ],
+            'pokes': [
+                [poke.code(), poke.state.value, poke.owner.name if poke.owner else '']
+                for poke in self.all_pokes
+            ],
+            'table': [index[id(poke)] for poke in self.displayed_pokes.pokes],
+            'history': [[op.player.name, op.type_, detail(op), op.pos] for op in self.game_history],
+            'scout_and_show': [player.name for player in self.scout_and_show],
+            'deal': self.deal,
+            'rounds': self.rounds,
+            'total_score': dict(self.total_score),
+            'extra_points': dict(self.extra_points),
+            'init_finish': list(getattr(self, 'init_finish', [])),
+            'confirmed': list(getattr(self, 'confirmed', [])),
+        }
+
+    @classmethod
+    def restore(cls, data: dict) -> 'Gamer':
+        '''由 snapshot 重建在线游戏。玩家均未登录，需重新登录（Player.login）后才能继续'''
+        gamer = cls(data['gid'], seed=data.get('seed'))
+        if 'rng' in data:
+            version, state, gauss = data['rng']
+            gamer.rng.setstate((version, tuple(state), gauss))
+        players = {}
+        for name, state, _ in data['players']:
+            player = players[name] = Player(name)
+            player.gamer = gamer
+            player.state = PlayerState(state)
+        def find(name: str) -> Player:
+            # 已离开的玩家仍可能出现在历史记录中
+            if name not in players:
+                players[name] = Player(name)
+            return players[name]
+        gamer.all_pokes = []
+        for code, state, owner in data['pokes']:
+            poke = Poke.decode(code)
+            poke.state = PokeState(state)
+            poke.owner = find(owner) if owner else None
+            gamer.all_pokes.append(poke)
+        gamer.players = [players[name] for name, _, _ in data['players']]
+        for player, (_, _, hand) in zip(gamer.players, data['players']):
+            player.pokes = [gamer.all_pokes[i] for i in hand]
+        gamer.displayed_pokes = PokeCombine([gamer.all_pokes[i] for i in data['table']])
+        for name, type_, detail, pos in data['history']:
+            if isinstance(detail, list):
+                detail = PokeCombine([Poke.decode(code) for code in detail])
+            elif detail is not None:
+                detail = Poke.decode(detail)
+            gamer.game_history.append(GameOperation(find(name), type_, detail, pos))
+        gamer.scout_and_show = [players[name] for name in data['scout_and_show']]
+        gamer.deal = data.get('deal', [])
+        gamer.rounds = data.get('rounds', 0)
+        gamer._is_private = data['private']
+        gamer.host_idx = data['host']
+        gamer.info = data['info']
+        gamer.total_score = data['total_score']
+        gamer.extra_points = data['extra_points']
+        gamer.init_finish = data['init_finish']
+        gamer.confirmed = data['confirmed']
+        gamer.state = GameState(data['state'])
+        if gamer.state == GameState.PLAYING or gamer.state == GameState.END:
+            gamer.round = gamer.round_state()
+        # 在快照版本之上继续递增
+        gamer.version = data['version']
+        gamer.touch()
+        LOBBY.update(gamer)
+        return gamer
 
     # 游戏进行中随时调用的接口
 
+    def _poke_counts(self) -> dict[str, list[int]]:
+        '''一次遍历统计每个玩家的 [得分牌数, 手牌数]，已缓存'''
+        def build() -> dict[str, list[int]]:
+            counts = {player.name: [0, 0] for player in self.players}
+            for poke in self.all_pokes:
+                if poke.owner is None or poke.owner.name not in counts:
+                    continue
+                if poke.state == PokeState.GOAL:
+                    counts[poke.owner.name][0] += 1
+                elif poke.state == PokeState.HIDE:
+                    counts[poke.owner.name][1] += 1
+            return counts
+        return self._view('counts', build)
     def get_player_score(self, player: Player) -> int:
         '''获取玩家当前对局得分'''
-        return (
-            self.extra_points[player.name] 
-            + sum(1 for poke in self.all_pokes
-                if poke.state == PokeState.GOAL and poke.owner == player) 
-            - sum(1 for poke in self.all_pokes   
-                if poke.state == PokeState.HIDE and poke.owner == player))
+        goal, hide = self._poke_counts().get(player.name, (0, 0))
+        return self.extra_points[player.name] + goal - hide
     def get_game_info(self) -> dict:
         '''获取本局公开信息'''
         assert self.state == GameState.PLAYING or \
                 self.state == GameState.END, \
             "Only playing or end game can get game info"
-        return {
-            'turn': len(self.game_history),
-            'players': [player.name for player in self.players],
-            'goal_pokes': [sum(1 for poke in self.all_pokes if 
-                               poke.state == PokeState.GOAL and poke.owner == player) 
-                                    for player in self.players],
-            'remain_pokes': [sum(1 for poke in self.all_pokes if 
-                               poke.state == PokeState.HIDE and poke.owner == player) 
-                                    for player in self.players],
-            'extra_points': self.extra_points,
-            'table': self.displayed_pokes.json(),
-            'last_op': self.game_history[-1].json() if len(self.game_history) > 0 else None
-        }
+        def build() -> dict:
+            counts = self._poke_counts()
+            return {
+                'turn': len(self.game_history),
+                'players': [player.name for player in self.players],
+                'goal_pokes': [counts[player.name][0] for player in self.players],
+                'remain_pokes': [counts[player.name][1] for player in self.players],
+                'extra_points': self.extra_points,
+                'table': self.displayed_pokes.json(),
+                'last_op': self.game_history[-1].json() if len(self.game_history) > 0 else None
+            }
+        return self._view('game_info', build)
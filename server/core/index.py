@@ -0,0 +1,85 @@
+from itertools import islice
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from .gamer import Gamer
+
+MAX_PLAYERS = 5
+'''单桌最大人数'''
+
+class LobbyIndex:
+    '''大厅索引：公开的在线游戏按 (游戏状态, 空位数) 分桶，由Gamer在状态变化时维护'''
+    buckets: dict[tuple[int, int], dict[str, 'Gamer']]
+    '''(状态, 空位数): {gid: Gamer}'''
+    keys: dict[str, tuple[int, int]]
+    '''gid: 所在桶'''
+
+    def __init__(self) -> None:
+        self.buckets = {}
+        self.keys = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def update(self, gamer: 'Gamer') -> None:
+        '''游戏状态、人数或公开性变化后重新分桶'''
+        if not gamer._is_online:
+            return
+        if gamer._is_private:
+            self.discard(gamer)
+            return
+        key = (gamer.state.value, MAX_PLAYERS - len(gamer.players))
+        old = self.keys.get(gamer.gid)
+        if old == key:
+            return
+        if old is not None:
+            self._pop(gamer.gid, old)
+        self.buckets.setdefault(key, {})[gamer.gid] = gamer
+        self.keys[gamer.gid] = key
+
+    def discard(self, gamer: 'Gamer') -> None:
+        '''移除游戏（私人房间或已销毁）'''
+        old = self.keys.pop(gamer.gid, None)
+        if old is not None:
+            self._pop(gamer.gid, old)
+
+    def _pop(self, gid: str, key: tuple[int, int]) -> None:
+        bucket = self.buckets[key]
+        del bucket[gid]
+        if not bucket:
+            del self.buckets[key]
+
+    def query(self, states: list[int], min_seats: int = 1, max_seats: int = MAX_PLAYERS,
+              offset: int = 0, limit: int = 20) -> tuple[int, list['Gamer']]:
+        '''按状态与空位数筛选，返回 (总数, 当前页)。空位少的桶在前，便于尽快凑满开局'''
+        keys = sorted(
+            key for key in self.buckets
+            if key[0] in states and min_seats <= key[1] <= max_seats
+        )
+        total = sum(len(self.buckets[key]) for key in keys)
+        games = []
+        for key in keys:
+            bucket = self.buckets[key]
+            if offset >= len(bucket):
+                offset -= len(bucket)
+                continue
+            games.extend(islice(bucket.values(), offset, offset + limit - len(games)))
+            offset = 0
+            if len(games) >= limit:
+                break
+        return total, games
+
+    @staticmethod
+    def summary(gamer: 'Gamer') -> dict:
+        '''列表中的游戏摘要'''
+        return {
+            'gid': gamer.gid,
+            'state': gamer.state.value,
+            'playing_num': len(gamer.players),
+            'open_seats': MAX_PLAYERS - len(gamer.players),
+            'host': gamer.get_host().name if gamer.players else None,
+            'info': gamer.get_info(),
+        }
+
+LOBBY = LobbyIndex()
+'''全局大厅索引'''
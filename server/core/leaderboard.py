@@ -0,0 +1,85 @@
+from bisect import bisect_left, insort
+from itertools import islice
+
+try:
+    from sortedcontainers import SortedList
+except ImportError:
+    class SortedList:
+        '''sortedcontainers不可用时的退化实现：查找O(log n)，插入删除为O(n)的内存移动'''
+        def __init__(self, iterable=()) -> None:
+            self._list = sorted(iterable)
+        def __len__(self) -> int:
+            return len(self._list)
+        def __getitem__(self, index):
+            return self._list[index]
+        def add(self, value) -> None:
+            insort(self._list, value)
+        def remove(self, value) -> None:
+            idx = bisect_left(self._list, value)
+            if idx == len(self._list) or self._list[idx] != value:
+                raise ValueError(f'{value} not in list')
+            del self._list[idx]
+        def index(self, value) -> int:
+            idx = bisect_left(self._list, value)
+            if idx == len(self._list) or self._list[idx] != value:
+                raise ValueError(f'{value} not in list')
+            return idx
+        def islice(self, start: int, stop: int):
+            return islice(self._list, start, stop)
+
+class Leaderboard:
+    '''积分排行榜：按 (-积分, 玩家名) 排序，更新与名次查询均为O(log n)'''
+    ranking: SortedList
+    '''(-points, name) 有序表'''
+    points: dict[str, int]
+    '''玩家名: 积分'''
+
+    def __init__(self) -> None:
+        self.ranking = SortedList()
+        self.points = {}
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def load(self, records: list[dict[str, object]]) -> None:
+        '''由玩家记录批量重建'''
+        self.points = {str(r['username']): int(r['points']) for r in records}
+        self.ranking = SortedList((-p, n) for n, p in self.points.items())
+
+    def update(self, name: str, points: int) -> None:
+        '''更新玩家积分'''
+        old = self.points.get(name)
+        if old == points:
+            return
+        if old is not None:
+            self.ranking.remove((-old, name))
+        self.ranking.add((-points, name))
+        self.points[name] = points
+
+    def rank(self, name: str) -> int|None:
+        '''玩家名次，从1开始；不在榜上返回None'''
+        if name not in self.points:
+            return None
+        return self.ranking.index((-self.points[name], name)) + 1
+
+    def entries(self, start: int, stop: int) -> list[dict]:
+        '''名次区间 [start, stop)（从0开始）的榜单条目'''
+        start = max(0, start)
+        return [
+            {'rank': start + i + 1, 'name': name, 'points': -neg}
+            for i, (neg, name) in enumerate(self.ranking.islice(start, stop))
+        ]
+
+    def top(self, k: int) -> list[dict]:
+        '''前k名'''
+        return self.entries(0, k)
+
+    def around(self, name: str, radius: int) -> list[dict]:
+        '''玩家名次前后各radius名'''
+        rank = self.rank(name)
+        if rank is None:
+            return []
+        return self.entries(rank - 1 - radius, rank + radius)
+
+LEADERBOARD = Leaderboard()
+'''全局排行榜'''
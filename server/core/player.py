@@ -1,6 +1,9 @@
 from .conn import Websocket
 from .states import PlayerState, PokeState
 from .poke import Poke, PokeCombine
+from .store import STORE, default_record
+from .leaderboard import LEADERBOARD
+from .advice import player_scout_advice
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -21,6 +24,10 @@ class Player:
     '''websocket对象'''
     database: dict[str, object]
     '''数据库对象'''
+    watching: 'Gamer|None'
+    '''正在观战的游戏'''
+    _views: dict[str, object]
+    '''视图缓存：public为公开信息，pokes为手牌（私有），由 touch 失效'''
     _is_logged: bool
     '''是否登录'''
     def __init__(self, name: str) -> None:
@@ -30,38 +37,33 @@ class Player:
         self.state = PlayerState.ONLINE
         self.ws = None
         self.database = {}
+        self.watching = None
         self._is_logged = False
-    def login(self, ws: Websocket) -> tuple[bool, str]:
-        '''玩家登录'''
+        self._views = {}
+    def touch(self, *parts: str) -> None:
+        '''标记视图失效，不指定部分时全部失效；手牌变化同时使所在游戏的视图失效'''
+        if parts:
+            for part in parts:
+                self._views.pop(part, None)
+        else:
+            self._views.clear()
+        if self.gamer:
+            self.gamer.touch('json')
+    def login(self, ws: Websocket, database: dict[str, object]|None = None) -> tuple[bool, str]:
+        '''玩家登录，database为从STORE加载的玩家记录'''
         if self.ws:
             return False, 'Already logged in'
         self.ws = ws
-        self.database = {
-            'username': self.name,
-            'uid': -1,
-            'pwd_hash': '',
-            'last_login': '',
-            'points': 0,
-            'ip': '',
-            'counts': 0,
-            'info': ''
-        } # TODO
+        self.database = database if database is not None else default_record(self.name)
         self._is_logged = True
+        self.touch()
         return True, 'Login success'
     def offline(self) -> None:
         '''离线模式'''
         self.ws = None
         self._is_logged = False
-        self.database = {
-            'username': self.name,
-            'uid': -1,
-            'pwd_hash': '',
-            'last_login': '',
-            'points': 0,
-            'ip': '',
-            'counts': 0,
-            'info': ''
-        }
+        self.database = default_record(self.name)
+        self.touch()
     def get_ip(self) -> str:
         '''获取玩家IP'''
         assert self.ws, \
@@ -72,36 +74,51 @@ class Player:
         if isinstance(addr, tuple):
             return addr[0]
         return addr
-    def json(self) -> dict:
-        '''获取玩家信息'''
-        if self._is_logged:
+    def _view(self, part: str, build) -> object:
+        '''取缓存的视图，失效时重建。视图由所有调用者共享，不可修改'''
+        view = self._views.get(part)
+        if view is None:
+            view = self._views[part] = build()
+        return view
+    def public_json(self) -> dict:
+        '''获取玩家公开信息（不含手牌），已缓存'''
+        def build() -> dict:
+            if self._is_logged:
+                return {
+                    'name': self.name,
+                    'username': self.database['username'],
+                    'uid': self.database['uid'],
+                    'state': self.state.value,
+                    'gamer': self.gamer.gid if self.gamer else None,
+                    'ip': self.get_ip(),
+                    'points': self.database['points'],
+                    'counts': self.database['counts'],
+                }
             return {
                 'name': self.name,
-                'username': self.database['username'],
-                'uid': self.database['uid'],
                 'state': self.state.value,
                 'gamer': self.gamer.gid if self.gamer else None,
-                'pokes': [[str(poke) for poke in self.pokes], [poke.str_disable for poke in self.pokes]],
-                'ip': self.get_ip(),
-                'points': self.database['points'],
-                'counts': self.database['counts'],
             }
-        return {
-            'name': self.name,
-            'state': self.state.value,
-            'gamer': self.gamer.gid if self.gamer else None,
-            'pokes': [[str(poke) for poke in self.pokes], [poke.str_disable for poke in self.pokes]]
-        }
+        return self._view('public', build)
+    def pokes_json(self) -> list[list[str]]:
+        '''获取手牌 [[生效数字], [不生效数字]]，已缓存'''
+        return self._view('pokes', lambda: [[str(poke) for poke in self.pokes], [poke.str_disable for poke in self.pokes]])
+    def json(self) -> dict:
+        '''获取玩家信息：公开部分加上手牌'''
+        return dict(self.public_json(), pokes=self.pokes_json())
     def sync_database(self, **kwargs) -> None:
         '''同步数据库'''
         for key, value in kwargs.items():
             self.database[key] = value
-        # self.database.write() TODO
+        self.touch('public')
+        if self._is_logged:
+            STORE.write(self.database)
         
     def clear(self) -> None:
         '''清空玩家对局信息'''
         self.pokes = []
         self.state = PlayerState.ROOM if self.gamer else PlayerState.ONLINE
+        self.touch()
     def set_state(self, state: PlayerState|int) -> None:
         '''设置玩家状态'''
         if isinstance(state, int):
@@ -111,6 +128,7 @@ class Player:
                 "State must be an instance of PlayerState or int"
             )
         self.state = state
+        self.touch('public')
     def get_total_score(self) -> dict[tuple[str, int]]:
         '''获取所有玩家总得分'''
         assert self.state.value > 0, \
@@ -119,15 +137,31 @@ class Player:
             "Player must be set to a gamer before get total score"
         return self.gamer.get_total_score()
 
+    def spectate(self, gamer: 'Gamer') -> None:
+        '''观战游戏，同一时间只能观战一个游戏'''
+        assert self._is_logged, \
+            "Player must be logged in to spectate"
+        assert not gamer._has_player(self), \
+            "Player can not spectate his own game"
+        self.unspectate()
+        gamer.spectators.add(self)
+        self.watching = gamer
+
+    def unspectate(self) -> None:
+        '''停止观战'''
+        if self.watching:
+            self.watching.spectators.remove(self)
+            self.watching = None
+
     # 游戏准备阶段的接口
 
-    def set_gamer(self, gamer: 'Gamer') -> None:
-        '''玩家进入游戏'''
+    def set_gamer(self, gamer: 'Gamer', broadcast: bool = True) -> None:
+        '''玩家进入游戏，broadcast为False时不广播加入事件（由批量加入统一广播）'''
         assert self.state == PlayerState.ONLINE, \
             "Only ONLINE player can be set to a gamer"
         assert self.gamer == None, \
             "Player must not be in any game"
-        gamer.add_player(self)
+        gamer.add_player(self, broadcast)
         self.gamer = gamer
         self.set_state(PlayerState.ROOM)
 
@@ -182,7 +216,15 @@ class Player:
 
     def get_pokes(self) -> str:
         '''查看手牌'''
-        return ' '.join(str(poke) for poke in self.pokes)+','+' '.join(poke.str_disable for poke in self.pokes)
+        return self._view('pokes_str', lambda: ' '.join(str(poke) for poke in self.pokes)+','+' '.join(poke.str_disable for poke in self.pokes))
+
+    def scout_advice(self, index: int|None = None) -> list[dict]:
+        '''摸牌建议：每个可选的 (摸牌位置, 朝向, 插入位置)，按新牌所在的最强组合排序
+
+        index: 0为尾部，-1为头部，None为两端都考虑'''
+        assert self.gamer, \
+            "Player must be set to a gamer before asking for advice"
+        return player_scout_advice(self.pokes, self.gamer.displayed_pokes.pokes, index)
 
     def receive_pokes(self, pokes: list[Poke]) -> None:
         '''获取手牌并修改牌的状态'''
@@ -192,6 +234,7 @@ class Player:
         for poke in self.pokes:
             poke.set_state(PokeState.HIDE)
             poke.set_owner(self)
+        self.touch()
 
     def choose_pokes_side(self, reverse: bool) -> None:
         '''牌局开始时，选择手牌正反面，将广播事件'''
@@ -202,6 +245,7 @@ class Player:
         if reverse:
             for poke in self.pokes:
                 poke.reverse_side()
+            self.touch()
         self.gamer.player_init_finish(self)
     
     def choose_pokes_index(self, begin:int, end:int) -> PokeCombine:
@@ -312,6 +356,8 @@ class Player:
         info = self.gamer.get_info()
         score = self.get_self_score()
         self.sync_database(points=self.database['points']+score)
+        if self._is_logged:
+            LEADERBOARD.update(self.name, self.database['points'])
 
     def confirm_result(self) -> None:
         '''确认游戏结果，将会广播事件'''
@@ -319,7 +365,7 @@ class Player:
             "Only player in end state can confirm result"
         assert self.gamer, \
             "Player must be set to a gamer before confirm result"
-        self.gamer.player_confirm_result()
+        self.gamer.player_confirm_result(self)
     
     def get_self_score(self) -> int:
         '''获取玩家当前对局得分'''
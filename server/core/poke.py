@@ -43,6 +43,15 @@ class Poke:
 
     def json(self) -> str:
         return str(self) + ',' + self.str_disable
+    def code(self) -> int:
+        '''单张牌的紧凑编码：正反面数字与朝向'''
+        return (self.up - 1) * 10 + self.down - 1 + (100 if self.side else 0)
+    @classmethod
+    def decode(cls, code: int) -> 'Poke':
+        '''由 code 的编码重建单张牌'''
+        side, rest = divmod(code, 100)
+        up, down = divmod(rest, 10)
+        return cls(up + 1, down + 1, bool(side))
     def clear(self) -> None:
         '''清空牌局信息'''
         self.state = PokeState.WAITING
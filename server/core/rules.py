@@ -0,0 +1,182 @@
+from typing import NamedTuple
+
+Card = tuple[int, int]
+'''单张牌：(生效数字, 不生效数字)'''
+Move = tuple
+'''('show', b_index, e_index) | ('scout', head, reverse, insert_to) | ('scout_and_show', head, reverse, insert_to)
+
+head为True时摸牌桌头部（第一张），否则摸尾部；insert_to为插入手牌的位置'''
+
+class RoundState(NamedTuple):
+    '''单局的不可变快照，只含元组与整数，可在线程或进程间传递、哈希、作为缓存键
+
+    apply 只重建被修改的部分，其余手牌与牌桌在新旧状态间共享'''
+    hands: tuple[tuple[Card, ...], ...]
+    '''按座位排列的手牌'''
+    table: tuple[Card, ...]
+    '''牌桌上的牌'''
+    owner: int
+    '''最后出牌（牌桌上的牌所属）的座位，尚无人出牌为-1'''
+    goals: tuple[int, ...]
+    '''各座位得分区的牌数'''
+    extra: tuple[int, ...]
+    '''各座位的额外得分（自己的牌被摸走）'''
+    turn: int
+    '''当前行动的座位'''
+    must_show: bool
+    '''当前玩家刚使用摸牌并立刻出牌，必须出牌'''
+    used: int
+    '''已使用摸牌并立刻出牌的座位（位掩码）'''
+    scouts: int
+    '''末尾连续的摸牌次数'''
+    winner: int = -1
+    '''胜者座位，单局进行中为-1'''
+    end: str = ''
+    '''结束方式：show_all（出完手牌）或 beat_all（其余玩家都摸牌）'''
+
+def initial(hands: list[list[Card]], first: int) -> RoundState:
+    '''开局状态：各座位的手牌（已选择正反序）与先手座位'''
+    num = len(hands)
+    return RoundState(
+        hands=tuple(tuple(hand) for hand in hands),
+        table=(),
+        owner=-1,
+        goals=(0,) * num,
+        extra=(0,) * num,
+        turn=first,
+        must_show=False,
+        used=0,
+        scouts=0,
+    )
+
+def combine_type(cards: tuple[Card, ...]) -> int:
+    '''组合类型，与 PokeCombine.calculate 相同：0非法，1单牌（含空），2顺子，3刻子'''
+    if len(cards) <= 1:
+        return 1
+    step = cards[1][0] - cards[0][0]
+    if step not in (-1, 0, 1):
+        return 0
+    for i in range(2, len(cards)):
+        if cards[i][0] - cards[i - 1][0] != step:
+            return 0
+    return 3 if step == 0 else 2
+
+def combine_key(cards: tuple[Card, ...]) -> tuple[int, int, int]:
+    '''比较键 (张数, 类型, 最小值)，键较大的组合大，与 PokeCombine.__gt__ 相同'''
+    if not cards:
+        return (0, 0, 0)
+    return (len(cards), combine_type(cards), min(card[0] for card in cards))
+
+def shows(hand: tuple[Card, ...], table: tuple[Card, ...]) -> list[tuple[int, int]]:
+    '''手牌中所有大于牌桌的组合 (b_index, e_index)'''
+    target = combine_key(table)
+    out = []
+    for begin in range(len(hand)):
+        low = hand[begin][0]
+        step = None
+        for end in range(begin + 1, len(hand) + 1):
+            if end - begin > 1:
+                diff = hand[end - 1][0] - hand[end - 2][0]
+                if step is None:
+                    step = diff
+                if diff != step or step not in (-1, 0, 1):
+                    # 更长的切片同样非法
+                    break
+                low = min(low, hand[end - 1][0])
+            key = (end - begin, 1 if step is None else (3 if step == 0 else 2), low)
+            if key > target:
+                out.append((begin, end))
+    return out
+
+def can_scout(state: RoundState) -> bool:
+    '''当前玩家能否摸牌：牌桌有别人的牌，且不必出牌'''
+    return bool(state.table) and state.owner != state.turn and not state.must_show and state.winner < 0
+
+def legal_moves(state: RoundState) -> list[Move]:
+    '''当前玩家所有合法操作。牌桌只有一张时两端相同，只列出头部'''
+    if state.winner >= 0:
+        return []
+    hand = state.hands[state.turn]
+    moves: list[Move] = [('show', b, e) for b, e in shows(hand, state.table)]
+    if can_scout(state):
+        heads = (True,) if len(state.table) == 1 else (True, False)
+        kinds = ('scout',) if state.used >> state.turn & 1 else ('scout', 'scout_and_show')
+        for kind in kinds:
+            for head in heads:
+                for reverse in (False, True):
+                    for insert_to in range(len(hand) + 1):
+                        moves.append((kind, head, reverse, insert_to))
+    return moves
+
+def _replace(values: tuple, index: int, value) -> tuple:
+    return values[:index] + (value,) + values[index + 1:]
+
+def apply(state: RoundState, move: Move) -> RoundState:
+    '''执行一次操作，返回新状态，原状态不变。非法操作抛出 AssertionError
+
+    与 Gamer.player_turn_end 的结果相同：出牌时牌桌上的牌进入出牌者的得分区；摸牌时牌桌所属玩家额外得1分；
+    多于两人时，其余玩家依次摸牌后最后出牌者胜（beat_all）；出完手牌者胜（show_all）'''
+    assert state.winner < 0, \
+        "Round is over"
+    kind = move[0]
+    seat = state.turn
+    num = len(state.hands)
+    hand = state.hands[seat]
+    if kind == 'show':
+        _, begin, end = move
+        assert 0 <= begin < end <= len(hand), \
+            "Invalid begin and end index"
+        cards = hand[begin:end]
+        key = combine_key(cards)
+        assert key[1] != 0, \
+            "Pokes must be a valid combine"
+        assert key > combine_key(state.table), \
+            "Pokes must be greater than table's"
+        rest = hand[:begin] + hand[end:]
+        goals = state.goals
+        if state.table:
+            goals = _replace(goals, seat, goals[seat] + len(state.table))
+        return RoundState(
+            hands=_replace(state.hands, seat, rest),
+            table=cards,
+            owner=seat,
+            goals=goals,
+            extra=state.extra,
+            turn=(seat + 1) % num,
+            must_show=False,
+            used=state.used,
+            scouts=0,
+            winner=-1 if rest else seat,
+            end='' if rest else 'show_all',
+        )
+    assert kind in ('scout', 'scout_and_show'), \
+        f"Unknown move {move!r}"
+    _, head, reverse, insert_to = move
+    assert not state.must_show, \
+        "Player must show pokes after scout and show"
+    assert state.table, \
+        "Displayed pokes must exist"
+    assert state.owner != seat, \
+        "Target poke must be owned by original player"
+    assert insert_to != -1, \
+        "Type 1, 2 must have pos"
+    if kind == 'scout_and_show':
+        assert not state.used >> seat & 1, \
+            "Player can only scout and show once in a game"
+    value, disable = state.table[0 if head else -1]
+    card = (disable, value) if reverse else (value, disable)
+    pos = insert_to % (len(hand) + 1)
+    hands = _replace(state.hands, seat, hand[:pos] + (card,) + hand[pos:])
+    table = state.table[1:] if head else state.table[:-1]
+    extra = _replace(state.extra, state.owner, state.extra[state.owner] + 1)
+    if kind == 'scout_and_show':
+        return RoundState(hands, table, state.owner, state.goals, extra, seat, True, state.used | 1 << seat, 0)
+    scouts = state.scouts + 1
+    if num > 2 and scouts >= num - 1:
+        return RoundState(hands, table, state.owner, state.goals, extra, (seat + 1) % num, False, state.used, scouts,
+                          state.owner, 'beat_all')
+    return RoundState(hands, table, state.owner, state.goals, extra, (seat + 1) % num, False, state.used, scouts)
+
+def scores(state: RoundState) -> tuple[int, ...]:
+    '''各座位的单局得分：额外得分 + 得分区牌数 - 手牌数，与 Gamer.get_player_score 相同'''
+    return tuple(extra + goal - len(hand) for extra, goal, hand in zip(state.extra, state.goals, state.hands))
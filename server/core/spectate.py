@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+from .conn import bd
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from .player import Player
+
+SPECTATE_DELAY = 0.0
+'''观战延迟（秒）'''
+SPECTATE_INTERVAL = 0.5
+'''观战推送最小间隔（秒），间隔内的多帧合并为一帧'''
+
+class SpectatorFeed:
+    '''观战推送：每帧只编码一次，由所有观战者共享；可延迟并限制推送频率'''
+    gid: int|str
+    '''游戏ID'''
+    viewers: dict[str, 'Player']
+    '''观战者名: 玩家'''
+    delay: float
+    '''延迟（秒）'''
+    interval: float
+    '''推送最小间隔（秒）'''
+    pending: deque[tuple[float, str]]
+    '''待推送的 (到期时间, 已编码帧)'''
+
+    def __init__(self, gid: int|str, delay: float = SPECTATE_DELAY, interval: float = SPECTATE_INTERVAL) -> None:
+        self.gid = gid
+        self.viewers = {}
+        self.delay = delay
+        self.interval = interval
+        self.pending = deque()
+        self._last = 0.0
+        self._timer = None
+
+    def __len__(self) -> int:
+        return len(self.viewers)
+
+    def add(self, player: 'Player') -> None:
+        '''添加观战者'''
+        self.viewers[player.name] = player
+
+    def remove(self, player: 'Player') -> None:
+        '''移除观战者'''
+        self.viewers.pop(player.name, None)
+        if not self.viewers:
+            self.clear()
+
+    def clear(self) -> None:
+        '''移除所有观战者和待推送帧'''
+        for player in self.viewers.values():
+            player.watching = None
+        self.viewers = {}
+        self.pending.clear()
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _websockets(self) -> list:
+        return [player.ws for player in self.viewers.values()]
+
+    def close(self) -> None:
+        '''立即推送所有待推送帧，然后移除所有观战者'''
+        for i, (due, frame) in enumerate(self.pending):
+            self.pending[i] = (0.0, frame)
+        self.flush()
+        self.clear()
+
+    def push(self, frame: str) -> None:
+        '''推送已编码的广播帧'''
+        if not self.viewers:
+            return
+        now = time.monotonic()
+        if not self.delay and not self.pending and now - self._last >= self.interval:
+            self._last = now
+            bd(self._websockets(), frame)
+            return
+        self.pending.append((now + self.delay, frame))
+        self._schedule(now)
+
+    def _schedule(self, now: float) -> None:
+        if self._timer or not self.pending:
+            return
+        at = max(self.pending[0][0], self._last + self.interval)
+        self._timer = asyncio.get_running_loop().call_later(max(0.0, at - now), self.flush)
+
+    def flush(self) -> None:
+        '''推送所有到期帧，多帧合并为一个 spectatorFrames 帧'''
+        self._timer = None
+        now = time.monotonic()
+        frames = []
+        while self.pending and self.pending[0][0] <= now:
+            frames.append(self.pending.popleft()[1])
+        if frames and self.viewers:
+            self._last = now
+            if len(frames) == 1:
+                bd(self._websockets(), frames[0])
+            else:
+                bd(self._websockets(), '{"func": "spectatorFrames", "gid": %s, "frames": [%s]}' % (json.dumps(self.gid), ', '.join(frames)))
+        self._schedule(now)
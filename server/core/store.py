@@ -0,0 +1,171 @@
+import sqlite3
+import threading
+
+FIELDS = ('username', 'uid', 'pwd_hash', 'last_login', 'points', 'ip', 'counts', 'info')
+'''玩家记录字段，username为主键'''
+
+def default_record(name: str) -> dict[str, object]:
+    '''新玩家的默认记录'''
+    return {
+        'username': name,
+        'uid': -1,
+        'pwd_hash': '',
+        'last_login': '',
+        'points': 0,
+        'ip': '',
+        'counts': 0,
+        'info': ''
+    }
+
+class PlayerStore:
+    '''玩家记录的SQLite持久化：登录时惰性加载并缓存，修改只标记为脏，由后台线程按间隔或批量写回'''
+    path: str
+    '''数据库文件'''
+    interval: float
+    '''写回间隔（秒）'''
+    batch: int
+    '''脏记录达到该数量时立即写回'''
+    cache: dict[str, dict]
+    '''已加载的记录'''
+    dirty: dict[str, dict]
+    '''待写回的记录快照'''
+    flushing: dict[str, dict]
+    '''正在写回、尚未提交的记录快照'''
+
+    def __init__(self, path: str = 'scout.db', interval: float = 1.0, batch: int = 256) -> None:
+        self.path = path
+        self.interval = interval
+        self.batch = batch
+        self.cache = {}
+        self.dirty = {}
+        self.flushing = {}
+        self.conn = None
+        self._lock = threading.Lock()
+        '''保护 cache/dirty/flushing'''
+        self._db_lock = threading.Lock()
+        '''保护数据库连接'''
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = None
+        self._next_uid = 0
+
+    def open(self, path: str|None = None) -> None:
+        '''打开数据库并启动写回线程。未打开时所有写入被忽略'''
+        if path:
+            self.path = path
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS players ('
+            'username TEXT PRIMARY KEY, uid INTEGER, pwd_hash TEXT, last_login TEXT, '
+            'points INTEGER, ip TEXT, counts INTEGER, info TEXT)'
+        )
+        self.conn.commit()
+        self._next_uid = (self.conn.execute('SELECT MAX(uid) FROM players').fetchone()[0] or 0) + 1
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name='PlayerStore', daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        '''停止写回线程，写回剩余记录并关闭数据库'''
+        if self.conn is None:
+            return
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self.conn.close()
+        self.conn = None
+
+    def load(self, name: str) -> dict[str, object]:
+        '''读取玩家记录，优先缓存；不存在时分配uid并创建。会访问磁盘，异步代码中应放入线程执行'''
+        with self._lock:
+            if name in self.cache:
+                return self.cache[name]
+            pending = self.dirty.get(name) or self.flushing.get(name)
+            if pending is not None:
+                # 已下线但尚未写回，或正在写回
+                record = self.cache[name] = dict(pending)
+                return record
+        record = None
+        if self.conn is not None:
+            with self._db_lock:
+                row = self.conn.execute(
+                    f'SELECT {", ".join(FIELDS)} FROM players WHERE username = ?', (name,)
+                ).fetchone()
+            if row is not None:
+                record = dict(zip(FIELDS, row))
+        with self._lock:
+            if name in self.cache:
+                return self.cache[name]
+            pending = self.dirty.get(name) or self.flushing.get(name)
+            if pending is not None:
+                # 读库期间被写回线程取走，库中的行可能已过期
+                record = self.cache[name] = dict(pending)
+                return record
+            if record is None:
+                record = default_record(name)
+                if self.conn is not None:
+                    record['uid'] = self._next_uid
+                    self._next_uid += 1
+                    self.dirty[name] = dict(record)
+            self.cache[name] = record
+            return record
+
+    def release(self, name: str) -> None:
+        '''玩家下线后释放缓存，未写回的修改仍会写回'''
+        with self._lock:
+            self.cache.pop(name, None)
+
+    def write(self, record: dict[str, object]) -> None:
+        '''标记记录为脏，不做任何IO'''
+        if self.conn is None:
+            return
+        with self._lock:
+            self.dirty[record['username']] = dict(record)
+            full = len(self.dirty) >= self.batch
+        if full:
+            self._wake.set()
+
+    def records(self) -> list[dict[str, object]]:
+        '''读取全部已写回的记录'''
+        if self.conn is None:
+            return []
+        with self._db_lock:
+            rows = self.conn.execute(f'SELECT {", ".join(FIELDS)} FROM players').fetchall()
+        return [dict(zip(FIELDS, row)) for row in rows]
+
+    def flush(self) -> int:
+        '''写回所有脏记录，返回写回数量'''
+        with self._lock:
+            dirty, self.dirty = self.dirty, {}
+            # 提交前 load 仍从这里读取，而不是读到库中的旧行
+            self.flushing = dirty
+        if not dirty or self.conn is None:
+            return 0
+        try:
+            with self._db_lock:
+                self.conn.executemany(
+                    f'INSERT OR REPLACE INTO players ({", ".join(FIELDS)}) '
+                    f'VALUES ({", ".join("?" for _ in FIELDS)})',
+                    [tuple(record[key] for key in FIELDS) for record in dirty.values()]
+                )
+                self.conn.commit()
+        finally:
+            with self._lock:
+                self.flushing = {}
+        return len(dirty)
+
+    def _run(self) -> None:
+        while not self._stop:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                import traceback
+                traceback.print_exc()
+
+STORE = PlayerStore()
+'''全局玩家存储'''
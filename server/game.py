@@ -1,4 +1,6 @@
 from .static import *
+from .oplog import OPLOG
+from .clock import CLOCK
 
 ##############
 # Game Open  #
@@ -8,7 +10,9 @@ async def playerLeave(query: Query):
     '''Player leave the game'''
     gamer = query.gamer
     query.player.quit_game()
+    OPLOG.record('playerLeave', gamer.gid, name=query.name)
     if len(gamer.players) == 0:
+        gamer.terminate()
         del GAMER[gamer.gid]
     await query.ok()
     if DEBUG:
@@ -18,6 +22,7 @@ async def playerLeave(query: Query):
 async def playerReady(query: Query):
     '''Player ready for the game'''
     pap = query.player.ready_for_game()
+    OPLOG.record('playerReady', query.gid, name=query.name)
     await query.ok()
     if DEBUG:
         print(green(f"Player {query.name} ready in game {query.gid}."), f" Websocket: {id(query.ws)}")
@@ -35,6 +40,7 @@ async def playerReady(query: Query):
 async def playerUnready(query: Query):
     '''Player unready for the game'''
     query.player.unready_for_game()
+    OPLOG.record('playerUnready', query.gid, name=query.name)
     await query.ok()
     if DEBUG:
         print(green(f"Player {query.name} unready in game {query.gid}."), f" Websocket: {id(query.ws)}")
@@ -47,6 +53,7 @@ async def choosePokeOrder(query: Query):
     '''Choose poke order 选择手牌正反序'''
     reverse = bool(int(query.get('reverse')))
     query.player.choose_pokes_side(reverse)
+    OPLOG.record('choosePokeOrder', query.gid, name=query.name, reverse=reverse)
     await query.ok()
     if DEBUG:
         print(green(f"Player {query.name} choose poke order{' ' if reverse else ' not '}reversed in game {query.gid}."), f" Websocket: {id(query.ws)}")
@@ -64,6 +71,7 @@ async def show(query: Query):
     e_index = int(query.get('e_index'))
     pokes = query.player.choose_pokes_index(b_index, e_index)
     nxt = query.player.show(pokes)
+    OPLOG.record('show', query.gid, name=query.name, b_index=b_index, e_index=e_index)
     await query.ok()
     if DEBUG:
         if nxt:
@@ -85,6 +93,7 @@ async def scout(query: Query):
     reverse = bool(int(query.get('reverse')))
     insert_to = int(query.get('insert_to'))
     nxt = query.player.scout(index, reverse, insert_to)
+    OPLOG.record('scout', query.gid, name=query.name, index=index, reverse=reverse, insert_to=insert_to)
     await query.ok()
     if DEBUG:
         if nxt:
@@ -106,6 +115,7 @@ async def scoutAndShow(query: Query):
     reverse = bool(int(query.get('reverse')))
     insert_to = int(query.get('insert_to'))
     nxt = query.player.scout_and_show(index, reverse, insert_to)
+    OPLOG.record('scoutAndShow', query.gid, name=query.name, index=index, reverse=reverse, insert_to=insert_to)
     await query.ok()
     if DEBUG:
         if nxt:
@@ -120,6 +130,7 @@ async def scoutAndShow(query: Query):
 async def confirmResult(query: Query):
     '''Confirm result 确认结果'''
     query.player.confirm_result()
+    OPLOG.record('confirmResult', query.gid, name=query.name)
     await query.ok()
     if DEBUG:
         print(green(f"Player {query.name} confirm result in game {query.gid}."), f" Websocket: {id(query.ws)}")
@@ -129,8 +140,14 @@ async def confirmResult(query: Query):
 ##############
 
 async def getPokes(query: Query):
-    '''Get pokes 获取本局手牌，pokes为两组数，第一组为有效，第二组为无效，两组之间逗号分隔，数之间空格分隔，T代表10。'''
-    await query.ok(query.player.get_pokes())
+    '''Get pokes 获取本局手牌，pokes为两组数，第一组为有效，第二组为无效，两组之间逗号分隔，数之间空格分隔，T代表10。
+
+    if_version: int,可选，与当前版本相同时返回304
+    '''
+    player = query.player
+    # Cached and versioned per game: it must be the player's own, not any gid the client names
+    assert player.gamer is query.gamer, 'You are not in the game.'
+    await query.ok_versioned(query.gamer, ('getPokes', player.name), player.get_pokes)
     if DEBUG:
         print(yellow(f"Player {query.name} queries pokes in game {query.gid}."), f" Websocket: {id(query.ws)}")
 
@@ -141,8 +158,12 @@ async def getScore(query: Query):
         print(yellow(f"Player {query.name} queries score in game {query.gid}."), f" Websocket: {id(query.ws)}")
 
 async def getInfo(query: Query):
-    '''Get info 获取游戏信息（与broadcast相同）'''
-    await query.ok(query.gamer.get_info())
+    '''Get info 获取游戏信息（与broadcast相同）
+
+    if_version: int,可选，与当前版本相同时返回304
+    '''
+    gamer = query.gamer
+    await query.ok_versioned(gamer, ('getInfo',), gamer.get_info)
     if DEBUG:
         print(yellow(f"Player {query.name} queries info in game {query.gid}."), f" Websocket: {id(query.ws)}")
 
@@ -156,19 +177,52 @@ async def getGameInfo(query: Query):
     # extra_points: [int],额外得分
     # table: [str],桌面上的牌
     # last_op: dict,上一次操作
-    await query.ok(query.gamer.get_game_info())
+    # if_version: int,可选，与当前版本相同时返回304
+    gamer = query.gamer
+    await query.ok_versioned(gamer, ('getGameInfo',), gamer.get_game_info)
     if DEBUG:
         print(yellow(f"Player {query.name} queries game info in game {query.gid}."), f" Websocket: {id(query.ws)}")
 
 async def getTotalScore(query: Query):
-    '''Get total score 获取所有玩家累计总得分'''
-    await query.ok(query.gamer.total_score)
+    '''Get total score 获取所有玩家累计总得分
+
+    if_version: int,可选，与当前版本相同时返回304
+    '''
+    gamer = query.gamer
+    await query.ok_versioned(gamer, ('getTotalScore',), gamer.get_total_score)
     if DEBUG:
         print(yellow(f"Player {query.name} queries total score in game {query.gid}."), f" Websocket: {id(query.ws)}")
 
+async def getScoutAdvice(query: Query):
+    '''Get scout advice 摸牌建议，按摸上来的牌所在的最强组合排序
+
+    index: [0, -1, 空],摸牌位置，空为两端
+
+    top: int,返回条数
+    '''
+    index = query.get('index', '')
+    index = None if index in ('', None) else int(index)
+    assert index in [None, 0, -1], 'Invalid index. You can only draw from the top or the bottom of the deck.'
+    top = int(query.get('top', 5))
+    assert top > 0, 'Invalid top.'
+    await query.ok(query.player.scout_advice(index)[:top])
+    if DEBUG:
+        print(yellow(f"Player {query.name} queries scout advice in game {query.gid}."), f" Websocket: {id(query.ws)}")
+
+async def getClock(query: Query):
+    '''Get clock 当前阶段的计时，phase为INIT/TURN/END，remaining为剩余秒数，无计时时均为null'''
+    key = CLOCK.phase(query.gamer)
+    await query.ok({'phase': key[0] if key else None, 'remaining': CLOCK.remaining(query.gid)})
+    if DEBUG:
+        print(yellow(f"Player {query.name} queries clock in game {query.gid}."), f" Websocket: {id(query.ws)}")
+
 async def getHistory(query: Query):
-    '''Get history 获取本局历史出牌记录'''
-    await query.ok([str(op) for op in query.gamer.get_history()])
+    '''Get history 获取本局历史出牌记录
+
+    if_version: int,可选，与当前版本相同时返回304
+    '''
+    gamer = query.gamer
+    await query.ok_versioned(gamer, ('getHistory',), gamer.history_json)
     if DEBUG:
         print(yellow(f"Player {query.name} queries history in game {query.gid}."), f" Websocket: {id(query.ws)}")
 
@@ -0,0 +1,60 @@
+import time
+
+from .core import C2S
+
+RATE_LIMITS = {
+    'system': (1.0, 5),
+    'main': (10.0, 20),
+    'subjective': (20.0, 40),
+    'admin': (2.0, 5),
+    'unknown': (1.0, 5),
+    'connection': (50.0, 100),
+}
+'''$category: (tokens per second, burst). Categories follow `c2s.json`; `unknown` is shared by
+funcs that are not in the API, `connection` caps all requests of one connection together'''
+
+CATEGORY = {func: category for category, apis in C2S.items() for func in apis}
+'''$func: category'''
+
+class TokenBucket:
+    '''Token bucket refilled lazily before each check'''
+    __slots__ = ('rate', 'capacity', 'tokens', 'stamp')
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.stamp = time.monotonic()
+
+    def refill(self, now: float) -> bool:
+        '''Add the tokens earned since the last refill, return whether one can be taken'''
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return self.tokens >= 1
+
+class RateLimiter:
+    '''Per-connection limiter: one bucket per func plus one for the whole connection'''
+    limits: dict[str, tuple[float, int]]
+    '''$category: (rate, burst)'''
+    buckets: dict[str, TokenBucket]
+    '''$func: bucket'''
+
+    def __init__(self, limits: dict[str, tuple[float, int]] = RATE_LIMITS) -> None:
+        self.limits = limits
+        self.buckets = {}
+        self.total = TokenBucket(*limits['connection'])
+
+    def allow(self, func: str) -> bool:
+        '''Whether a request to `func` may be dispatched now'''
+        key = func if func in CATEGORY else '?'
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(*self.limits[CATEGORY.get(func, 'unknown')])
+        now = time.monotonic()
+        # Refill both before deciding, so a rejected request spends no token from either
+        total, own = self.total.refill(now), bucket.refill(now)
+        if not (total and own):
+            return False
+        self.total.tokens -= 1
+        bucket.tokens -= 1
+        return True
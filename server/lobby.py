@@ -1,8 +1,7 @@
 
 from .static import *
-
-import secrets
-from datetime import datetime
+from .match import MATCHER
+from .oplog import OPLOG
 
 async def getGids(query: Query):
     '''Get all running game ids'''
@@ -10,20 +9,54 @@ async def getGids(query: Query):
     if DEBUG:
         print(yellow(f"Player {query.name} queries game ids."), f" Websocket: {id(query.ws)}")
 
+async def listGames(query: Query):
+    '''List joinable games page by page from the lobby index.
+
+    state: int|[int], game states to include, default recruiting
+
+    min_seats / max_seats: int, open seats range, default [1, 5]
+
+    page: int, start from 0
+
+    page_size: int, at most 50
+    '''
+    states = query.get('state', [GameState.RECRUIT.value])
+    if not isinstance(states, list):
+        states = [states]
+    states = [int(s) for s in states]
+    min_seats = int(query.get('min_seats', 1))
+    max_seats = int(query.get('max_seats', 5))
+    page = int(query.get('page', 0))
+    page_size = int(query.get('page_size', 20))
+    assert page >= 0, 'Invalid page'
+    assert 0 < page_size <= 50, 'Invalid page size. 1 ~ 50 games per page.'
+    total, games = LOBBY.query(states, min_seats, max_seats, page * page_size, page_size)
+    await query.ok({
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'games': [LOBBY.summary(gamer) for gamer in games]
+    })
+    if DEBUG:
+        print(yellow(f"Player {query.name} lists games page {page}."), f" Websocket: {id(query.ws)}")
+
 async def getOnlinePlayers(query: Query):
     '''Get all online players'''
     await query.ok(list(PLAYER.keys()))
     if DEBUG:
         print(yellow(f"Player {query.name} queries online players."), f" Websocket: {id(query.ws)}")
 
+async def getReplication(query: Query):
+    '''Replication lag of the standby, in entries and in seconds since the oldest unacknowledged entry'''
+    await query.ok(OPLOG.stats())
+    if DEBUG:
+        print(yellow(f"Player {query.name} queries replication."), f" Websocket: {id(query.ws)}")
+
 async def playerJoin(query: Query):
     '''Player join the game'''
     if query.gid == '':
         # Create a new game
-        gid = secrets.token_hex(6)
-        gamer = Gamer(gid)
-        global GAMER
-        GAMER[gid] = {'gamer': gamer, 'startTime': datetime.now()}
+        gamer = create_game()
     else:
         # Join existing game
         gamer = find_game(query.gid)
@@ -38,7 +71,52 @@ async def playerJoin(query: Query):
                 print(red(f"Game {query.gid} is full."), f" Websocket: {id(query.ws)}")
             return
     query.player.set_gamer(gamer)
+    if query.gid == '':
+        OPLOG.record('playerJoin', gamer.gid, name=query.name, seed=gamer.seed)
+    else:
+        OPLOG.record('playerJoin', gamer.gid, name=query.name)
     await query.ok(gamer.gid)
     if DEBUG:
         print(green(f"Player {query.name} joins game {gamer.gid}."), f" Websocket: {id(query.ws)}")
-                
+
+async def quickMatch(query: Query):
+    '''Queue the player for a table of `size` (2~5) players. The matcher seats queued players in batches'''
+    size = int(query.get('size', 4))
+    waiting = MATCHER.join(query.player, size)
+    await query.ok({'size': size, 'waiting': waiting})
+    if DEBUG:
+        print(green(f"Player {query.name} queues for a {size}-player game."), f" Websocket: {id(query.ws)}")
+
+async def cancelMatch(query: Query):
+    '''Leave the matchmaking queue'''
+    MATCHER.cancel(query.player)
+    await query.ok()
+    if DEBUG:
+        print(green(f"Player {query.name} leaves the matchmaking queue."), f" Websocket: {id(query.ws)}")
+
+async def getLeaderboard(query: Query):
+    '''Get the top `k` (at most 100) players by points'''
+    k = int(query.get('k', 10))
+    assert 0 < k <= 100, 'Invalid k. 1 ~ 100 players.'
+    await query.ok({'total': len(LEADERBOARD), 'ranking': LEADERBOARD.top(k)})
+    if DEBUG:
+        print(yellow(f"Player {query.name} queries top {k} players."), f" Websocket: {id(query.ws)}")
+
+async def getRank(query: Query):
+    '''Get the rank and points of `target_name`, the player himself by default'''
+    target = str(query.get('target_name', query.name)) or query.name
+    rank = LEADERBOARD.rank(target)
+    if rank is None:
+        await query.error(message='Player not ranked', code=404)
+        return
+    await query.ok({'name': target, 'rank': rank, 'points': LEADERBOARD.points[target], 'total': len(LEADERBOARD)})
+    if DEBUG:
+        print(yellow(f"Player {query.name} queries rank of {target}."), f" Websocket: {id(query.ws)}")
+
+async def getRankNeighbors(query: Query):
+    '''Get the players ranked within `radius` (at most 50) of the player'''
+    radius = int(query.get('radius', 5))
+    assert 0 <= radius <= 50, 'Invalid radius. 0 ~ 50 players.'
+    await query.ok({'total': len(LEADERBOARD), 'ranking': LEADERBOARD.around(query.name, radius)})
+    if DEBUG:
+        print(yellow(f"Player {query.name} queries players ranked around him."), f" Websocket: {id(query.ws)}")
@@ -0,0 +1,87 @@
+import asyncio
+
+from .static import (
+    Player, Gamer,
+    PLAYER, create_game,
+    yellow, DEBUG
+)
+from .core import PlayerState
+from .oplog import OPLOG
+
+class Matchmaker:
+    '''Quick-match queues, one per table size, drained in batches by `run`'''
+    queues: dict[int, dict[str, Player]]
+    '''$size: {$name: Player}, in arrival order'''
+    waiting: dict[str, int]
+    '''$name: queued table size'''
+
+    def __init__(self) -> None:
+        self.queues = {size: {} for size in range(2, 6)}
+        self.waiting = {}
+
+    def join(self, player: Player, size: int) -> int:
+        '''Queue a player, return how many players wait for that size'''
+        assert size in self.queues, 'Invalid size. A table seats 2 ~ 5 players.'
+        assert player.state == PlayerState.ONLINE and player.gamer is None, \
+            'Player must not be in any game'
+        self.cancel(player)
+        self.queues[size][player.name] = player
+        self.waiting[player.name] = size
+        return len(self.queues[size])
+
+    def cancel(self, player: Player) -> bool:
+        '''Remove a player from the queue, return whether it was queued'''
+        size = self.waiting.pop(player.name, None)
+        if size is None:
+            return False
+        self.queues[size].pop(player.name, None)
+        return True
+
+    def _available(self, name: str, player: Player) -> bool:
+        '''Still connected, logged in and not seated elsewhere'''
+        return (
+            PLAYER.get(name) is player and
+            player._is_logged and
+            player.state == PlayerState.ONLINE and
+            player.gamer is None
+        )
+
+    def match(self) -> list[Gamer]:
+        '''Seat every complete table in one pass. Each table gets one `matchFound` broadcast'''
+        tables = []
+        for size, queue in self.queues.items():
+            if len(queue) < size:
+                continue
+            ready = []
+            for name, player in list(queue.items()):
+                if not self._available(name, player):
+                    del queue[name]
+                    self.waiting.pop(name, None)
+                    continue
+                ready.append(player)
+                if len(ready) < size:
+                    continue
+                for p in ready:
+                    del queue[p.name]
+                    del self.waiting[p.name]
+                gamer = create_game()
+                gamer.add_players(ready)
+                OPLOG.record('matchFound', gamer.gid, seed=gamer.seed, players=[p.name for p in ready])
+                tables.append(gamer)
+                ready = []
+        if DEBUG and tables:
+            print(yellow(f"Matchmaker seats {len(tables)} tables: {[g.gid for g in tables]}"))
+        return tables
+
+    async def run(self, interval: float = 0.5) -> None:
+        '''Match periodically, forever'''
+        while 1:
+            await asyncio.sleep(interval)
+            try:
+                self.match()
+            except Exception:
+                import traceback
+                traceback.print_exc()
+
+MATCHER = Matchmaker()
+'''Global matchmaker'''
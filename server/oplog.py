@@ -0,0 +1,261 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+from collections import deque
+from itertools import islice
+
+from .static import (
+    Gamer, Player,
+    GAMER,
+    create_game, find_game, touch_game,
+    yellow, red, DEBUG
+)
+from .checkpoint import CHECKPOINT
+
+BATCH = 1024
+'''Most entries per message to the standby'''
+MAX_ENTRIES = 1 << 20
+'''Unacknowledged entries kept. Older ones are dropped and a standby that still needs them must start over'''
+
+class OpLog:
+    '''Append-only log of state-changing operations, streamed to one standby over a local socket.
+
+    An entry is `{seq, t, op, gid, ...arguments}` with the values the primary actually applied, and the seed
+    of every new game, so the standby makes the same deals. Games that already exist when the log starts,
+    e.g. restored from checkpoints, open it as `restore` entries holding their snapshot and RNG state.
+    `record` only appends; a separate task sends whatever accumulated as one batch per message and reads
+    the standby's acks'''
+    enabled: bool
+    '''Off unless the server serves an oplog port, then `record` is a no-op'''
+    seq: int
+    '''Last recorded entry'''
+    sent: int
+    '''Last entry sent to the standby'''
+    acked: int
+    '''Last entry the standby applied'''
+    entries: deque[dict]
+    '''Entries not acknowledged yet'''
+
+    def __init__(self, maxlen: int = MAX_ENTRIES) -> None:
+        self.enabled = False
+        self.seq = 0
+        self.sent = 0
+        self.acked = 0
+        self.entries = deque(maxlen=maxlen)
+        self.standby = False
+        self._wake = asyncio.Event()
+
+    def start(self) -> None:
+        '''Enable recording. Every game already in `GAMER` is logged as a snapshot first'''
+        self.enabled = True
+        for gid, entry in GAMER.items():
+            self.record('restore', gid, snapshot=entry['gamer'].snapshot(),
+                        start_time=entry['startTime'].isoformat(timespec='seconds'))
+
+    def record(self, op: str, gid: str, **args) -> None:
+        '''Append an operation. Call it right after the operation succeeded, before any await'''
+        if not self.enabled:
+            return
+        self.seq += 1
+        self.entries.append(dict(args, seq=self.seq, t=time.time(), op=op, gid=gid))
+        self._wake.set()
+
+    def stats(self) -> dict:
+        '''Replication lag: entries and seconds the standby is behind'''
+        oldest = self.entries[0]['t'] if self.entries else None
+        return {
+            'enabled': self.enabled,
+            'standby': self.standby,
+            'seq': self.seq,
+            'sent': self.sent,
+            'acked': self.acked,
+            'behind': self.seq - self.acked,
+            'lag_seconds': time.time() - oldest if oldest is not None else 0.0,
+        }
+
+    def _trim(self) -> None:
+        while self.entries and self.entries[0]['seq'] <= self.acked:
+            self.entries.popleft()
+
+    async def _read_acks(self, reader: asyncio.StreamReader) -> None:
+        try:
+            async for line in reader:
+                self.acked = max(self.acked, int(json.loads(line)['ack']))
+                self._trim()
+        finally:
+            self.standby = False
+            self._wake.set()
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''Connection handler of the oplog port: stream entries to a standby from the seq it asks for'''
+        acks = None
+        try:
+            hello = json.loads(await reader.readline())
+            start = int(hello['from'])
+            first = self.entries[0]['seq'] if self.entries else self.seq + 1
+            if self.standby or start < first or start > self.seq + 1:
+                reason = 'Another standby is attached' if self.standby else f'Log starts at {first}'
+                writer.write((json.dumps({'error': reason}) + '\n').encode())
+                await writer.drain()
+                return
+            self.standby = True
+            self.sent = self.acked = start - 1
+            self._trim()
+            if DEBUG:
+                print(yellow(f"Standby attached from entry {start}."))
+            acks = asyncio.create_task(self._read_acks(reader))
+            while self.standby:
+                self._wake.clear()
+                offset = self.sent + 1 - self.entries[0]['seq'] if self.entries else 0
+                batch = list(islice(self.entries, offset, offset + BATCH))
+                if not batch:
+                    await self._wake.wait()
+                    continue
+                writer.write((json.dumps(batch, separators=(',', ':'), ensure_ascii=False) + '\n').encode())
+                self.sent = batch[-1]['seq']
+                await writer.drain()
+        except (ConnectionError, ValueError, KeyError) as e:
+            if DEBUG:
+                print(red(f"Standby stream error: {e}."))
+        except asyncio.CancelledError:
+            # Server shutdown
+            pass
+        finally:
+            if acks:
+                acks.cancel()
+            self.standby = False
+            writer.close()
+            if DEBUG:
+                print(yellow(f"Standby detached at entry {self.acked}."))
+
+class Standby:
+    '''Follows a primary's oplog and applies it to replica games in `GAMER`.
+
+    Replica players are offline `Player` objects. When the primary's stream ends, `promote` hands
+    every replica game to the checkpointer's resume path and the server starts serving'''
+    applied: int
+    '''Last applied entry'''
+    lag: float
+    '''Seconds between the primary recording and the standby applying the last entry'''
+    players: dict[str, Player]
+    '''Replica players by name'''
+    diverged: set[str]
+    '''Games an entry failed to apply to. Their later entries are skipped and `promote` drops them'''
+
+    def __init__(self) -> None:
+        self.applied = 0
+        self.lag = 0.0
+        self.players = {}
+        self.diverged = set()
+
+    def player(self, name: str) -> Player:
+        if name not in self.players:
+            player = self.players[name] = Player(name)
+            player.offline()
+        return self.players[name]
+
+    def apply(self, entry: dict) -> None:
+        '''Apply one entry the way the primary's handler did'''
+        op, gid = entry['op'], entry['gid']
+        if op == 'restore':
+            gamer = Gamer.restore(entry['snapshot'])
+            now = time.monotonic()
+            GAMER[gid] = {
+                'gamer': gamer,
+                'startTime': datetime.fromisoformat(entry['start_time']),
+                'lastActive': now,
+                'lastChange': now,
+            }
+            for player in gamer.players:
+                player.offline()
+                self.players[player.name] = player
+        elif op == 'playerJoin':
+            gamer = create_game(gid, entry['seed']) if 'seed' in entry else find_game(gid)
+            self.player(entry['name']).set_gamer(gamer)
+        elif op == 'matchFound':
+            gamer = create_game(gid, entry['seed'])
+            gamer.add_players([self.player(name) for name in entry['players']])
+        else:
+            gamer: Gamer = find_game(gid)
+            assert gamer is not None, f'Replica game {gid} not found'
+            if op == 'terminate':
+                del GAMER[gid]
+                gamer.terminate()
+                return
+            player = self.player(entry['name'])
+            if op == 'playerLeave':
+                player.quit_game()
+                if len(gamer.players) == 0:
+                    gamer.terminate()
+                    del GAMER[gid]
+                    return
+            elif op == 'playerReady':
+                player.ready_for_game()
+            elif op == 'playerUnready':
+                player.unready_for_game()
+            elif op == 'choosePokeOrder':
+                player.choose_pokes_side(entry['reverse'])
+            elif op == 'show':
+                player.show(player.choose_pokes_index(entry['b_index'], entry['e_index']))
+            elif op == 'scout':
+                player.scout(entry['index'], entry['reverse'], entry['insert_to'])
+            elif op == 'scoutAndShow':
+                player.scout_and_show(entry['index'], entry['reverse'], entry['insert_to'])
+            elif op == 'confirmResult':
+                player.confirm_result()
+            elif op == 'setHost':
+                gamer.set_host(entry['target_name'])
+            elif op == 'lockRoom':
+                gamer.lock_room(player)
+            elif op == 'unlockRoom':
+                gamer.unlock_room(player)
+            else:
+                raise AssertionError(f'Unknown operation {op}')
+        touch_game(gid, True)
+
+    async def follow(self, port: int, host: str = 'localhost') -> None:
+        '''Apply the primary's log until its stream ends'''
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write((json.dumps({'from': self.applied + 1}) + '\n').encode())
+        if DEBUG:
+            print(yellow(f"Following primary oplog at {host}:{port}."))
+        try:
+            async for line in reader:
+                batch = json.loads(line)
+                if isinstance(batch, dict):
+                    print(red(f"Primary refused: {batch['error']}"))
+                    break
+                for entry in batch:
+                    if entry['gid'] not in self.diverged:
+                        try:
+                            self.apply(entry)
+                        except Exception as e:
+                            self.diverged.add(entry['gid'])
+                            print(red(f"Replica game {entry['gid']} diverged at entry {entry['seq']}: {e!r}."))
+                    self.applied = entry['seq']
+                    self.lag = time.time() - entry['t']
+                writer.write((json.dumps({'ack': self.applied}) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+        if DEBUG:
+            print(yellow(f"Primary stream ended at entry {self.applied}."))
+
+    def promote(self) -> None:
+        '''Take over: every replica game waits for its players to log in again. Diverged games are dropped'''
+        for gid in self.diverged:
+            entry = GAMER.pop(gid, None)
+            if entry is not None:
+                entry['gamer'].terminate()
+        for entry in GAMER.values():
+            CHECKPOINT.adopt(entry['gamer'])
+        CHECKPOINT.claim()
+        self.players = {}
+
+OPLOG = OpLog()
+'''Global operation log of the primary'''
+STANDBY = Standby()
+'''Global replica state of a standby'''
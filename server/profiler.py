@@ -0,0 +1,245 @@
+import asyncio
+import cProfile
+import gc
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from .core import Gamer, Player, Poke, GameOperation
+
+ADMIN_KEY = os.environ.get('SCOUT_ADMIN_KEY', '')
+'''Login `key` that grants admin commands. Empty disables them'''
+ADMINS = set()
+'''Names of players logged in with the admin key'''
+
+MODES = ('cprofile', 'sample')
+SAMPLE_INTERVAL = 0.001
+'''Seconds between stack samples'''
+CENSUS = {'Gamer': Gamer, 'Player': Player, 'Poke': Poke, 'GameOperation': GameOperation}
+'''Classes counted by the memory census'''
+SOURCES = {'gamer.py': 'Gamer', 'player.py': 'Player', 'poke.py': 'Poke'}
+'''Engine files whose allocations are attributed to a class'''
+
+def _where(filename: str, lineno: int|None, name: str) -> str:
+    if lineno is None:
+        return f"{os.path.basename(filename)}({name})"
+    return f"{os.path.basename(filename)}:{lineno}({name})"
+
+class _Steps:
+    '''Awaitable that drives a coroutine with `profile` enabled only while the coroutine itself runs,
+    not while the loop runs other tasks between its awaits'''
+
+    def __init__(self, coro, profile: cProfile.Profile) -> None:
+        self.coro = coro
+        self.profile = profile
+
+    def __await__(self):
+        coro, profile = self.coro, self.profile
+        value, error = None, None
+        while 1:
+            profile.enable()
+            try:
+                signal = coro.send(value) if error is None else coro.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                profile.disable()
+            try:
+                value, error = (yield signal), None
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+class Profiler:
+    '''Runtime profiling of the requests of one `func` or one `gid`.
+
+    Scope follows the task of each request in scope, so other requests that run while it awaits are
+    left out. `cprofile` traces every call of those requests, enabled only while their task runs.
+    `sample` only marks their tasks, and a background thread samples the event loop's stack while one
+    of them is the running task, which costs the loop almost nothing'''
+    mode: str|None
+    '''`cprofile`, `sample` or None when off'''
+    scope: tuple[str, str]
+    '''(`func` or `gid`, value) of the profiled requests'''
+    requests: int
+    '''Profiled requests since start'''
+
+    def __init__(self) -> None:
+        self.mode = None
+        self.scope = ('', '')
+        self.requests = 0
+        self.tasks = set()
+        '''Tasks running a profiled request, they interleave at awaits'''
+        self.profile = None
+        self.samples = Counter()
+        '''$stack: samples, innermost frame last'''
+        self.sampler = None
+        self.loop = None
+        self.loop_thread = threading.get_ident()
+        self.started = 0.0
+        self.snapshot = None
+        '''Last tracemalloc snapshot, for differences'''
+
+    def start(self, mode: str, key: str, value: str, interval: float = SAMPLE_INTERVAL) -> None:
+        assert mode in MODES, f'Invalid mode. Choose from {", ".join(MODES)}'
+        assert key in ('func', 'gid') and value, 'Profile either one `func` or one `gid`'
+        self.stop()
+        self.mode = mode
+        self.scope = (key, value)
+        self.requests = 0
+        self.samples = Counter()
+        self.started = time.monotonic()
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        if mode == 'cprofile':
+            self.profile = cProfile.Profile()
+        else:
+            self.profile = None
+            self.sampler = threading.Thread(target=self._sample, args=(interval,), name='Profiler', daemon=True)
+            self.sampler.start()
+
+    def stop(self) -> None:
+        self.mode = None
+        if self.sampler is not None:
+            self.sampler.join()
+            self.sampler = None
+
+    def request(self, event: dict, coro):
+        '''Awaitable that runs `coro`, the handler of one dispatched request, profiled if it is in scope'''
+        if self.mode is None:
+            return coro
+        key, value = self.scope
+        if str(event.get(key, '')) != value:
+            return coro
+        return self._profiled(coro)
+
+    async def _profiled(self, coro):
+        self.requests += 1
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            if self.profile is None:
+                return await coro
+            return await _Steps(coro, self.profile)
+        finally:
+            self.tasks.discard(task)
+
+    def _sample(self, interval: float) -> None:
+        while self.mode == 'sample':
+            time.sleep(interval)
+            if not self.tasks:
+                continue
+            task = asyncio.current_task(self.loop)
+            if task not in self.tasks:
+                continue
+            frame = sys._current_frames().get(self.loop_thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, frame.f_lineno, code.co_name))
+                frame = frame.f_back
+            if asyncio.current_task(self.loop) is not task:
+                # The loop switched tasks while the stack was read
+                continue
+            self.samples[tuple(reversed(stack))] += 1
+
+    def report(self, top: int = 20, sort: str = 'cumulative') -> dict:
+        '''Hot spots so far: the `top` functions by cumulative and by own time (or samples)'''
+        result = {
+            'mode': 'cprofile' if self.profile is not None else 'sample',
+            'running': self.mode is not None,
+            'scope': dict([self.scope]) if self.scope[0] else {},
+            'requests': self.requests,
+            'seconds': time.monotonic() - self.started if self.started else 0.0,
+        }
+        if self.profile is not None:
+            assert sort in ('cumulative', 'tottime', 'calls'), 'Invalid sort. Choose from cumulative, tottime, calls'
+            column = {'calls': 1, 'tottime': 2, 'cumulative': 3}[sort]
+            rows = pstats.Stats(self.profile).stats.items() if self.requests else []
+            rows = sorted(rows, key=lambda row: row[1][column], reverse=True)[:top]
+            result['functions'] = [
+                {'function': _where(*where), 'calls': nc, 'tottime': tt, 'cumtime': ct}
+                for where, (cc, nc, tt, ct, callers) in rows
+            ]
+        else:
+            total = sum(self.samples.values())
+            own, inclusive = Counter(), Counter()
+            for stack, count in self.samples.items():
+                own[_where(*stack[-1])] += count
+                for function in {_where(filename, None, name) for filename, _, name in stack}:
+                    inclusive[function] += count
+            result['samples'] = total
+            result['own'] = [{'function': f, 'samples': n, 'share': n / total} for f, n in own.most_common(top)]
+            result['inclusive'] = [{'function': f, 'samples': n, 'share': n / total} for f, n in inclusive.most_common(top)]
+        return result
+
+    async def memory(self, top: int = 10, frames: int = 1) -> dict:
+        '''Memory by engine class. The first call starts tracemalloc; later calls also report the
+        allocation sites that grew most since the previous call.
+
+        The census (a full `gc.collect` and a walk of every tracked object) and the tracemalloc snapshot
+        block the event loop, about 0.1 s per 100,000 live objects. Grouping the snapshot by site is
+        the larger part and runs in a thread'''
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self.snapshot = None
+        gc.collect()
+        census = {name: {'count': 0, 'bytes': 0} for name in CENSUS}
+        history = {'lists': 0, 'operations': 0, 'bytes': 0}
+        names = {cls: name for name, cls in CENSUS.items()}
+        for obj in gc.get_objects():
+            name = names.get(type(obj))
+            if name is None:
+                continue
+            census[name]['count'] += 1
+            census[name]['bytes'] += sys.getsizeof(obj) + sys.getsizeof(obj.__dict__)
+            if name == 'Gamer':
+                history['lists'] += 1
+                history['operations'] += len(obj.game_history)
+                history['bytes'] += sys.getsizeof(obj.game_history)
+        history['bytes'] += census['GameOperation']['bytes']
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot, traced, sites = await asyncio.to_thread(self._sites, snapshot, self.snapshot, top)
+        self.snapshot = snapshot
+        return {
+            'traced': current,
+            'peak': peak,
+            'census': census,
+            'history': history,
+            'allocated_in': traced,
+            'sites': sites,
+        }
+
+    @staticmethod
+    def _sites(snapshot: tracemalloc.Snapshot, previous: tracemalloc.Snapshot|None, top: int) -> tuple:
+        '''Filtered snapshot, bytes allocated per engine class, and the top sites (or growth since `previous`)'''
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        traced = Counter()
+        for stat in snapshot.statistics('filename'):
+            source = SOURCES.get(os.path.basename(stat.traceback[0].filename))
+            if source:
+                traced[source] += stat.size
+        if previous is None:
+            stats = snapshot.statistics('lineno')[:top]
+            sites = [{'site': f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}", 'bytes': s.size, 'count': s.count} for s in stats]
+        else:
+            stats = snapshot.compare_to(previous, 'lineno')[:top]
+            sites = [{'site': f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}", 'bytes': s.size, 'growth': s.size_diff, 'count': s.count} for s in stats]
+        return snapshot, dict(traced), sites
+
+    def memory_stop(self) -> None:
+        tracemalloc.stop()
+        self.snapshot = None
+
+PROFILER = Profiler()
+'''Global profiler'''
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from .static import (
+    Gamer,
+    GAMER,
+    yellow, DEBUG
+)
+from .core import GameState
+from .oplog import OPLOG
+
+IDLE_TTL = 30 * 60
+'''Seconds without any request before a game is evicted'''
+STUCK_TTL = 10 * 60
+'''Seconds without a state-changing request before a started game is evicted'''
+
+class Reaper:
+    '''Evicts idle or stuck games from `GAMER`'''
+    idle_ttl: float
+    '''Seconds since the last request of any kind'''
+    stuck_ttl: float
+    '''Seconds since the last state-changing request, for started games only'''
+
+    def __init__(self, idle_ttl: float = IDLE_TTL, stuck_ttl: float = STUCK_TTL) -> None:
+        self.idle_ttl = idle_ttl
+        self.stuck_ttl = stuck_ttl
+
+    def expired(self, entry: dict, now: float) -> bool:
+        gamer: Gamer = entry['gamer']
+        if now - entry['lastActive'] > self.idle_ttl:
+            return True
+        started = gamer.state.value >= GameState.INIT.value
+        return started and now - entry['lastChange'] > self.stuck_ttl
+
+    def sweep(self, now: float|None = None) -> list[str]:
+        '''Evict every expired game, notify its players and return the evicted gids'''
+        now = time.monotonic() if now is None else now
+        evicted = [gid for gid, entry in GAMER.items() if self.expired(entry, now)]
+        for gid in evicted:
+            entry = GAMER.pop(gid)
+            entry['gamer'].terminate()
+            OPLOG.record('terminate', gid)
+        if DEBUG and evicted:
+            print(yellow(f"Reaper evicts {len(evicted)} games: {evicted}"))
+        return evicted
+
+    async def run(self, interval: float = 60) -> None:
+        '''Sweep periodically, forever'''
+        while 1:
+            await asyncio.sleep(interval)
+            try:
+                self.sweep()
+            except Exception:
+                import traceback
+                traceback.print_exc()
+
+REAPER = Reaper()
+'''Global reaper'''
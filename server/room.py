@@ -1,4 +1,5 @@
 from .static import *
+from .oplog import OPLOG
 
 async def getGamePlayers(query: Query):
     '''Get all players in the game'''
@@ -15,6 +16,7 @@ async def getHost(query: Query):
 async def setHost(query: Query):
     '''Set host of the game. Require host permission'''
     query.gamer.set_host(query.get('target_name'))
+    OPLOG.record('setHost', query.gid, name=query.name, target_name=query.get('target_name'))
     await query.ok()
     if DEBUG:
         print(green(f"Player {query.name} set host in game {query.gid}."), f" Websocket: {id(query.ws)}")
@@ -22,6 +24,7 @@ async def setHost(query: Query):
 async def lockRoom(query: Query):
     '''Lock the room. Require host permission'''
     query.gamer.lock_room(query.player)
+    OPLOG.record('lockRoom', query.gid, name=query.name)
     await query.ok()
     if DEBUG:
         print(green(f"Player {query.name} set game {query.gid} private."), f" Websocket: {id(query.ws)}")
@@ -29,6 +32,22 @@ async def lockRoom(query: Query):
 async def unlockRoom(query: Query):
     '''Unlock the room. Require host permission'''
     query.gamer.unlock_room(query.player)
+    OPLOG.record('unlockRoom', query.gid, name=query.name)
     await query.ok()
     if DEBUG:
-        print(green(f"Player {query.name} set game {query.gid} public."), f" Websocket: {id(query.ws)}")
\ No newline at end of file
+        print(green(f"Player {query.name} set game {query.gid} public."), f" Websocket: {id(query.ws)}")
+
+async def spectate(query: Query):
+    '''Watch the game without taking a seat. Return its public state, then push its broadcasts'''
+    gamer = query.gamer
+    query.player.spectate(gamer)
+    await query.ok(gamer.public_json())
+    if DEBUG:
+        print(green(f"Player {query.name} spectates game {query.gid}."), f" Websocket: {id(query.ws)}")
+
+async def unspectate(query: Query):
+    '''Stop watching the game'''
+    query.player.unspectate()
+    await query.ok()
+    if DEBUG:
+        print(green(f"Player {query.name} stops spectating."), f" Websocket: {id(query.ws)}")
@@ -1,9 +1,14 @@
 
 import json
 import os
+import secrets
+import time
+from datetime import datetime
+from functools import cached_property
 
 from .core import (
     Player, Gamer,
+    GameState, LOBBY, LEADERBOARD,
     Websocket,
     send, recv,
     green, yellow, red, 
@@ -12,51 +17,69 @@ from .core import (
 )
 
 GAMER = {}
-'''$gid: {gamer: Gamer, startTime: datetime}'''
+'''$gid: {gamer: Gamer, startTime: datetime, lastActive: float, lastChange: float}
+
+lastActive/lastChange are `time.monotonic()` of the last request and the last state-changing request'''
 PLAYER = {}
 '''$name: Player'''
 
 class Query:
-    '''Websocket query'''
+    '''Websocket query, read-only. Fields are checked once on first access and then cached'''
     event: dict
     '''Event data'''
     ws: Websocket
     '''Websocket'''
+    owner: 'Player|None'
+    '''Player logged in on the connection, bound at login. None for the login request itself'''
 
-    def __init__(self, event, ws) -> None:
-        self.event = event
-        self.ws = ws
-    @property
+    def __init__(self, event, ws, owner: 'Player|None' = None) -> None:
+        object.__setattr__(self, 'event', event)
+        object.__setattr__(self, 'ws', ws)
+        object.__setattr__(self, 'owner', owner)
+    def __setattr__(self, key, value) -> None:
+        raise AttributeError('Query is read-only')
+    @cached_property
     def seq(self) -> int:
         '''Sequence number'''
         assert 'seq' in self.event.keys(), 'Request error: `seq` required'
         return int(self.event['seq'])
-    @property
+    @cached_property
     def func(self) -> str:
         '''Function name'''
         assert 'func' in self.event.keys(), 'Request error: `func` required'
         return str(self.event['func'])
-    @property
+    @cached_property
     def name(self) -> str:
-        '''Player name'''
+        '''Player name. On a bound connection `name` may be omitted, but must not name another player'''
+        if self.owner is not None:
+            assert str(self.event.get('name', self.owner.name)) == self.owner.name, \
+                'Request error: `name` is not the player logged in on this connection'
+            return self.owner.name
         assert 'name' in self.event.keys(), 'Request error: `name` required'
         return str(self.event['name'])
-    @property
+    @cached_property
     def gid(self) -> str:
         '''Game id'''
         assert 'gid' in self.event.keys(), 'Request error: `gid` required'
         return str(self.event['gid'])
-    @property
+    @cached_property
     def player(self) -> 'Player':
         '''Player object. Raise error if not found'''
+        if self.owner is not None:
+            self.name  # Ownership check
+            return self.owner
         plyr = find_player(self.name)
         if plyr is None:
             raise AssertionError('Player not found')
         return plyr
-    @property
+    @cached_property
     def gamer(self) -> 'Gamer':
-        '''Game object. Raise error if not found'''
-        game = find_game(self.gid)
+        '''Game object, the player's current game without a lookup. Raise error if not found'''
+        gid = self.gid
+        current = self.owner.gamer if self.owner is not None else None
+        if current is not None and str(current.gid) == gid:
+            return current
+        game = find_game(gid)
         if game is None:
             raise AssertionError('Game not found')
         return game
@@ -77,6 +100,16 @@ class Query:
             'message': message
         })
     
+    async def ok_versioned(self, gamer: 'Gamer', key: tuple, build) -> None:
+        '''Respond with `build()`, encoded once per state version of `gamer` and shared by all
+        requests for `key`. If the request's `if_version` is the current version, respond 304 instead'''
+        version = gamer.version
+        if str(self.event.get('if_version', '')) == str(version):
+            await self.ws.send('{"code": 304, "seq": %d, "version": %d, "message": "Not modified"}' % (self.seq, version))
+            return
+        message = gamer.encoded(key, build)
+        await self.ws.send('{"code": 0, "seq": %d, "version": %d, "message": %s}' % (self.seq, version, message))
+
     async def error(self, message: str, code: int = -1) -> None:
         '''Send error message to client'''
         await send(self.ws, {
@@ -85,6 +118,27 @@ class Query:
             'message': message
         })
 
+def create_game(gid: str|None = None, seed: int|None = None) -> 'Gamer':
+    '''Create an online game with a fresh gid. A standby replica passes the primary's gid and seed'''
+    global GAMER
+    if gid is None:
+        gid = secrets.token_hex(6)
+        while gid in GAMER:
+            gid = secrets.token_hex(6)
+    gamer = Gamer(gid, seed=seed)
+    now = time.monotonic()
+    GAMER[gid] = {'gamer': gamer, 'startTime': datetime.now(), 'lastActive': now, 'lastChange': now}
+    return gamer
+
+def touch_game(gid: str, change: bool = False) -> None:
+    '''Record activity on a game. `change` for requests that modify its state'''
+    global GAMER
+    if gid in GAMER:
+        now = time.monotonic()
+        GAMER[gid]['lastActive'] = now
+        if change:
+            GAMER[gid]['lastChange'] = now
+
 def find_player(name:str) -> 'Player|None':
     '''Find player by name'''
     global PLAYER
@@ -0,0 +1,328 @@
+'''Bot strategies with time-bounded decisions
+
+A strategy sees a read-only `View` of the player in turn and returns a move:
+
+    ('show', b_index, e_index)
+    ('scout', head, reverse, insert_to)
+    ('scout_and_show', head, reverse, insert_to)
+
+After `scout_and_show` the same player is asked again and has to show.
+
+`decide` enforces the contract: the strategy gets `budget` seconds, and a
+move that is late, illegal or raises is replaced by `fallback`, which is
+always legal when any legal move exists. Views are built from an offline
+`Player` (`View.of_player`) or from a websocket `client.GameMirror`
+(`View.of_mirror`), so the same strategy plays in-process and online.
+'''
+import asyncio
+import functools
+import random
+import time
+from concurrent.futures import Executor
+
+from evalcache import EvalCache
+from server import Player, rules, scout_advice, segments
+
+Move = tuple
+'''('show', b, e) | ('scout', head, reverse, insert_to) | ('scout_and_show', head, reverse, insert_to)'''
+
+class View:
+    '''Read-only snapshot of one player's turn. Pokes are (value, disabled value) tuples'''
+    __slots__ = ('name', 'players', 'hand', 'table', 'table_owner', 'scores', 'hand_sizes',
+                 'history', 'must_show', 'scout_and_show_used')
+    name: str
+    '''Player in turn'''
+    players: tuple[str, ...]
+    '''Seated players in order'''
+    hand: tuple[tuple[int, int], ...]
+    '''Own pokes'''
+    table: tuple[tuple[int, int], ...]
+    '''Displayed pokes'''
+    table_owner: str
+    '''Player who displayed them, empty if the table is empty'''
+    scores: tuple[int, ...]
+    '''Current round scores by seat'''
+    hand_sizes: tuple[int, ...]
+    '''Pokes in hand by seat'''
+    history: tuple[str, ...]
+    '''Operations so far'''
+    must_show: bool
+    '''Scouted with `scout_and_show` this turn and has to show now'''
+    scout_and_show_used: bool
+    '''`scout_and_show` already used this game'''
+
+    def __init__(self, **kwargs) -> None:
+        for key in self.__slots__:
+            object.__setattr__(self, key, kwargs[key])
+
+    def __setattr__(self, key, value) -> None:
+        raise AttributeError('View is read-only')
+
+    def __getstate__(self) -> dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __setstate__(self, state: dict) -> None:
+        for key, value in state.items():
+            object.__setattr__(self, key, value)
+
+    @classmethod
+    def of_player(cls, player: Player) -> 'View':
+        '''View of an offline (or server-side) player in turn'''
+        gamer = player.gamer
+        table = gamer.displayed_pokes.pokes
+        last = gamer.game_history[-1]
+        return cls(
+            name=player.name,
+            players=tuple(p.name for p in gamer.players),
+            hand=tuple((poke.value, poke.value_disable) for poke in player.pokes),
+            table=tuple((poke.value, poke.value_disable) for poke in table),
+            table_owner=table[0].owner.name if table else '',
+            scores=tuple(gamer.get_player_score(p) for p in gamer.players),
+            hand_sizes=tuple(len(p.pokes) for p in gamer.players),
+            history=tuple(str(op) for op in gamer.game_history),
+            must_show=last.type_ == 2 and last.player == player,
+            scout_and_show_used=player in gamer.scout_and_show,
+        )
+
+    @classmethod
+    def of_mirror(cls, mirror) -> 'View':
+        '''View of a websocket player from its `client.GameMirror`'''
+        last = mirror.last_op or {}
+        return cls(
+            name=mirror.name,
+            players=tuple(mirror.players),
+            hand=tuple(mirror.hand),
+            table=tuple(mirror.table),
+            table_owner=mirror.table_owner if mirror.table else '',
+            scores=tuple(mirror.score(p) for p in mirror.players),
+            hand_sizes=tuple(mirror.hand_sizes.get(p, 0) for p in mirror.players),
+            history=tuple(mirror.history),
+            must_show=last.get('type_') == 2 and last.get('target_name') == mirror.name,
+            scout_and_show_used=mirror.name in mirror.scout_and_show,
+        )
+
+    @property
+    def can_scout(self) -> bool:
+        '''Whether the table has pokes of another player to scout'''
+        return bool(self.table) and self.table_owner != self.name and not self.must_show
+
+##############
+#    Rules   #
+##############
+
+def evaluate_shows(hand, table) -> tuple[tuple[int, int], ...]:
+    '''Every (b_index, e_index) of `hand` whose combine beats `table`, uncached'''
+    return tuple(rules.shows(hand, table))
+
+SHOWS = EvalCache(evaluate_shows, enabled=False)
+'''Cache of `evaluate_shows` shared by all strategies of the process. Off unless enabled: positions rarely
+repeat between games, and the lookups cost more than the hits save'''
+
+def shows(hand, table) -> tuple[tuple[int, int], ...]:
+    '''Every (b_index, e_index) of `hand` whose combine beats `table`'''
+    return SHOWS(hand, table)
+
+def scouted(hand, table, head: bool, reverse: bool, insert_to: int) -> list[tuple[int, int]]:
+    '''Hand after scouting'''
+    value, disable = table[0 if head else -1]
+    poke = (disable, value) if reverse else (value, disable)
+    hand = list(hand)
+    hand.insert(insert_to, poke)
+    return hand
+
+def advised(view: View, kind: str = 'scout', top: int|None = None) -> list[Move]:
+    '''Scout moves ranked by the combine the scouted poke joins, see `server.core.advice`'''
+    ends = [(-1, view.table[0])]
+    if len(view.table) > 1:
+        ends.append((0, view.table[-1]))
+    ranked = scout_advice([poke[0] for poke in view.hand], [(index, *poke) for index, poke in ends])
+    return [(kind, a['index'] == -1, bool(a['reverse']), a['insert_to']) for a in ranked[:top]]
+
+def longest(hand) -> int:
+    '''Length of the longest combine in `hand`, linear time'''
+    if not hand:
+        return 0
+    set_l, _, asc_l, _, desc_l, _ = segments([poke[0] for poke in hand])
+    return max(max(set_l), max(asc_l), max(desc_l))
+
+def legal(view: View, move: Move) -> bool:
+    '''Whether `move` is legal in `view`'''
+    if not isinstance(move, tuple) or not move:
+        return False
+    if move[0] == 'show':
+        if len(move) != 3 or not 0 <= move[1] < move[2] <= len(view.hand):
+            return False
+        key = rules.combine_key(view.hand[move[1]:move[2]])
+        return key[1] != 0 and key > rules.combine_key(view.table)
+    if move[0] in ('scout', 'scout_and_show'):
+        if len(move) != 4 or not view.can_scout or not 0 <= move[3] <= len(view.hand):
+            return False
+        return move[0] == 'scout' or not view.scout_and_show_used
+    return False
+
+def fallback(view: View, rng: random.Random|None = None) -> Move|None:
+    '''Cheap legal move: the longest beating combine, otherwise a scout. None if no move is legal'''
+    best = max(shows(view.hand, view.table), key=lambda move: (move[1] - move[0], -move[0]), default=None)
+    if best is not None:
+        return ('show', *best)
+    if not view.can_scout:
+        return None
+    if rng is None:
+        return ('scout', True, False, 0)
+    return ('scout', rng.random() < 0.5, rng.random() < 0.5, rng.randint(0, len(view.hand)))
+
+##############
+# Strategies #
+##############
+
+class Strategy:
+    '''Base strategy. `choose` should return before `deadline` (`time.perf_counter()`)'''
+    name = ''
+
+    def choose(self, view: View, rng: random.Random, deadline: float) -> Move|None:
+        raise NotImplementedError
+
+class RandomStrategy(Strategy):
+    '''Uniform over legal shows and scouts'''
+    name = 'random'
+
+    def choose(self, view: View, rng: random.Random, deadline: float) -> Move|None:
+        options = [('show', b, e) for b, e in shows(view.hand, view.table)]
+        if view.can_scout:
+            options.append(('scout', rng.random() < 0.5, rng.random() < 0.5, rng.randint(0, len(view.hand))))
+        return rng.choice(options) if options else None
+
+class GreedyStrategy(Strategy):
+    '''Longest beating combine, otherwise the best advised scout'''
+    name = 'greedy'
+
+    def choose(self, view: View, rng: random.Random, deadline: float) -> Move|None:
+        move = fallback(view, rng)
+        if move is not None and move[0] == 'scout':
+            return advised(view, top=1)[0]
+        return move
+
+class LookaheadStrategy(Strategy):
+    '''One-ply search over every show and the best advised scouts, two plies for `scout_and_show`.
+
+    Moves are rated by the immediate score change plus the best combine left in hand. Candidates
+    are tried best-first and the search stops at the deadline with the best move so far.'''
+    name = 'lookahead'
+    weight = 0.5
+    '''Worth of one poke of the best combine left in hand'''
+    breadth = 8
+    '''Advised scouts tried per kind'''
+
+    def potential(self, hand) -> float:
+        return self.weight * longest(hand)
+
+    def rate(self, view: View, move: Move) -> float:
+        if move[0] == 'show':
+            b, e = move[1], move[2]
+            return len(view.table) + (e - b) + self.potential(view.hand[:b] + view.hand[e:])
+        hand = scouted(view.hand, view.table, *move[1:])
+        if move[0] == 'scout':
+            # One more poke in hand, one point for the table owner
+            return -1.5 + self.potential(hand)
+        table = list(view.table)
+        table.pop(0 if move[1] else -1)
+        follow = shows(hand, table)
+        if not follow:
+            return float('-inf')
+        # The extra -1 is the price of spending the once-per-game scout and show
+        return max(
+            len(table) - 1.5 + (e - b) + self.potential(hand[:b] + hand[e:]) - 1
+            for b, e in follow
+        )
+
+    def choose(self, view: View, rng: random.Random, deadline: float) -> Move|None:
+        candidates = [('show', b, e) for b, e in shows(view.hand, view.table)]
+        candidates.sort(key=lambda move: move[1] - move[2])
+        if view.can_scout:
+            candidates += advised(view, top=self.breadth)
+            if not view.scout_and_show_used:
+                candidates += advised(view, 'scout_and_show', self.breadth)
+        best, best_rating = None, float('-inf')
+        slowest = 0.0
+        for move in candidates:
+            now = time.perf_counter()
+            if now + slowest >= deadline:
+                # The next rating might not finish in time
+                break
+            rating = self.rate(view, move)
+            slowest = max(slowest, time.perf_counter() - now)
+            if rating > best_rating:
+                best, best_rating = move, rating
+        return best
+
+STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (RandomStrategy(), GreedyStrategy(), LookaheadStrategy())
+}
+'''$name: strategy'''
+
+BUDGET = 0.05
+'''Default seconds per decision'''
+
+def decide(strategy: Strategy, view: View, rng: random.Random, budget: float = BUDGET,
+           executor: Executor|None = None) -> tuple[Move|None, bool]:
+    '''Ask `strategy` for a move within `budget` seconds, return (move, whether it fell back).
+
+    With an `executor` the deadline is hard: the caller stops waiting when it passes. Without one
+    the strategy runs inline and a late answer is discarded.'''
+    start = time.perf_counter()
+    deadline = start + budget
+    try:
+        if executor is None:
+            move = strategy.choose(view, rng, deadline)
+            if time.perf_counter() > deadline:
+                move = None
+        else:
+            move = executor.submit(strategy.choose, view, random.Random(rng.random()), deadline).result(budget)
+    except Exception:
+        # Late (TimeoutError) or broken strategy
+        move = None
+    if move is not None and legal(view, move):
+        return move, False
+    move = fallback(view, rng)
+    return move, move is not None
+
+async def adecide(strategy: Strategy, view: View, rng: random.Random, budget: float = BUDGET,
+                  executor: Executor|None = None, done=None) -> tuple[Move|None, bool]:
+    '''`decide` for event loops: the strategy runs on `executor` (the loop's default if None), and the
+    loop stops waiting at the deadline. `done()` is called on the loop once the worker has finished,
+    which may be after the deadline since a running call cannot be interrupted, or at once if the job
+    could not be submitted'''
+    deadline = time.perf_counter() + budget
+    loop = asyncio.get_running_loop()
+    job = functools.partial(strategy.choose, view, random.Random(rng.random()), deadline)
+    if executor is not None and done is not None:
+        try:
+            work = executor.submit(job)
+        except BaseException:
+            done()
+            raise
+        work.add_done_callback(lambda _: loop.call_soon_threadsafe(done))
+        future = asyncio.wrap_future(work)
+    else:
+        future = loop.run_in_executor(executor, job)
+    try:
+        move = await asyncio.wait_for(future, budget)
+    except Exception:
+        # Late (TimeoutError) or broken strategy
+        move = None
+    if move is not None and legal(view, move):
+        return move, False
+    move = fallback(view, rng)
+    return move, move is not None
+
+def play(player: Player, move: Move) -> Player|None:
+    '''Apply `move` offline, return the next player in turn, None if the game ended'''
+    kind = move[0]
+    if kind == 'show':
+        return player.show(player.choose_pokes_index(move[1], move[2]))
+    if kind == 'scout':
+        return player.scout(*move[1:])
+    if kind == 'scout_and_show':
+        return player.scout_and_show(*move[1:])
+    raise ValueError(f'Unknown move {move!r}')
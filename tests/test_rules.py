@@ -0,0 +1,181 @@
+'''The rules core against the `Gamer` engine: whole games played move by move on both must agree
+
+`golden_games.json` pins the engine from before `Gamer` played through `rules.apply` (a9b5040). For each
+dealt seed it holds every move of a random game with what that engine accepted before it: the shows as
+`begin:end`, the scouts as a bit mask over `SCOUTS` (checked with `insert_to=0`), then the table and hand
+sizes after the move, and how the game ended with its scores'''
+import json
+import pathlib
+import random
+
+import pytest
+
+import server.core.gamer
+from server import Gamer, Player, PokeCombine, GameState, PlayerState, rules
+
+server.core.gamer.DEBUG = False
+
+def new_game(num: int, seed: int) -> Gamer:
+    '''Offline game with `num` players, dealt and waiting for the first move'''
+    gamer = Gamer(seed, False, seed=seed)
+    for i in range(num):
+        player = Player(f'p{i}')
+        player.offline()
+        player.set_gamer(gamer, broadcast=False)
+    for player in gamer.players:
+        player.ready_for_game()
+    for player in gamer.players:
+        player.choose_pokes_side(False)
+    return gamer
+
+def turn_player(gamer: Gamer) -> Player:
+    return next(player for player in gamer.players if player.state == PlayerState.TURN)
+
+def play_move(player: Player, move: tuple) -> None:
+    if move[0] == 'show':
+        player.show(player.choose_pokes_index(move[1], move[2]))
+    elif move[0] == 'scout':
+        player.scout(*move[1:])
+    else:
+        player.scout_and_show(*move[1:])
+
+def object_shows(player: Player) -> list[tuple[int, int]]:
+    '''Beating combines found with `PokeCombine`'''
+    hand, table = player.pokes, player.gamer.displayed_pokes
+    return [
+        (begin, end)
+        for begin in range(len(hand)) for end in range(begin + 1, len(hand) + 1)
+        if PokeCombine(hand[begin:end]).type_ != 0 and PokeCombine(hand[begin:end]) > table
+    ]
+
+def pick(moves: list[tuple], rng: random.Random) -> tuple:
+    '''Random legal move, a show half of the time when there is one, so rounds end'''
+    shows = [move for move in moves if move[0] == 'show']
+    if shows and rng.random() < 0.5:
+        return rng.choice(shows)
+    return rng.choice(moves)
+
+GOLDEN = json.loads((pathlib.Path(__file__).parent / 'golden_games.json').read_text())
+SCOUTS = [(kind, head, reverse) for kind in ('scout', 'scout_and_show') for head in (True, False) for reverse in (False, True)]
+
+@pytest.mark.parametrize('game', GOLDEN, ids=lambda game: f"{game['num']}p-{game['seed']}")
+def test_golden(game: dict) -> None:
+    '''Recorded games replay with the same deal, legal moves, tables, hands, ending and scores'''
+    gamer = new_game(game['num'], game['seed'])
+    assert [[[poke.value, poke.value_disable] for poke in player.pokes] for player in gamer.players] == game['hands']
+    state = gamer.round_state()
+    for seat, shows, scouts, move, table, hands in game['steps']:
+        player = turn_player(gamer)
+        assert gamer.players.index(player) == state.turn == seat
+        moves = rules.legal_moves(state)
+        assert ' '.join(f'{move[1]}:{move[2]}' for move in moves if move[0] == 'show') == shows
+        expected = {scout for i, scout in enumerate(SCOUTS) if scouts >> i & 1}
+        if len(state.table) == 1:
+            # Both ends are the same poke; the rules core lists the head only
+            expected = {scout for scout in expected if scout[1]}
+        assert {move[:3] for move in moves if move[0] != 'show'} == expected
+        move = tuple(move)
+        play_move(player, move)
+        state = rules.apply(state, move)
+        assert gamer.round_state() == state
+        assert gamer.displayed_pokes.json() == table
+        assert [len(player.pokes) for player in gamer.players] == hands
+    if game['end'] == 'stalled':
+        assert gamer.state != GameState.END and rules.legal_moves(state) == []
+        return
+    assert gamer.state == GameState.END and state.winner == game['winner']
+    assert (len(gamer.players[state.winner].pokes) == 0) == (game['end'] == 'show_all')
+    assert rules.scores(state) == tuple(game['scores'])
+    assert [gamer.get_player_score(player) for player in gamer.players] == game['scores']
+
+def test_golden_coverage() -> None:
+    assert {game['end'] for game in GOLDEN} == {'show_all', 'beat_all', 'stalled'}
+    assert {step[2] for game in GOLDEN for step in game['steps']} >= {0, 0b1111, 0b11111111}
+
+@pytest.mark.parametrize('num', [2, 3, 4, 5])
+def test_lockstep(num: int) -> None:
+    '''Random legal games: `PokeCombine` finds the same shows, and the objects rebuild the rules state'''
+    ended = 0
+    for seed in range(150):
+        gamer = new_game(num, seed)
+        rng = random.Random(seed)
+        state = gamer.round_state()
+        hands = [[(poke.value, poke.value_disable) for poke in player.pokes] for player in gamer.players]
+        assert state == rules.initial(hands, gamer.players.index(turn_player(gamer)))
+        assert gamer.round == state
+        for _ in range(1000):
+            if gamer.state == GameState.END:
+                break
+            assert state.winner < 0
+            moves = rules.legal_moves(state)
+            player = turn_player(gamer)
+            assert [move[1:] for move in moves if move[0] == 'show'] == object_shows(player)
+            if not moves:
+                # Stalled: nothing beats the table and scouting is not allowed
+                break
+            move = pick(moves, rng)
+            play_move(player, move)
+            state = rules.apply(state, move)
+            assert gamer.round_state() == state, f'Game {seed}: {move}'
+            assert gamer.round == state
+        if gamer.state == GameState.END:
+            ended += 1
+            assert state.winner >= 0
+            assert rules.scores(state) == tuple(gamer.get_player_score(player) for player in gamer.players)
+    assert ended > 0
+
+def test_apply_keeps_state() -> None:
+    state = rules.initial([[(1, 2), (3, 4)], [(5, 6)]], 0)
+    after = rules.apply(state, ('show', 0, 1))
+    assert state.hands == (((1, 2), (3, 4)), ((5, 6),))
+    assert after.hands == (((3, 4),), ((5, 6),))
+    assert after.table == ((1, 2),) and after.owner == 0 and after.turn == 1
+
+def test_illegal_moves() -> None:
+    state = rules.initial([[(1, 2), (3, 4), (2, 9)], [(1, 6), (7, 8)]], 0)
+    with pytest.raises(AssertionError):
+        # Nothing to scout
+        rules.apply(state, ('scout', True, False, 0))
+    with pytest.raises(AssertionError):
+        # 1, 3 is no combine
+        rules.apply(state, ('show', 0, 2))
+    state = rules.apply(state, ('show', 2, 3))
+    with pytest.raises(AssertionError):
+        # 1 does not beat 2
+        rules.apply(state, ('show', 0, 1))
+    state = rules.apply(state, ('scout_and_show', True, False, 0))
+    assert state.must_show and state.turn == 1
+    assert [move for move in rules.legal_moves(state) if move[0] != 'show'] == []
+
+def test_single_card_table_scouts_head_only() -> None:
+    state = rules.apply(rules.initial([[(1, 2)] * 2, [(5, 6)] * 2], 0), ('show', 0, 1))
+    heads = {move[1] for move in rules.legal_moves(state) if move[0] != 'show'}
+    assert heads == {True}
+
+def test_gamer_rejects_split_show() -> None:
+    '''A combine must be adjacent in the hand, whatever `Player.show` is given'''
+    for seed in range(50):
+        gamer = new_game(3, seed)
+        player = turn_player(gamer)
+        hand = player.pokes
+        if hand[0].value != hand[2].value:
+            continue
+        before, count = gamer.round, len(hand)
+        player.state = PlayerState.WAIT
+        success, info = gamer.player_turn_end((player, 0, PokeCombine([hand[0], hand[2]])))
+        assert not success and 'adjacent' in info
+        assert gamer.round is before and len(player.pokes) == count
+        return
+    pytest.skip('No deal with a split pair')
+
+def test_restore_round_and_rng() -> None:
+    '''A restored game continues the same round and deals the same next round'''
+    gamer = new_game(3, 7)
+    rng = random.Random(7)
+    for _ in range(4):
+        move = pick(rules.legal_moves(gamer.round), rng)
+        play_move(turn_player(gamer), move)
+    copy = Gamer.restore(json.loads(json.dumps(gamer.snapshot())))
+    assert copy.round == gamer.round
+    assert copy.seed == gamer.seed
+    assert copy.rng.getstate() == gamer.rng.getstate()
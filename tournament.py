@@ -0,0 +1,189 @@
+'''Headless tournament: offline games between bot strategies
+
+Plays N games on the offline `Gamer`/`Player` path, in parallel over a process
+pool. Game `i` is dealt and played with seed `--seed + i`, so any game can be
+replayed alone. Seats rotate every game to cancel out the first-move advantage.
+
+    python tournament.py greedy random random --games 100000
+    python tournament.py greedy greedy --games 10000 --workers 8 --out result.json
+
+Every decision gets `--budget` seconds, see `strategy.decide`; decisions that
+fall back are counted per strategy.
+
+Two-player games can get stuck: the beat-all ending needs three or more
+players, and the table owner may not scout his own combine. A game whose
+player in turn has no legal move, or that exceeds `--max-turns`, is counted as
+stalled. Stalled games are reported apart and left out of win rates, scores
+and game length, which only cover finished games.
+'''
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import server.core.gamer
+from server import Gamer, Player, GameState, PlayerState
+from evalcache import SharedTable
+from strategy import STRATEGIES, SHOWS, BUDGET, View, decide, play
+
+server.core.gamer.DEBUG = False
+
+def play_game(strategies: list[str], seed: int, max_turns: int = 1000, budget: float = BUDGET) -> dict:
+    '''Play one game, `strategies[i]` in seat i. Return scores and fallbacks by seat, turns and whether it stalled'''
+    random.seed(seed)
+    rng = random.Random(seed)
+    gamer = Gamer(seed, False)
+    for i in range(len(strategies)):
+        player = Player(f'p{i}')
+        player.offline()
+        player.set_gamer(gamer, broadcast=False)
+    for player in gamer.players:
+        player.ready_for_game()
+    for player in gamer.players:
+        player.choose_pokes_side(rng.random() < 0.5)
+    player = next(p for p in gamer.players if p.state == PlayerState.TURN)
+    turns = 0
+    fallbacks = [0] * len(strategies)
+    while gamer.state != GameState.END and turns < max_turns:
+        seat = gamer.players.index(player)
+        move, fell_back = decide(STRATEGIES[strategies[seat]], View.of_player(player), rng, budget)
+        fallbacks[seat] += fell_back
+        if move is None:
+            break
+        player = play(player, move)
+        turns += 1
+    return {
+        'scores': [gamer.get_player_score(p) for p in gamer.players],
+        'fallbacks': fallbacks,
+        'turns': turns,
+        'stalled': gamer.state != GameState.END,
+    }
+
+def play_chunk(strategies: list[str], seeds: range, max_turns: int, budget: float) -> dict:
+    '''Play the games of `seeds` with rotating seats, return partial totals for `merge`'''
+    names = sorted(set(strategies))
+    before = SHOWS.stats()
+    totals = {
+        'games': 0, 'stalled': 0, 'turns': 0, 'cache': {},
+        'strategies': {name: {'seats': 0, 'stalled': 0, 'wins': 0.0, 'score': 0, 'fallbacks': 0} for name in names},
+    }
+    n = len(strategies)
+    for seed in seeds:
+        shift = seed % n
+        seats = strategies[shift:] + strategies[:shift]
+        result = play_game(seats, seed, max_turns, budget)
+        totals['games'] += 1
+        if result['stalled']:
+            # Not a result: nobody won, and the scores only reflect where it got stuck
+            totals['stalled'] += 1
+            for name, fallbacks in zip(seats, result['fallbacks']):
+                totals['strategies'][name]['stalled'] += 1
+                totals['strategies'][name]['fallbacks'] += fallbacks
+            continue
+        totals['turns'] += result['turns']
+        scores = result['scores']
+        best = max(scores)
+        winners = scores.count(best)
+        for name, score, fallbacks in zip(seats, scores, result['fallbacks']):
+            row = totals['strategies'][name]
+            row['seats'] += 1
+            row['score'] += score
+            row['fallbacks'] += fallbacks
+            if score == best:
+                # Ties share the win
+                row['wins'] += 1 / winners
+    after = SHOWS.stats()
+    totals['cache'] = {key: after[key] - before[key] for key in ('hits', 'shared_hits', 'misses')}
+    return totals
+
+def merge(total: dict, part: dict) -> dict:
+    for key in ('games', 'stalled', 'turns'):
+        total[key] += part[key]
+    for key, value in part['cache'].items():
+        total['cache'][key] = total['cache'].get(key, 0) + value
+    for name, row in part['strategies'].items():
+        for key, value in row.items():
+            total['strategies'][name][key] += value
+    return total
+
+def summary(totals: dict, wall: float) -> dict:
+    games = max(totals['games'], 1)
+    finished = totals['games'] - totals['stalled']
+    cache = totals['cache']
+    lookups = sum(cache.values())
+    return {
+        'games': totals['games'],
+        'finished': finished,
+        'wall': wall,
+        'games_per_second': totals['games'] / wall if wall else 0.0,
+        'stalled': totals['stalled'] / games,
+        'avg_turns': totals['turns'] / max(finished, 1),
+        'cache': dict(cache, hit_rate=(lookups - cache.get('misses', 0)) / lookups if lookups else 0.0),
+        'strategies': {
+            name: {
+                'seats': row['seats'],
+                'stalled_seats': row['stalled'],
+                'win_rate': row['wins'] / max(row['seats'], 1),
+                'avg_score': row['score'] / max(row['seats'], 1),
+                'fallbacks': row['fallbacks'],
+            }
+            for name, row in totals['strategies'].items()
+        },
+    }
+
+def attach_cache(enabled: bool, name: str|None, slots: int) -> None:
+    '''Pool initializer: cache evaluations, and share them with the other workers if `name` is given'''
+    SHOWS.enabled = enabled
+    if name:
+        SHOWS.attach(SharedTable(slots, name))
+
+def run(strategies: list[str], games: int, seed: int = 0, workers: int|None = None,
+        chunk: int = 500, max_turns: int = 1000, budget: float = BUDGET, cache: bool = False,
+        shared_cache: int = 0) -> dict:
+    '''Play `games` games and return the summary. `cache` memoizes position evaluations per process,
+    `shared_cache` slots of shared memory back those caches across pool workers, 0 to disable'''
+    for name in strategies:
+        assert name in STRATEGIES, f'Unknown strategy {name}. Choose from {", ".join(STRATEGIES)}'
+    assert 2 <= len(strategies) <= 5, 'A game has 2 ~ 5 players'
+    cache = cache or bool(shared_cache)
+    SHOWS.enabled = cache
+    start = time.perf_counter()
+    chunks = [range(i, min(i + chunk, seed + games)) for i in range(seed, seed + games, chunk)]
+    totals = play_chunk(strategies, range(0), max_turns, budget)
+    if workers == 1:
+        for seeds in chunks:
+            merge(totals, play_chunk(strategies, seeds, max_turns, budget))
+    else:
+        table = SharedTable(shared_cache) if shared_cache else None
+        initargs = (cache, table.name if table else None, shared_cache)
+        try:
+            with ProcessPoolExecutor(workers, initializer=attach_cache, initargs=initargs) as pool:
+                futures = [pool.submit(play_chunk, strategies, seeds, max_turns, budget) for seeds in chunks]
+                for future in futures:
+                    merge(totals, future.result())
+        finally:
+            if table:
+                table.close()
+    return summary(totals, time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('strategies', nargs='+', help=f'one per seat: {", ".join(STRATEGIES)}')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--workers', type=int, default=None, help='processes, 1 to play in-process')
+    parser.add_argument('--chunk', type=int, default=500, help='games per pool task')
+    parser.add_argument('--max-turns', type=int, default=1000)
+    parser.add_argument('--budget', type=float, default=BUDGET, help='seconds per decision')
+    parser.add_argument('--cache', action='store_true', help='memoize position evaluations in each process')
+    parser.add_argument('--shared-cache', type=int, default=0, help='shared memory evaluation cache slots for the pool, implies --cache, 0 to disable')
+    parser.add_argument('--out', default='', help='write the summary to this file')
+    args = parser.parse_args()
+
+    result = run(args.strategies, args.games, args.seed, args.workers, args.chunk, args.max_turns, args.budget, args.cache, args.shared_cache)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')